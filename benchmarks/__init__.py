@@ -0,0 +1 @@
+"""ベンチマークスイート（ローカル代替サーバーと計測ハーネス）"""
@@ -0,0 +1,76 @@
+"""話者別の発言統計の集計時間の計測
+
+1年分を想定した数の合成会議を検索インデックスに追加し、`analytics`サブコマンドと同じく
+インデックスから列を読み込んで全期間・1か月分を集計する時間と、1会議分の統計（議事録の
+ヘッダーに入るもの）の計算時間を計測する。
+
+使い方:
+    python -m benchmarks.bench_analytics --meetings 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_search import build_index
+from benchmarks.vtt_corpus import CorpusSpec, generate_vtt
+from zoom_moji_nayu.analytics import aggregate_speaker_stats, load_columns, speaker_stats
+from zoom_moji_nayu.formatter import parse_vtt
+from zoom_moji_nayu.search_index import SearchIndex
+
+
+def _timed(func, repeat: int) -> tuple[dict, object]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return {
+        "best_ms": round(min(timings) * 1000, 2),
+        "median_ms": round(statistics.median(timings) * 1000, 2),
+    }, result
+
+
+def measure(directory: str, repeat: int) -> dict:
+    index = SearchIndex(directory)
+    results = {}
+    for name, date_from, date_to in (("year", None, None), ("month", "2026-06-01", "2026-06-30")):
+        timing, (columns, meetings) = _timed(lambda: load_columns(index, date_from, date_to), repeat)
+        results[f"load_{name}"] = {**timing, "meetings": meetings, "segments": len(columns)}
+        timing, stats = _timed(lambda: aggregate_speaker_stats(columns), repeat)
+        results[f"aggregate_{name}"] = {**timing, "speakers": len(stats)}
+
+    segments = parse_vtt(generate_vtt(CorpusSpec(duration_minutes=480, speakers=12, overlap_rate=0.1)))
+    timing, _ = _timed(lambda: speaker_stats(segments), repeat)
+    results["header_8h_meeting"] = {**timing, "segments": len(segments)}
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="話者別の発言統計の集計時間の計測")
+    parser.add_argument("--meetings", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=20, help="索引への追加を何回の実行に分けるか")
+    parser.add_argument("--duration", type=float, default=60, help="1会議の長さ（分）")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", metavar="PATH", help="結果をJSONで保存する")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build_index(tmp, args.meetings, args.runs, args.duration, overlap_rate=0.1)
+        result = measure(tmp, args.repeat)
+
+    for name, values in result.items():
+        extra = ", ".join(f"{k}={v}" for k, v in values.items() if not k.endswith("_ms"))
+        print(f"  {name:<18} best={values['best_ms']:.2f}ms median={values['median_ms']:.2f}ms {extra}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
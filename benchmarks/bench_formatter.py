@@ -0,0 +1,167 @@
+"""parse_vtt・format_full_document・markdown_to_docs_requestsのマイクロベンチマーク
+
+合成コーパスの各ケースについて、ステージごとの処理時間とピークメモリを計測し、
+保存済みのベースラインと比較する。しきい値を超えて遅くなったステージがあれば終了コード1で終わる。
+
+使い方:
+    python -m benchmarks.bench_formatter                    # ベースラインと比較
+    python -m benchmarks.bench_formatter --update-baseline  # ベースラインを更新
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+from benchmarks.vtt_corpus import CorpusSpec, generate_vtt
+from zoom_moji_nayu.docs_requests import markdown_to_docs_requests
+from zoom_moji_nayu.formatter import MeetingMetadata, SummaryData, format_full_document, parse_vtt
+from zoom_moji_nayu.renderer import _extract_participants
+
+BASELINE_FILE = Path(__file__).parent / "baselines" / "formatter.json"
+DEFAULT_THRESHOLD = 0.5
+# 2ms未満の差は計測ノイズとして扱う
+ABSOLUTE_SLACK_SECONDS = 0.002
+
+CASES = {
+    "standup_15min": CorpusSpec(duration_minutes=15, speakers=5, mean_turn_cues=2, seed=1),
+    "meeting_60min": CorpusSpec(duration_minutes=60, speakers=6, mean_turn_cues=3, seed=2),
+    "emoji_60min": CorpusSpec(
+        duration_minutes=60, speakers=4, emoji_density=0.02, rare_kanji_density=0.01, seed=3,
+    ),
+    "workshop_8h": CorpusSpec(duration_minutes=480, speakers=12, mean_turn_cues=4, seed=4),
+}
+
+
+def _calibrate() -> float:
+    """マシン性能の目安となる固定処理の時間。ベースラインとの比較はこの値で正規化する。"""
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        total = 0
+        for i in range(300_000):
+            total += len(str(i))
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _stages(vtt_text: str) -> list[tuple[str, Callable[[Any], Any]]]:
+    def parse(_):
+        return parse_vtt(vtt_text)
+
+    def format_document(segments):
+        metadata = MeetingMetadata(
+            date="2026-02-15 10:00",
+            topic="ベンチマーク会議",
+            participants=_extract_participants(segments),
+            recording_url="https://zoom.us/rec/share/bench",
+        )
+        summary = SummaryData(summary="要約です。", chapters="- 議題: 内容")
+        return format_full_document(segments, metadata, summary)
+
+    def build_requests(markdown):
+        return markdown_to_docs_requests(markdown)
+
+    return [
+        ("parse_vtt", parse),
+        ("format_full_document", format_document),
+        ("markdown_to_docs_requests", build_requests),
+    ]
+
+
+def measure_case(spec: CorpusSpec, repeat: int = 7) -> dict[str, dict[str, float]]:
+    """1ケースの各ステージの最短時間（秒）とピークメモリ（KiB）を計測する。"""
+    vtt_text = generate_vtt(spec)
+    stages = _stages(vtt_text)
+    results: dict[str, dict[str, float]] = {name: {"seconds": float("inf")} for name, _ in stages}
+
+    for _ in range(repeat):
+        value = None
+        for name, func in stages:
+            started = time.perf_counter()
+            value = func(value)
+            results[name]["seconds"] = min(results[name]["seconds"], time.perf_counter() - started)
+
+    # tracemalloc は処理を遅くするため、時間計測とは別に1回だけ実行する
+    value = None
+    for name, func in stages:
+        tracemalloc.start()
+        value = func(value)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name]["peak_kib"] = peak / 1024
+
+    results["_input"] = {"vtt_kib": len(vtt_text.encode()) / 1024}
+    return results
+
+
+def find_regressions(
+    current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD,
+) -> list[str]:
+    """ベースラインよりthreshold以上悪化したステージを列挙する。時間はキャリブレーション値で正規化する。"""
+    scale = current["calibration"] / baseline["calibration"]
+    problems = []
+    for case, stages in baseline["cases"].items():
+        for stage, base in stages.items():
+            if stage.startswith("_") or stage not in current["cases"].get(case, {}):
+                continue
+            now = current["cases"][case][stage]
+            limit = base["seconds"] * scale * (1 + threshold) + ABSOLUTE_SLACK_SECONDS
+            if now["seconds"] > limit:
+                problems.append(
+                    f"{case}/{stage}: {now['seconds'] * 1000:.1f}ms > {limit * 1000:.1f}ms"
+                )
+            mem_limit = base["peak_kib"] * (1 + threshold)
+            if now["peak_kib"] > mem_limit:
+                problems.append(f"{case}/{stage}: peak {now['peak_kib']:.0f}KiB > {mem_limit:.0f}KiB")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="整形処理のマイクロベンチマーク")
+    parser.add_argument("--cases", default=",".join(CASES), help="計測するケース（カンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="回帰とみなす悪化率（デフォルト: 0.5 = 50%%）")
+    parser.add_argument("--baseline", default=str(BASELINE_FILE))
+    parser.add_argument("--update-baseline", action="store_true", help="計測結果でベースラインを上書きする")
+    args = parser.parse_args()
+
+    current = {"calibration": _calibrate(), "cases": {}}
+    for name in args.cases.split(","):
+        result = measure_case(CASES[name], repeat=args.repeat)
+        current["cases"][name] = result
+        print(f"{name} ({result['_input']['vtt_kib']:.0f}KiB VTT)")
+        for stage, values in result.items():
+            if not stage.startswith("_"):
+                print(f"  {stage:<28}{values['seconds'] * 1000:>9.2f}ms{values['peak_kib']:>10.0f}KiB")
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, "w") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"Baseline updated: {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print(f"No baseline at {baseline_path}; run with --update-baseline first")
+        return
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    problems = find_regressions(current, baseline, args.threshold)
+    if problems:
+        print("Regressions:")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""全文検索インデックスの構築・検索時間の計測
+
+合成コーパスの会議を複数回の実行に分けて索引に追加し（パートの統合も発生する）、
+よく出る語・長い語句・1つの会議にしかない語・1文字・話者指定の検索時間を計測する。
+
+使い方:
+    python -m benchmarks.bench_search --meetings 3000 --runs 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.vtt_corpus import CorpusSpec, generate_vtt
+from zoom_moji_nayu.formatter import parse_vtt
+from zoom_moji_nayu.search_index import SearchIndex, indexed_meeting
+
+RARE_PHRASE = "ホッケの干物"
+QUERIES = {
+    "common": ("予算", None),
+    "phrase": ("来期の予算について確認させてください", None),
+    "rare": (RARE_PHRASE, None),
+    "single_char": ("𩸽", None),
+    "speaker": ("障害の振り返り", "田中"),
+}
+
+
+def build_index(
+    directory: str, meetings: int, runs: int, duration_minutes: float, overlap_rate: float = 0.0,
+) -> dict:
+    """meetings件の会議をruns回に分けて索引に追加し、所要時間とサイズを返す。"""
+    per_run = max(1, -(-meetings // runs))
+    commit_seconds = []
+    segments = 0
+    for first in range(0, meetings, per_run):
+        index = SearchIndex(directory)
+        for no in range(first, min(first + per_run, meetings)):
+            spec = CorpusSpec(
+                duration_minutes=duration_minutes, rare_kanji_density=0.0005, overlap_rate=overlap_rate, seed=no,
+            )
+            parsed = parse_vtt(generate_vtt(spec))
+            if no == meetings // 2:
+                parsed[len(parsed) // 2].text += RARE_PHRASE
+            segments += len(parsed)
+            index.add(indexed_meeting(
+                f"bench-{no:05d}==", f"定例{no}", f"2026-{1 + no % 12:02d}-{1 + no % 28:02d}",
+                f"https://docs.example/{no}", parsed,
+            ))
+        started = time.perf_counter()
+        index.commit()
+        commit_seconds.append(time.perf_counter() - started)
+
+    size = sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(directory) for name in names
+    )
+    return {
+        "segments": segments,
+        "index_bytes": size,
+        "commit_seconds_median": round(statistics.median(commit_seconds), 4),
+        "commit_seconds_max": round(max(commit_seconds), 4),
+    }
+
+
+def measure_queries(directory: str, repeat: int) -> dict:
+    """各検索の最短・中央値（ミリ秒）とヒット件数を返す。"""
+    index = SearchIndex(directory)
+    results = {}
+    for name, (query, speaker) in QUERIES.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            hits = index.search(query, speaker=speaker, limit=20)
+            timings.append(time.perf_counter() - started)
+        results[name] = {
+            "best_ms": round(min(timings) * 1000, 2),
+            "median_ms": round(statistics.median(timings) * 1000, 2),
+            "hits": len(hits),
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="全文検索インデックスの構築・検索時間の計測")
+    parser.add_argument("--meetings", type=int, default=3000)
+    parser.add_argument("--runs", type=int, default=20, help="索引への追加を何回の実行に分けるか")
+    parser.add_argument("--duration", type=float, default=30, help="1会議の長さ（分）")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", metavar="PATH", help="結果をJSONで保存する")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = build_index(tmp, args.meetings, args.runs, args.duration)
+        result["queries"] = measure_queries(tmp, args.repeat)
+
+    print(
+        f"{args.meetings} meetings, {result['segments']} segments, "
+        f"index {result['index_bytes'] / 1024 / 1024:.1f}MiB, "
+        f"commit median={result['commit_seconds_median'] * 1000:.0f}ms max={result['commit_seconds_max'] * 1000:.0f}ms"
+    )
+    for name, values in result["queries"].items():
+        print(f"  {name:<12} best={values['best_ms']:.2f}ms median={values['median_ms']:.2f}ms hits={values['hits']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""新しい録画がない実行（no-op）の起動コスト計測
+
+処理済みの会議だけを返す録画一覧をカセットとして生成し、`python -m zoom_moji_nayu --replay`を
+別プロセスで繰り返し実行して、プロセス起動から終了までの時間と読み込まれたモジュールを報告する。
+比較のため、Google Docsクライアントのimportと生成にかかる時間（no-opでは省かれる）も計測する。
+
+使い方:
+    python -m benchmarks.bench_startup --meetings 50 --repeat 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from zoom_moji_nayu.cassette import CASSETTE_FILE, STATE_FILE, request_key
+
+ZOOM_TOKEN_URL = "https://zoom.us/oauth/token"
+ZOOM_RECORDINGS_URL = "https://api.zoom.us/v2/accounts/me/recordings"
+HEAVY_MODULES = ("googleapiclient", "google.oauth2", "httplib2", "numpy")
+
+_GOOGLE_SETUP = """
+import time
+started = time.perf_counter()
+from zoom_moji_nayu.gdocs_client import GDocsClient
+GDocsClient("bench", "bench", "bench", "folder")
+print(time.perf_counter() - started)
+"""
+
+
+def write_noop_cassette(directory: str, meetings: int) -> None:
+    """全会議が処理済みの状態と、その録画一覧を返すカセットを書き出す。"""
+    os.makedirs(directory, exist_ok=True)
+    recordings = [
+        {
+            "uuid": f"noop-{no:05d}==",
+            "topic": f"定例{no}",
+            "start_time": "2026-02-15T10:00:00Z",
+            "recording_files": [
+                {"recording_type": "audio_transcript", "download_url": f"https://zoom.us/rec/download/{no}"},
+            ],
+        }
+        for no in range(meetings)
+    ]
+    responses = [
+        ("POST", ZOOM_TOKEN_URL, {"access_token": "replayed-access_token", "expires_in": 3600}),
+        ("GET", ZOOM_RECORDINGS_URL, {"meetings": recordings, "next_page_token": ""}),
+    ]
+    with open(os.path.join(directory, CASSETTE_FILE), "w") as f:
+        for method, url, body in responses:
+            entry = {
+                "key": request_key(method, url),
+                "url": url,
+                "status": 200,
+                "headers": {"content-type": "application/json"},
+                "elapsed": 0.0,
+                "text": json.dumps(body, ensure_ascii=False),
+            }
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    with open(os.path.join(directory, STATE_FILE), "w") as f:
+        json.dump({"processed_ids": [m["uuid"] for m in recordings], "failures": {}}, f)
+
+
+def _imported_modules(importtime_stderr: str) -> set[str]:
+    modules = set()
+    for line in importtime_stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+
+def run_noop(directory: str, repeat: int) -> dict:
+    """no-op実行をrepeat回計測し、所要時間と重いモジュールが読み込まれたかを返す。"""
+    command = [
+        sys.executable, "-m", "zoom_moji_nayu",
+        "--replay", directory, "--replay-latency-scale", "0", "--no-discord",
+    ]
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(command, check=True, capture_output=True)
+        timings.append(time.perf_counter() - started)
+
+    traced = subprocess.run([sys.executable, "-X", "importtime", *command[1:]], check=True, capture_output=True, text=True)
+    modules = _imported_modules(traced.stderr)
+    return {
+        "best_seconds": round(min(timings), 4),
+        "median_seconds": round(statistics.median(timings), 4),
+        "modules_imported": len(modules),
+        "heavy_modules_imported": sorted(
+            m for m in modules if any(m == h or m.startswith(h + ".") for h in HEAVY_MODULES)
+        ),
+    }
+
+
+def google_setup_seconds(repeat: int) -> float:
+    """Google Docsクライアントのimportと生成にかかる時間（別プロセスで計測した最短値）。"""
+    timings = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", _GOOGLE_SETUP], check=True, capture_output=True, text=True,
+        )
+        timings.append(float(result.stdout.strip()))
+    return round(min(timings), 4)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="新しい録画がない実行の起動コスト計測")
+    parser.add_argument("--meetings", type=int, default=50, help="録画一覧に含める処理済み会議の数")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", metavar="PATH", help="結果をJSONで保存する")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_noop_cassette(tmp, args.meetings)
+        result = run_noop(tmp, args.repeat)
+    result["google_setup_seconds"] = google_setup_seconds(args.repeat)
+
+    print(
+        f"no-op run ({args.meetings} processed meetings): "
+        f"best={result['best_seconds'] * 1000:.0f}ms median={result['median_seconds'] * 1000:.0f}ms, "
+        f"{result['modules_imported']} modules"
+    )
+    heavy = ", ".join(result["heavy_modules_imported"]) or "none"
+    print(f"  heavy modules imported: {heavy}")
+    print(f"  avoided Google client import+setup: {result['google_setup_seconds'] * 1000:.0f}ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""process_recordingsのエンドツーエンド・スループット計測
+
+ローカルの代替サーバーに対して合成した会議を処理し、
+1分あたりの処理会議数・会議ごとのレイテンシ(p50/p95)・API呼び出し回数を報告する。
+
+使い方:
+    python -m benchmarks.bench_throughput --sizes 1,50,500 --zoom-latency 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import statistics
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from benchmarks.fake_services import FakeConfig, FakeServices, RedirectingHttp, RedirectingSession
+from zoom_moji_nayu.__main__ import process_recordings
+from zoom_moji_nayu.discord_notifier import DiscordNotifier
+from zoom_moji_nayu.gdocs_client import GDocsClient
+from zoom_moji_nayu.output import LocalExportBackend
+from zoom_moji_nayu.state import ProcessedStore
+from zoom_moji_nayu.zoom_client import ZoomClient
+
+
+@dataclass
+class ThroughputResult:
+    meetings: int
+    processed: int
+    elapsed_seconds: float
+    meetings_per_minute: float
+    latency_p50: float
+    latency_p95: float
+    api_calls: dict[str, int] = field(default_factory=dict)
+    rate_limited: dict[str, int] = field(default_factory=dict)
+    bytes_transferred: int = 0
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(pct) - 1]
+
+
+def run_once(config: FakeConfig, workers: dict[str, int], local_export: bool = False) -> ThroughputResult:
+    """代替サーバーを起動し、process_recordingsを1回実行して計測する。
+
+    local_exportを指定すると、Google Docsの代わりに一時ディレクトリへ書き出す。
+    """
+    with FakeServices(config) as services, tempfile.TemporaryDirectory() as tmp:
+        session = RedirectingSession(services.base_url)
+        zoom = ZoomClient("bench", "bench", "bench", session=session)
+        if local_export:
+            output = LocalExportBackend(str(Path(tmp) / "export"))
+        else:
+            output = GDocsClient(
+                "bench", "bench", "bench", "folder",
+                http_factory=lambda creds: RedirectingHttp(services.base_url),
+            )
+        discord = DiscordNotifier(services.webhook_url, session=session)
+        store = ProcessedStore(str(Path(tmp) / "processed.json"))
+
+        started = time.perf_counter()
+        try:
+            new_ids = process_recordings(
+                zoom, output, discord, set(), store=store, **workers,
+            )
+        finally:
+            if local_export:
+                output.close()
+        elapsed = time.perf_counter() - started
+
+        latencies = [
+            services.finished_at[no] - services.started_at[no]
+            for no in services.finished_at
+            if no in services.started_at
+        ]
+        return ThroughputResult(
+            meetings=config.meetings,
+            processed=len(new_ids),
+            elapsed_seconds=round(elapsed, 3),
+            meetings_per_minute=round(len(new_ids) / elapsed * 60, 1) if elapsed else 0.0,
+            latency_p50=round(_percentile(latencies, 50), 4),
+            latency_p95=round(_percentile(latencies, 95), 4),
+            api_calls=dict(sorted(services.calls.items())),
+            rate_limited=dict(sorted(services.rate_limited.items())),
+            bytes_transferred=services.bytes_sent,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="process_recordingsのスループット計測")
+    parser.add_argument("--sizes", default="1,50,500", help="計測する会議数（カンマ区切り）")
+    parser.add_argument("--cues", type=int, default=200, help="1会議あたりのVTTキュー数")
+    parser.add_argument("--page-size", type=int, default=30, help="Zoom録画一覧の1ページの件数")
+    parser.add_argument("--zoom-latency", type=float, default=0.0, help="Zoom応答の遅延（秒）")
+    parser.add_argument("--google-latency", type=float, default=0.0, help="Google応答の遅延（秒）")
+    parser.add_argument("--discord-latency", type=float, default=0.0, help="Discord応答の遅延（秒）")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="N回に1回429を返す（0で無効）")
+    parser.add_argument("--fetch-workers", type=int, default=2)
+    parser.add_argument("--render-workers", type=int, default=1)
+    parser.add_argument("--publish-workers", type=int, default=1)
+    parser.add_argument("--cpu-workers", type=int, default=0)
+    parser.add_argument(
+        "--local-export", action="store_true", help="Google Docsの代わりにローカルのディレクトリへ書き出す",
+    )
+    parser.add_argument("--json", metavar="PATH", help="結果をJSONで保存する")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(message)s")
+    workers = {
+        "fetch_workers": args.fetch_workers,
+        "render_workers": args.render_workers,
+        "publish_workers": args.publish_workers,
+        "cpu_workers": args.cpu_workers,
+    }
+
+    results = []
+    for size in (int(x) for x in args.sizes.split(",")):
+        config = FakeConfig(
+            meetings=size,
+            cues_per_meeting=args.cues,
+            page_size=args.page_size,
+            zoom_latency=args.zoom_latency,
+            google_latency=args.google_latency,
+            discord_latency=args.discord_latency,
+            rate_limit_every=args.rate_limit_every,
+        )
+        result = run_once(config, workers, local_export=args.local_export)
+        results.append(result)
+        calls = ", ".join(f"{k}={v}" for k, v in result.api_calls.items())
+        print(
+            f"{result.meetings:>5} meetings: {result.processed} processed in {result.elapsed_seconds:.2f}s "
+            f"({result.meetings_per_minute:.1f}/min), "
+            f"p50={result.latency_p50 * 1000:.1f}ms p95={result.latency_p95 * 1000:.1f}ms"
+        )
+        print(f"       calls: {calls}")
+        if result.rate_limited:
+            print(f"       429s: {result.rate_limited}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([asdict(r) for r in results], f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Zoom・Google Docs/Drive・Discordのローカル代替サーバー
+
+ベンチマーク用に、本物と同じHTTPの形でレスポンスを返す。遅延・429の注入・ページングを設定できる。
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import httplib2
+import requests
+
+WEBHOOK_PATH = "/api/webhooks/bench/token"
+TOPIC_PREFIX = "ベンチ会議"
+
+_DOWNLOAD_RE = re.compile(r"^/rec/download/(\d+)/(transcript\.vtt|summary\.json)$")
+_FILE_RE = re.compile(r"^/rec/file/(\d+)/(transcript\.vtt|summary\.json)$")
+_MEETING_NO_RE = re.compile(TOPIC_PREFIX + r"(\d+)")
+
+
+@dataclass
+class FakeConfig:
+    meetings: int = 50
+    cues_per_meeting: int = 200
+    page_size: int = 30
+    zoom_latency: float = 0.0
+    google_latency: float = 0.0
+    discord_latency: float = 0.0
+    # N回に1回、429 Too Many Requestsを返す（0で無効）
+    rate_limit_every: int = 0
+
+
+def synthetic_vtt(meeting_no: int, cues: int) -> str:
+    """ベンチマーク用の単純なVTTを生成する。"""
+    speakers = ["田中太郎", "鈴木花子", "佐藤一郎"]
+    lines = ["WEBVTT", ""]
+    for i in range(cues):
+        start, end = i * 5, i * 5 + 5
+        lines.append(str(i + 1))
+        lines.append(
+            f"{start // 3600:02d}:{start // 60 % 60:02d}:{start % 60:02d}.000 --> "
+            f"{end // 3600:02d}:{end // 60 % 60:02d}:{end % 60:02d}.000"
+        )
+        speaker = speakers[(i // 3 + meeting_no) % len(speakers)]
+        # 会議ごとに異なる本文にする（同じ本文の会議は重複として紐付けられる）
+        case = zlib.crc32(f"{meeting_no}-{i}".encode())
+        lines.append(f"{speaker}: 会議{meeting_no}の発言{i}です。案件{case:08x}について確認します。")
+        lines.append("")
+    return "\n".join(lines)
+
+
+class FakeServices:
+    """1つのローカルHTTPサーバーでZoom・Google・Discordの各エンドポイントを提供する。"""
+
+    def __init__(self, config: FakeConfig, vtt_factory=synthetic_vtt):
+        self.config = config
+        self.vtt_factory = vtt_factory
+        self.calls: Counter[str] = Counter()
+        self.rate_limited: Counter[str] = Counter()
+        self.bytes_sent = 0
+        # 会議番号 → (文字起こしダウンロード開始時刻, Discord通知受信時刻)
+        self.started_at: dict[int, float] = {}
+        self.finished_at: dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._request_no = itertools.count(1)
+        self._doc_no = itertools.count(1)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def webhook_url(self) -> str:
+        return self.base_url + WEBHOOK_PATH
+
+    def __enter__(self) -> FakeServices:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def meeting(self, no: int) -> dict:
+        base = self.base_url
+        return {
+            "uuid": f"bench-{no:05d}==",
+            "topic": f"{TOPIC_PREFIX}{no:05d}",
+            "start_time": "2026-02-15T10:00:00Z",
+            "share_url": f"{base}/rec/share/{no}",
+            "recording_files": [
+                {
+                    "recording_type": "audio_transcript",
+                    "file_size": self.config.cues_per_meeting * 80,
+                    "download_url": f"{base}/rec/download/{no}/transcript.vtt",
+                },
+                {
+                    "recording_type": "summary",
+                    "download_url": f"{base}/rec/download/{no}/summary.json",
+                },
+            ],
+        }
+
+    def _route(self, method: str, path: str, query: dict, body: bytes) -> tuple[str, int, dict, bytes]:
+        """(呼び出し種別, ステータス, ヘッダー, 本文) を返す。"""
+        config = self.config
+        if method == "POST" and path == "/oauth/token":
+            return "zoom.token", 200, {}, _json({"access_token": "bench", "expires_in": 3600})
+
+        if method == "GET" and path == "/v2/accounts/me/recordings":
+            page_size = int(query.get("page_size", [config.page_size])[0])
+            page_size = min(page_size, config.page_size)
+            offset = int(query.get("next_page_token", ["0"])[0] or 0)
+            numbers = range(offset, min(offset + page_size, config.meetings))
+            next_offset = offset + page_size
+            return "zoom.list", 200, {}, _json({
+                "meetings": [self.meeting(no) for no in numbers],
+                "next_page_token": str(next_offset) if next_offset < config.meetings else "",
+            })
+
+        match = _DOWNLOAD_RE.match(path)
+        if method == "GET" and match:
+            no = int(match.group(1))
+            if match.group(2) == "transcript.vtt":
+                with self._lock:
+                    self.started_at.setdefault(no, time.perf_counter())
+            # 本物と同様に、認証付きURLから実ファイルのURLへリダイレクトする
+            return "zoom.download", 302, {"Location": f"{self.base_url}/rec/file/{no}/{match.group(2)}"}, b""
+
+        match = _FILE_RE.match(path)
+        if method == "GET" and match:
+            no = int(match.group(1))
+            if match.group(2) == "transcript.vtt":
+                text = self.vtt_factory(no, config.cues_per_meeting)
+                return "zoom.file", 200, {"Content-Type": "text/vtt"}, text.encode()
+            return "zoom.file", 200, {}, _json({
+                "overall_summary": f"会議{no}の要約です。",
+                "items": [{"label": "議題", "summary": "進捗を確認した"}],
+            })
+
+        if method == "POST" and path == "/drive/v3/files":
+            return "drive.create", 200, {}, _json({"id": f"doc_{next(self._doc_no)}"})
+        if method == "POST" and re.match(r"^/drive/v3/files/[^/]+/permissions$", path):
+            return "drive.permission", 200, {}, _json({"id": "anyoneWithLink"})
+        if method == "POST" and re.match(r"^/v1/documents/[^/]+:batchUpdate$", path):
+            return "docs.batchUpdate", 200, {}, _json({"replies": []})
+
+        if method == "POST" and path == WEBHOOK_PATH:
+            content = json.loads(body or b"{}").get("content", "")
+            match = _MEETING_NO_RE.search(content)
+            if match:
+                with self._lock:
+                    self.finished_at[int(match.group(1))] = time.perf_counter()
+            return "discord.webhook", 204, {}, b""
+
+        return "unknown", 404, {}, _json({"error": f"{method} {path}"})
+
+    def _latency(self, kind: str) -> float:
+        service = kind.split(".")[0]
+        if service == "zoom":
+            return self.config.zoom_latency
+        if service in ("drive", "docs"):
+            return self.config.google_latency
+        if service == "discord":
+            return self.config.discord_latency
+        return 0.0
+
+    def _handler_class(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # ヘッダーと本文を別々に送るため、Nagleアルゴリズムによる遅延を避ける
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _handle(self, method: str) -> None:
+                parts = urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                kind, status, headers, payload = services._route(
+                    method, parts.path, parse_qs(parts.query), body,
+                )
+                every = services.config.rate_limit_every
+                if every and kind != "zoom.token" and next(services._request_no) % every == 0:
+                    with services._lock:
+                        services.rate_limited[kind] += 1
+                    status, headers, payload = 429, {"Retry-After": "0"}, _json({"error": "rate limited"})
+                else:
+                    with services._lock:
+                        services.calls[kind] += 1
+                        services.bytes_sent += len(payload)
+                time.sleep(services._latency(kind))
+
+                self.send_response(status)
+                headers.setdefault("Content-Type", "application/json")
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        return Handler
+
+
+def _json(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False).encode()
+
+
+class RedirectingSession(requests.Session):
+    """Zoom APIのURLをローカルの代替サーバーへ振り向けるrequests.Session。"""
+
+    def __init__(self, base_url: str):
+        super().__init__()
+        self.base_url = base_url
+
+    def request(self, method, url, *args, **kwargs):
+        url = re.sub(r"^https://(zoom\.us|api\.zoom\.us)", self.base_url, url)
+        return super().request(method, url, *args, **kwargs)
+
+
+class RedirectingHttp:
+    """Google APIのURLをローカルの代替サーバーへ振り向けるhttplib2互換オブジェクト。"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self._http = httplib2.Http()
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        uri = re.sub(r"^https://(docs|www)\.googleapis\.com", self.base_url, uri)
+        return self._http.request(uri, method=method, body=body, headers=headers, **kwargs)
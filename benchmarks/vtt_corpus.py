@@ -0,0 +1,113 @@
+"""Zoom形式の日本語VTTを決定的に生成する合成コーパス
+
+会議時間・話者数・1ターンの長さ・絵文字や環境依存の漢字の出現頻度を指定でき、
+同じseedからは常に同じVTTが得られる。
+"""
+
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+
+SURNAMES = [
+    "田中", "鈴木", "佐藤", "高橋", "伊藤", "渡辺", "山本", "中村",
+    "小林", "加藤", "吉田", "山田", "佐々木", "松本", "井上", "木村",
+]
+GIVEN_NAMES = ["太郎", "花子", "一郎", "美咲", "健太", "由美", "翔", "さくら", "大輔", "愛"]
+FILLERS = ["えーと、", "あの、", "まあ、", "そうですね、", "なるほど、", "はい、", ""]
+SUBJECTS = [
+    "来期の予算", "新機能のリリース日", "顧客からの問い合わせ", "採用計画", "検証環境",
+    "議事録の共有方法", "週次の進捗", "障害の振り返り", "デザインの修正案", "見積もり",
+]
+PREDICATES = [
+    "について確認させてください", "は来週までに対応します", "を再検討したほうがいいと思います",
+    "の件で相談があります", "はいったん保留にしましょう", "を資料にまとめておきます",
+    "で問題ないと思います", "についてもう少し詳しく教えてください",
+]
+CONNECTIVES = ["それと", "ただ", "ちなみに", "一方で", "なので", "あと"]
+# サロゲートペアや結合文字を含む、インデックス計算で問題になりやすい文字
+EMOJIS = ["👍", "🙏", "😊", "🎉", "👨‍💻", "🇯🇵", "✅", "💡"]
+RARE_KANJI = ["𠮷", "𩸽", "髙", "﨑", "𠀋", "𡈽", "瀨", "德"]
+
+
+@dataclass
+class CorpusSpec:
+    duration_minutes: float = 60
+    speakers: int = 4
+    # 同じ話者が続けて話すキュー数の平均
+    mean_turn_cues: float = 3.0
+    cue_seconds: float = 4.0
+    # 1文字あたりの絵文字・環境依存漢字の挿入確率
+    emoji_density: float = 0.0
+    rare_kanji_density: float = 0.0
+    # 話者が替わるときに、前の発言が終わる前に話し始める確率
+    overlap_rate: float = 0.0
+    seed: int = 0
+
+
+def _timestamp(ms: int) -> str:
+    hours, rest = divmod(ms, 3_600_000)
+    minutes, rest = divmod(rest, 60_000)
+    seconds, millis = divmod(rest, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{millis:03d}"
+
+
+def speaker_names(count: int, rng: random.Random) -> list[str]:
+    names: list[str] = []
+    while len(names) < count:
+        name = rng.choice(SURNAMES) + rng.choice(GIVEN_NAMES)
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def _sentence(rng: random.Random, spec: CorpusSpec) -> str:
+    text = rng.choice(FILLERS) + rng.choice(SUBJECTS) + rng.choice(PREDICATES)
+    if rng.random() < 0.3:
+        text += "。" + rng.choice(CONNECTIVES) + "、" + rng.choice(SUBJECTS) + rng.choice(PREDICATES)
+    text += "。"
+    if spec.emoji_density or spec.rare_kanji_density:
+        chars = []
+        for ch in text:
+            chars.append(ch)
+            if rng.random() < spec.emoji_density:
+                chars.append(rng.choice(EMOJIS))
+            if rng.random() < spec.rare_kanji_density:
+                chars.append(rng.choice(RARE_KANJI))
+        text = "".join(chars)
+    return text
+
+
+def generate_vtt(spec: CorpusSpec) -> str:
+    """仕様に従って合成VTTを生成する。"""
+    rng = random.Random(spec.seed)
+    names = speaker_names(spec.speakers, rng)
+    total_ms = int(spec.duration_minutes * 60_000)
+    cue_ms = int(spec.cue_seconds * 1000)
+
+    lines = ["WEBVTT", ""]
+    cursor = 0
+    cue_no = 1
+    speaker = rng.randrange(len(names))
+    remaining_turn = 0
+    previous_start = 0
+    while cursor < total_ms:
+        if remaining_turn <= 0:
+            if len(names) > 1:
+                speaker = (speaker + rng.randrange(1, len(names))) % len(names)
+            remaining_turn = max(1, round(rng.expovariate(1 / spec.mean_turn_cues)))
+            if spec.overlap_rate and cue_no > 1 and rng.random() < spec.overlap_rate:
+                cursor = max(previous_start + 1, cursor - rng.randrange(500, 1500))
+        remaining_turn -= 1
+
+        length = max(500, int(rng.gauss(cue_ms, cue_ms / 4)))
+        end = min(cursor + length, total_ms)
+        previous_start = cursor
+        lines.append(str(cue_no))
+        lines.append(f"{_timestamp(cursor)} --> {_timestamp(end)}")
+        lines.append(f"{names[speaker]}: {_sentence(rng, spec)}")
+        lines.append("")
+        cue_no += 1
+        # 発言の間にわずかな無音を入れる
+        cursor = end + rng.randrange(0, 400)
+    return "\n".join(lines)
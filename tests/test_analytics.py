@@ -0,0 +1,100 @@
+"""話者別の発言統計のテスト"""
+
+import textwrap
+
+from zoom_moji_nayu import search_index
+from zoom_moji_nayu.analytics import (
+    SEGMENT_DTYPE, aggregate_speaker_stats, columns_from_segments, load_columns,
+    meeting_speaker_stats, speaker_stats,
+)
+from zoom_moji_nayu.formatter import parse_vtt
+from zoom_moji_nayu.search_index import SearchIndex, indexed_meeting
+
+VTT = textwrap.dedent("""\
+    WEBVTT
+
+    1
+    00:00:00.000 --> 00:00:04.000
+    田中太郎: 始めます
+
+    2
+    00:00:04.500 --> 00:00:10.000
+    田中太郎: 議題は2つです
+
+    3
+    00:00:09.000 --> 00:00:12.000
+    鈴木花子: すみません、1つ追加で
+
+    4
+    00:00:12.500 --> 00:00:14.000
+    田中太郎: どうぞ
+
+    5
+    00:00:14.000 --> 00:00:15.000
+    録画を開始しました
+""")
+
+
+def _by_speaker(stats):
+    return {s.speaker: s for s in stats}
+
+
+class TestSpeakerStats:
+    def test_single_meeting(self):
+        stats = _by_speaker(speaker_stats(parse_vtt(VTT)))
+        tanaka, suzuki = stats["田中太郎"], stats["鈴木花子"]
+        # キューの長さの合計（4.0 + 5.5 + 1.5秒）
+        assert tanaka.talk_ms == 11_000
+        assert tanaka.turns == 2
+        # 最初の発言は0秒から10秒まで
+        assert tanaka.longest_ms == 10_000
+        assert tanaka.interruptions == 0
+        assert (suzuki.talk_ms, suzuki.turns, suzuki.interruptions) == (3_000, 1, 1)
+
+    def test_unnamed_speaker_and_order(self):
+        stats = speaker_stats(parse_vtt(VTT))
+        assert [s.speaker for s in stats] == ["田中太郎", "鈴木花子"]
+        assert speaker_stats([]) == []
+
+    def test_meetings_are_not_mixed(self):
+        first = parse_vtt(VTT)
+        second = parse_vtt(VTT.replace("田中太郎", "佐藤一郎"))
+        per_meeting = meeting_speaker_stats(columns_from_segments([first, second]))
+        assert [s.speaker for s in per_meeting[0]] == ["田中太郎", "鈴木花子"]
+        assert [s.speaker for s in per_meeting[1]] == ["佐藤一郎", "鈴木花子"]
+
+    def test_aggregate_across_meetings(self):
+        columns = columns_from_segments([parse_vtt(VTT), parse_vtt(VTT.replace("田中太郎", "佐藤一郎"))])
+        stats = _by_speaker(aggregate_speaker_stats(columns))
+        assert (stats["鈴木花子"].meetings, stats["鈴木花子"].talk_ms, stats["鈴木花子"].interruptions) == (2, 6_000, 2)
+        assert (stats["田中太郎"].meetings, stats["田中太郎"].turns) == (1, 2)
+        assert "" not in stats
+
+
+class TestLoadColumns:
+    def test_record_layout_matches_index(self):
+        assert SEGMENT_DTYPE.itemsize == search_index._SEGMENT.size
+
+    def test_reads_index_with_date_range_and_reindexed_meetings(self, tmp_path):
+        index = SearchIndex(str(tmp_path))
+        index.add(indexed_meeting("m1", "定例", "2026-01-10 10:00", "", parse_vtt(VTT)))
+        index.add(indexed_meeting("m2", "定例", "2026-02-10 10:00", "", parse_vtt(VTT)))
+        index.commit()
+        # m1を再登録すると古い内容は集計されない
+        index.add(indexed_meeting("m1", "定例", "2026-01-10 10:00", "", parse_vtt(VTT.replace("田中太郎", "佐藤一郎"))))
+        index.commit()
+
+        columns, meetings = load_columns(index)
+        stats = _by_speaker(aggregate_speaker_stats(columns))
+        assert meetings == 2
+        assert (stats["田中太郎"].meetings, stats["佐藤一郎"].meetings, stats["鈴木花子"].meetings) == (1, 1, 2)
+        assert stats["鈴木花子"].interruptions == 2
+
+        columns, meetings = load_columns(index, date_from="2026-02-01", date_to="2026-02-28")
+        assert meetings == 1
+        assert [s.speaker for s in aggregate_speaker_stats(columns)] == ["田中太郎", "鈴木花子"]
+
+    def test_empty_index(self, tmp_path):
+        columns, meetings = load_columns(SearchIndex(str(tmp_path)))
+        assert (len(columns), meetings) == (0, 0)
+        assert aggregate_speaker_stats(columns) == []
@@ -0,0 +1,67 @@
+"""文字起こしアーカイブのテスト"""
+
+import os
+
+from zoom_moji_nayu import archive as archive_module
+from zoom_moji_nayu.archive import RawArchive
+
+VTT = "WEBVTT\n\n1\n00:00:00.000 --> 00:00:05.000\n田中: テスト\n"
+
+
+def _meeting(uuid: str, topic: str = "定例") -> dict:
+    return {"uuid": uuid, "topic": topic, "start_time": "2026-02-15T10:00:00Z"}
+
+
+class TestRawArchive:
+    def test_empty_archive(self, tmp_path):
+        archive = RawArchive(str(tmp_path))
+        assert archive.get("m1") is None
+        assert "m1" not in archive
+        assert archive.stats()["meetings"] == 0
+        assert not os.path.exists(archive.directory)
+
+    def test_round_trip_across_instances(self, tmp_path):
+        RawArchive(str(tmp_path)).put(_meeting("m1"), VTT, {"overall_summary": "要約"})
+        archived = RawArchive(str(tmp_path)).get("m1")
+        assert archived.meeting == _meeting("m1")
+        assert archived.vtt_text == VTT
+        assert archived.summary_json == {"overall_summary": "要約"}
+        assert archived.archived_at
+
+    def test_latest_record_wins(self, tmp_path):
+        archive = RawArchive(str(tmp_path))
+        archive.put(_meeting("m1", "古い"), VTT, None)
+        archive.put(_meeting("m1", "新しい"), VTT, None)
+        assert archive.get("m1").meeting["topic"] == "新しい"
+        assert archive.stats()["meetings"] == 1
+
+    def test_index_grows(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(archive_module, "INITIAL_SLOTS", 8)
+        archive = RawArchive(str(tmp_path))
+        count = 50
+        for no in range(count):
+            archive.put(_meeting(f"m{no}=="), f"{VTT}{no}", None)
+        assert archive.stats()["meetings"] == count
+        assert os.path.getsize(archive.index_path) > 8 * 32 * 8
+        reopened = RawArchive(str(tmp_path))
+        assert all(reopened.get(f"m{no}==").vtt_text.endswith(str(no)) for no in range(count))
+
+    def test_index_rebuilt_from_pack(self, tmp_path):
+        archive = RawArchive(str(tmp_path))
+        archive.put(_meeting("m1"), VTT, None)
+        archive.put(_meeting("m2"), VTT, None)
+        archive.close()
+        os.remove(archive.index_path)
+        rebuilt = RawArchive(str(tmp_path))
+        assert rebuilt.get("m2").meeting == _meeting("m2")
+        assert rebuilt.stats()["meetings"] == 2
+
+    def test_interrupted_write_is_overwritten(self, tmp_path):
+        archive = RawArchive(str(tmp_path))
+        archive.put(_meeting("m1"), VTT, None)
+        with open(archive.pack_path, "ab") as f:
+            f.write(b"ZMAR\x00\x10")
+        archive.put(_meeting("m2"), VTT, None)
+        archive.close()
+        os.remove(archive.index_path)
+        assert RawArchive(str(tmp_path)).stats()["meetings"] == 2
@@ -0,0 +1,49 @@
+"""合成VTTコーパスと整形マイクロベンチマークのテスト"""
+
+from benchmarks.bench_formatter import find_regressions
+from benchmarks.vtt_corpus import EMOJIS, RARE_KANJI, CorpusSpec, generate_vtt
+from zoom_moji_nayu.formatter import parse_vtt
+
+
+class TestGenerateVtt:
+    def test_same_seed_is_deterministic(self):
+        spec = CorpusSpec(duration_minutes=5, seed=7)
+        assert generate_vtt(spec) == generate_vtt(spec)
+        assert generate_vtt(spec) != generate_vtt(CorpusSpec(duration_minutes=5, seed=8))
+
+    def test_parses_with_requested_speakers_and_duration(self):
+        segments = parse_vtt(generate_vtt(CorpusSpec(duration_minutes=10, speakers=3, seed=1)))
+        assert len({s.speaker for s in segments}) == 3
+        assert segments[0].start == "00:00:00"
+        assert segments[-1].end.startswith("00:09") or segments[-1].end == "00:10:00"
+
+    def test_inserts_emoji_and_rare_kanji(self):
+        vtt = generate_vtt(CorpusSpec(duration_minutes=5, emoji_density=0.05, rare_kanji_density=0.05))
+        assert any(e in vtt for e in EMOJIS)
+        assert any(k in vtt for k in RARE_KANJI)
+
+
+class TestFindRegressions:
+    def _result(self, calibration, seconds, peak_kib=100.0):
+        return {
+            "calibration": calibration,
+            "cases": {"c": {"parse_vtt": {"seconds": seconds, "peak_kib": peak_kib}, "_input": {}}},
+        }
+
+    def test_flags_slowdown_beyond_threshold(self):
+        problems = find_regressions(self._result(1.0, 0.2), self._result(1.0, 0.1), threshold=0.5)
+        assert len(problems) == 1
+        assert problems[0].startswith("c/parse_vtt")
+
+    def test_normalizes_by_calibration(self):
+        # マシンが2倍遅ければ処理時間が2倍でも回帰とみなさない
+        assert find_regressions(self._result(2.0, 0.2), self._result(1.0, 0.1), threshold=0.5) == []
+
+    def test_ignores_sub_millisecond_noise(self):
+        assert find_regressions(self._result(1.0, 0.0004), self._result(1.0, 0.0001), threshold=0.5) == []
+
+    def test_flags_memory_growth(self):
+        problems = find_regressions(
+            self._result(1.0, 0.1, peak_kib=300), self._result(1.0, 0.1, peak_kib=100), threshold=0.5,
+        )
+        assert problems == ["c/parse_vtt: peak 300KiB > 150KiB"]
@@ -0,0 +1,27 @@
+"""ローカル代替サーバーを使ったエンドツーエンド計測のテスト"""
+
+from benchmarks.bench_throughput import run_once
+from benchmarks.fake_services import FakeConfig
+
+
+class TestRunOnce:
+    def test_processes_all_pages_over_http(self):
+        result = run_once(
+            FakeConfig(meetings=5, cues_per_meeting=10, page_size=2),
+            {"fetch_workers": 2, "render_workers": 1, "publish_workers": 2},
+        )
+        assert result.processed == 5
+        assert result.api_calls["zoom.list"] == 3
+        assert result.api_calls["drive.create"] == 5
+        assert result.api_calls["discord.webhook"] == 5
+        assert result.latency_p95 >= result.latency_p50 > 0
+
+    def test_local_export_makes_no_google_calls(self):
+        result = run_once(
+            FakeConfig(meetings=3, cues_per_meeting=10, page_size=2),
+            {"fetch_workers": 2, "render_workers": 1, "publish_workers": 2},
+            local_export=True,
+        )
+        assert result.processed == 3
+        assert "drive.create" not in result.api_calls
+        assert result.api_calls["discord.webhook"] == 3
@@ -0,0 +1,80 @@
+"""通信の記録・再生のテスト"""
+
+import json
+from unittest.mock import MagicMock, patch
+
+import httplib2
+import pytest
+import requests
+
+from zoom_moji_nayu.cassette import Cassette, CassetteMiss, request_key
+from zoom_moji_nayu.discord_notifier import DiscordNotifier
+from zoom_moji_nayu.gdocs_client import GDocsClient
+from zoom_moji_nayu.zoom_client import ZoomClient
+
+
+def _fake_response(status, body, headers=None):
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = body
+    resp.headers.update(headers or {})
+    return resp
+
+
+class TestRequestKey:
+    def test_ignores_query_and_hides_webhook_token(self):
+        assert request_key("get", "https://api.zoom.us/v2/accounts/me/recordings?from=2026-02-14") == (
+            "GET api.zoom.us/v2/accounts/me/recordings"
+        )
+        assert request_key("POST", "https://discord.com/api/webhooks/123/secret") == (
+            "POST discord.com/api/webhooks/***"
+        )
+
+
+class TestCassette:
+    def test_record_then_replay_zoom_and_discord(self, tmp_path):
+        responses = [
+            _fake_response(200, b'{"access_token": "real-token", "expires_in": 3600}'),
+            _fake_response(200, json.dumps({"meetings": [{"uuid": "m1"}]}).encode()),
+            _fake_response(204, b""),
+        ]
+        cassette = Cassette(str(tmp_path), "record")
+        with patch.object(requests.Session, "request", side_effect=responses):
+            zoom = ZoomClient("acc", "cid", "secret", session=cassette.session())
+            assert zoom.get_recordings("2026-02-14", "2026-02-15") == [{"uuid": "m1"}]
+            DiscordNotifier("https://discord.com/api/webhooks/1/tok", session=cassette.session()).notify(
+                meeting_topic="会議", gdocs_url="https://docs.google.com/x", recording_url="",
+            )
+
+        recorded = (tmp_path / "cassette.jsonl").read_text()
+        assert "real-token" not in recorded
+        assert "webhooks/1/tok" not in recorded
+
+        replay = Cassette(str(tmp_path), "replay", latency_scale=0)
+        with patch.object(requests.Session, "request", side_effect=AssertionError("network")):
+            zoom = ZoomClient("replay", "replay", "replay", session=replay.session())
+            # 日付が変わってもクエリはキーに含まれないため再生できる
+            assert zoom.get_recordings("2026-03-01", "2026-03-02") == [{"uuid": "m1"}]
+            notifier = DiscordNotifier("https://discord.com/api/webhooks/replay", session=replay.session())
+            notifier.notify(meeting_topic="会議", gdocs_url="https://docs.google.com/x", recording_url="")
+
+    def test_replay_unknown_request_raises(self, tmp_path):
+        Cassette(str(tmp_path), "record")
+        replay = Cassette(str(tmp_path), "replay", latency_scale=0)
+        with pytest.raises(CassetteMiss):
+            replay.play("GET", "https://api.zoom.us/v2/users")
+
+    def test_record_then_replay_google_docs(self, tmp_path):
+        inner = MagicMock()
+        inner.request.side_effect = [
+            (httplib2.Response({"status": "200", "content-type": "application/json"}), b'{"id": "doc_1"}'),
+            (httplib2.Response({"status": "200", "content-type": "application/json"}), b"{}"),
+            (httplib2.Response({"status": "200", "content-type": "application/json"}), b"{}"),
+        ]
+        cassette = Cassette(str(tmp_path), "record")
+        client = GDocsClient("cid", "secret", "token", "folder", http_factory=lambda creds: cassette.http(inner))
+        assert client.create_document(title="議事録", markdown_content="# 会議\n\n本文") == "doc_1"
+
+        replay = Cassette(str(tmp_path), "replay", latency_scale=0)
+        client = GDocsClient("replay", "replay", "replay", "folder", http_factory=lambda creds: replay.http())
+        assert client.create_document(title="議事録", markdown_content="# 会議\n\n本文") == "doc_1"
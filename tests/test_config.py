@@ -0,0 +1,60 @@
+"""設定管理のテスト"""
+
+import pytest
+
+from zoom_moji_nayu.config import load_accounts_config
+
+ACCOUNTS = """
+[google]
+client_id = "g-id"
+client_secret_env = "TEST_GOOGLE_SECRET"
+refresh_token = "g-token"
+writes_per_minute = 30
+
+[[accounts]]
+name = "sales"
+zoom_account_id = "acc-1"
+zoom_client_id = "zoom-1"
+zoom_client_secret_env = "TEST_SALES_SECRET"
+drive_folder_id = "folder-1"
+discord_webhook_url = "https://discord.com/api/webhooks/1"
+zoom_requests_per_minute = 20
+
+[[accounts]]
+name = "dev"
+zoom_account_id = "acc-2"
+zoom_client_id = "zoom-2"
+zoom_client_secret = "secret-2"
+drive_folder_id = "folder-2"
+state = "state/dev.json"
+"""
+
+
+class TestLoadAccountsConfig:
+    def test_accounts_and_env_references(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("TEST_GOOGLE_SECRET", "g-secret")
+        monkeypatch.setenv("TEST_SALES_SECRET", "secret-1")
+        path = tmp_path / "accounts.toml"
+        path.write_text(ACCOUNTS)
+
+        config = load_accounts_config(str(path))
+        assert config.google == {"client_id": "g-id", "client_secret": "g-secret", "refresh_token": "g-token"}
+        assert config.google_writes_per_minute == 30
+        sales, dev = config.accounts
+        assert sales.zoom == {"account_id": "acc-1", "client_id": "zoom-1", "client_secret": "secret-1"}
+        assert (sales.zoom_requests_per_minute, sales.state) == (20, None)
+        assert dev.discord_webhook_url is None
+        assert dev.state == "state/dev.json"
+
+    def test_missing_env_and_duplicate_names_are_rejected(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("TEST_SALES_SECRET", raising=False)
+        monkeypatch.setenv("TEST_GOOGLE_SECRET", "g-secret")
+        path = tmp_path / "accounts.toml"
+        path.write_text(ACCOUNTS)
+        with pytest.raises(ValueError, match="TEST_SALES_SECRET"):
+            load_accounts_config(str(path))
+
+        monkeypatch.setenv("TEST_SALES_SECRET", "secret-1")
+        path.write_text(ACCOUNTS.replace('name = "dev"', 'name = "sales"'))
+        with pytest.raises(ValueError, match="重複"):
+            load_accounts_config(str(path))
@@ -0,0 +1,38 @@
+"""常駐モードのテスト"""
+
+from datetime import datetime, timedelta, timezone
+
+from zoom_moji_nayu.daemon import PollSchedule
+
+JST = timezone(timedelta(hours=9))
+
+
+class TestPollSchedule:
+    def _schedule(self):
+        return PollSchedule(busy_seconds=60, work_seconds=300, idle_seconds=1800, tz=JST)
+
+    def test_work_hours_and_night(self):
+        schedule = self._schedule()
+        # 2026-02-16は月曜日
+        assert schedule.next_interval(datetime(2026, 2, 16, 10, 0, tzinfo=JST)) == 300
+        assert schedule.next_interval(datetime(2026, 2, 16, 23, 0, tzinfo=JST)) == 1800
+        assert schedule.next_interval(datetime(2026, 2, 15, 10, 0, tzinfo=JST)) == 1800
+
+    def test_busy_after_new_recordings(self):
+        now = datetime(2026, 2, 16, 23, 0, tzinfo=JST)
+        assert self._schedule().next_interval(now, found=2) == 60
+
+    def test_busy_while_recent_meeting_awaits_transcript(self):
+        schedule = self._schedule()
+        now = datetime(2026, 2, 16, 23, 0, tzinfo=JST)
+        recent = {"start_time": "2026-02-16T13:00:00Z", "duration": 30}
+        old = {"start_time": "2026-02-16T08:00:00Z", "duration": 30}
+        assert schedule.next_interval(now, awaiting_transcript=[recent]) == 60
+        assert schedule.next_interval(now, awaiting_transcript=[old]) == 1800
+
+    def test_backoff_on_consecutive_failures(self):
+        schedule = self._schedule()
+        now = datetime(2026, 2, 16, 10, 0, tzinfo=JST)
+        assert [schedule.next_interval(now, failures=n) for n in (1, 2, 3, 4, 5)] == [
+            300, 600, 1200, 1800, 1800,
+        ]
@@ -0,0 +1,82 @@
+"""文字起こしの指紋による重複検出のテスト"""
+
+import threading
+
+from zoom_moji_nayu.fingerprint import DuplicateIndex, Fingerprint, fingerprint, similarity
+from zoom_moji_nayu.formatter import Segment
+
+SENTENCES = [
+    f"議題{i}について、担当者から進捗の報告と来週までの対応方針の説明がありました。"
+    for i in range(20)
+]
+
+
+def _segments(sentences, speaker="田中"):
+    return [Segment(speaker, text, "00:00:00", "00:00:05") for text in sentences]
+
+
+class TestFingerprint:
+    def test_short_transcript_is_skipped(self):
+        assert fingerprint(_segments(["テスト"])) is None
+
+    def test_formatting_differences_are_ignored(self):
+        a = fingerprint(_segments(SENTENCES))
+        b = fingerprint(_segments([s.replace("、", " ") for s in SENTENCES], speaker="鈴木"))
+        assert a.content_hash == b.content_hash
+
+    def test_similarity_of_partial_copy(self):
+        a = fingerprint(_segments(SENTENCES))
+        b = fingerprint(_segments(SENTENCES[1:]))
+        c = fingerprint(_segments([f"全く別の話題{i}を扱った会議の発言です。" * 3 for i in range(20)]))
+        assert a.content_hash != b.content_hash
+        assert similarity(a.minhash, b.minhash) >= 0.8
+        assert similarity(a.minhash, c.minhash) < 0.5
+
+    def test_round_trip(self):
+        fp = fingerprint(_segments(SENTENCES))
+        assert Fingerprint.from_dict(fp.to_dict()) == fp
+
+
+class TestDuplicateIndex:
+    def test_exact_duplicate_matches_regardless_of_time(self):
+        fp = fingerprint(_segments(SENTENCES))
+        index = DuplicateIndex()
+        assert index.claim("m1", fp, "2026-02-15T10:00:00Z") is None
+        index.resolve("m1", "doc_1")
+        assert index.claim("m2", fp, "2026-03-01T10:00:00Z").result() == ("m1", "doc_1")
+
+    def test_near_duplicate_only_within_window(self):
+        index = DuplicateIndex()
+        index.claim("m1", fingerprint(_segments(SENTENCES)), "2026-02-15T10:00:00Z")
+        index.resolve("m1", "doc_1")
+        near = fingerprint(_segments(SENTENCES[1:]))
+        assert index.claim("m2", near, "2026-02-15T10:30:00Z").result() == ("m1", "doc_1")
+        assert index.claim("m3", near, "2026-02-22T10:00:00Z") is None
+
+    def test_duplicate_waits_for_original_document(self):
+        fp = fingerprint(_segments(SENTENCES))
+        index = DuplicateIndex()
+        index.claim("m1", fp)
+        pending = index.claim("m2", fp)
+        assert not pending.done()
+        threading.Timer(0.01, index.resolve, ("m1", "doc_1")).start()
+        assert pending.result(timeout=5) == ("m1", "doc_1")
+
+    def test_abandoned_original_can_be_reclaimed(self):
+        fp = fingerprint(_segments(SENTENCES))
+        index = DuplicateIndex()
+        index.claim("m1", fp)
+        pending = index.claim("m2", fp)
+        index.abandon("m1")
+        assert pending.result() is None
+        assert index.claim("m2", fp) is None
+
+    def test_seeded_from_state_documents(self):
+        fp = fingerprint(_segments(SENTENCES))
+        documents = {
+            "m1": {"doc_id": "doc_1", "start_time": "2026-02-15T10:00:00Z", **fp.to_dict()},
+            "m2": {"doc_id": "doc_1", "duplicate_of": "m1", **fp.to_dict()},
+            "m0": {"doc_id": "doc_0"},
+        }
+        index = DuplicateIndex(documents)
+        assert index.claim("m3", fp).result() == ("m1", "doc_1")
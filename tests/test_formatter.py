@@ -2,7 +2,11 @@
 
 import textwrap
 
-from zoom_moji_nayu.formatter import parse_vtt, format_transcript_markdown, format_full_document, MeetingMetadata, SummaryData
+from zoom_moji_nayu.analytics import SpeakerStats
+from zoom_moji_nayu.formatter import (
+    parse_vtt, compact_segments, format_transcript_markdown, format_full_document, format_duration,
+    MeetingMetadata, Segment, SummaryData,
+)
 
 
 class TestParseVtt:
@@ -63,6 +67,45 @@ class TestParseVtt:
         assert segments[0].start == "00:00:00"
         assert segments[0].end == "00:00:06"
 
+    def test_cue_times_in_milliseconds(self):
+        vtt_text = textwrap.dedent("""\
+            WEBVTT
+
+            1
+            00:01:00.250 --> 00:01:03.000
+            田中太郎: 今日は
+
+            2
+            00:01:04.000 --> 00:01:06.500
+            田中太郎: よろしくお願いします
+
+            3
+            01:06.000 --> 01:10.000
+            鈴木花子: こちらこそ
+        """)
+        segments = parse_vtt(vtt_text)
+        assert (segments[0].start_ms, segments[0].end_ms, segments[0].talk_ms) == (60_250, 66_500, 5_250)
+        assert (segments[1].start_ms, segments[1].end_ms, segments[1].talk_ms) == (66_000, 70_000, 4_000)
+
+
+class TestCompactSegments:
+    def test_turns_grouped_by_window_with_speaker_labels(self):
+        segments = [
+            Segment("田中", "おはようございます", "00:00:05", "00:00:08", 5_000, 8_000, 3_000),
+            Segment("鈴木", "はい\nよろしくお願いします", "00:00:09", "00:01:10", 9_000, 70_000, 61_000),
+            Segment("田中", "では始めます", "00:01:12", "00:01:15", 72_000, 75_000, 3_000),
+            Segment("", "（無音）", "00:01:30", "00:01:31", 90_000, 91_000, 1_000),
+        ]
+        blocks = compact_segments(segments, 60_000)
+        assert [(b.start, b.end, b.talk_ms) for b in blocks] == [
+            ("00:00:05", "00:01:10", 64_000), ("00:01:12", "00:01:31", 4_000),
+        ]
+        assert blocks[0].text == "田中: おはようございます\n鈴木: はい よろしくお願いします"
+        assert blocks[1].text == "田中: では始めます\n（無音）"
+        assert format_transcript_markdown(blocks).startswith("### 00:00:05 - 00:01:10\n\n田中: おはようございます\n")
+        # 元の発言は変更しない
+        assert segments[0].text == "おはようございます"
+
 
 class TestFormatFullDocument:
     def test_full_document_with_summary(self):
@@ -118,3 +161,24 @@ class TestFormatFullDocument:
         assert "# 会議議事録" in md
         assert "## 文字起こし" in md
         assert "## 要約" not in md
+
+    def test_speaker_stats_in_header(self):
+        metadata = MeetingMetadata(
+            date="2026-02-15 10:00",
+            topic="テスト会議",
+            participants=["田中太郎", "鈴木花子"],
+            speaker_stats=[
+                SpeakerStats("田中太郎", talk_ms=750_000, turns=18, longest_ms=190_000, interruptions=2),
+                SpeakerStats("鈴木花子", talk_ms=250_000, turns=10, longest_ms=45_000, interruptions=0),
+            ],
+        )
+        md = format_full_document([], metadata, summary=None)
+        header = md.split("---")[0]
+        assert "## 発言の統計" in header
+        assert "- 田中太郎: 12分30秒（75%）、発言18回、最長3分10秒、割り込み2回" in header
+        assert "- 鈴木花子: 4分10秒（25%）、発言10回、最長45秒、割り込み0回" in header
+
+    def test_format_duration(self):
+        assert format_duration(45_400) == "45秒"
+        assert format_duration(750_000) == "12分30秒"
+        assert format_duration(3_900_000) == "1時間5分"
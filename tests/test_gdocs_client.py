@@ -29,6 +29,11 @@ class TestGDocsClient:
         )
         assert doc_id == "doc_123"
 
+        # リソースは生成時に一度だけ作り、ドキュメントごとには作り直さない
+        mock_docs.documents.reset_mock()
+        client.create_document(title="2件目", markdown_content="本文")
+        mock_docs.documents.assert_not_called()
+
     @patch("zoom_moji_nayu.gdocs_client.build")
     @patch("zoom_moji_nayu.gdocs_client.Credentials")
     def test_get_document_url(self, mock_creds_cls, mock_build):
@@ -80,3 +85,82 @@ class TestGDocsClient:
                 "https://www.googleapis.com/auth/drive",
             ],
         )
+
+    @patch("zoom_moji_nayu.gdocs_client.build")
+    @patch("zoom_moji_nayu.gdocs_client.Credentials")
+    def test_create_document_with_prebuilt_requests(self, mock_creds_cls, mock_build):
+        mock_creds_cls.return_value = MagicMock()
+        mock_docs = MagicMock()
+        mock_drive = MagicMock()
+        mock_build.side_effect = lambda service, version, credentials: (
+            mock_docs if service == "docs" else mock_drive
+        )
+        mock_drive.files().create().execute.return_value = {"id": "doc_123"}
+
+        client = GDocsClient(
+            client_id="test_client_id",
+            client_secret="test_client_secret",
+            refresh_token="test_refresh_token",
+            folder_id="folder_abc",
+        )
+        prebuilt = [{"insertText": {"location": {"index": 1}, "text": "本文\n"}}]
+        with patch.object(client, "_markdown_to_docs_requests") as mock_convert:
+            client.create_document(title="テスト", markdown_content="", docs_requests=prebuilt)
+        mock_convert.assert_not_called()
+        mock_docs.documents().batchUpdate.assert_called_with(
+            documentId="doc_123", body={"requests": prebuilt},
+        )
+
+    @patch("zoom_moji_nayu.gdocs_client.build")
+    @patch("zoom_moji_nayu.gdocs_client.Credentials")
+    def test_replace_document(self, mock_creds_cls, mock_build):
+        mock_creds_cls.return_value = MagicMock()
+        mock_docs = MagicMock()
+        mock_drive = MagicMock()
+        mock_build.side_effect = lambda service, version, credentials: (
+            mock_docs if service == "docs" else mock_drive
+        )
+        mock_docs.documents().get().execute.return_value = {
+            "title": "古いタイトル", "body": {"content": [{"endIndex": 1}, {"endIndex": 42}]},
+        }
+        read_limiter = MagicMock()
+        client = GDocsClient(
+            client_id="test_client_id",
+            client_secret="test_client_secret",
+            refresh_token="test_refresh_token",
+            folder_id="folder_abc",
+            read_limiter=read_limiter,
+        )
+        new_requests = [{"insertText": {"location": {"index": 1}, "text": "新しい本文\n"}}]
+        client.replace_document("doc_123", "新しいタイトル", new_requests)
+
+        requests = mock_docs.documents().batchUpdate.call_args.kwargs["body"]["requests"]
+        assert requests[0] == {"deleteContentRange": {"range": {"startIndex": 1, "endIndex": 41}}}
+        assert requests[-1] == new_requests[0]
+        mock_drive.files().update.assert_called_with(
+            fileId="doc_123", body={"name": "新しいタイトル"}, supportsAllDrives=True,
+        )
+        read_limiter.acquire.assert_called_once()
+
+    @patch("zoom_moji_nayu.gdocs_client.build")
+    @patch("zoom_moji_nayu.gdocs_client.Credentials")
+    def test_with_folder_shares_client(self, mock_creds_cls, mock_build):
+        mock_creds_cls.return_value = MagicMock()
+        mock_drive = MagicMock()
+        mock_build.side_effect = lambda service, version, credentials: (
+            MagicMock() if service == "docs" else mock_drive
+        )
+        mock_drive.files().create().execute.return_value = {"id": "doc_123"}
+        client = GDocsClient(
+            client_id="test_client_id",
+            client_secret="test_client_secret",
+            refresh_token="test_refresh_token",
+            folder_id="folder_abc",
+        )
+        other = client.with_folder("folder_xyz")
+        other.create_document(title="別部署", markdown_content="本文")
+
+        assert mock_drive.files().create.call_args.kwargs["body"]["parents"] == ["folder_xyz"]
+        assert client.folder_id == "folder_abc"
+        assert other._idle_http is client._idle_http
+        assert mock_build.call_count == 2
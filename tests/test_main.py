@@ -1,12 +1,27 @@
 """メイン処理のテスト"""
 
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from unittest.mock import patch, MagicMock
 
+import pytest
+import requests
+
+from benchmarks.bench_startup import write_noop_cassette
 from zoom_moji_nayu.__main__ import (
-    load_processed, save_processed, process_recordings, _parse_zoom_summary,
+    load_processed, save_processed, process_recordings, main, _parse_zoom_summary, _shard_of,
 )
+from zoom_moji_nayu.archive import RawArchive
+from zoom_moji_nayu.docs_requests import markdown_to_docs_requests
 from zoom_moji_nayu.formatter import SummaryData
+from zoom_moji_nayu.metrics import Metrics
+from zoom_moji_nayu.output import LocalExportBackend
+from zoom_moji_nayu.quota import QuotaBudget, quota_days
+from zoom_moji_nayu.scheduler import SchedulePolicy
+from zoom_moji_nayu.search_index import SearchIndex
+from zoom_moji_nayu.state import LeaseManager, ProcessedStore
 
 
 class TestProcessedManagement:
@@ -57,6 +72,30 @@ class TestParseZoomSummary:
         assert result.chapters == ""
 
 
+SIMPLE_VTT = "WEBVTT\n\n1\n00:00:00.000 --> 00:00:05.000\n田中: テスト\n"
+
+
+def _mock_zoom(meetings: list[dict], vtt: str = SIMPLE_VTT) -> MagicMock:
+    """録画一覧としてmeetingsを返し、どの会議の文字起こしもvttになるZoomクライアントのモック。"""
+    zoom = MagicMock()
+    zoom.get_recordings.return_value = meetings
+    zoom.get_meeting_recordings.side_effect = lambda uuid: next(m for m in meetings if m["uuid"] == uuid)
+    zoom.get_recording_url.side_effect = (
+        lambda m, t: "https://zoom.us/download/vtt" if t == "audio_transcript" else None
+    )
+    zoom.download_transcript.return_value = vtt
+    return zoom
+
+
+def _utterances_vtt(count: int) -> str:
+    """鈴木と田中が交互に1秒ずつ発言するVTT。"""
+    return "WEBVTT\n\n" + "".join(
+        f"{i + 1}\n00:{i // 60:02d}:{i % 60:02d}.000 --> 00:{i // 60:02d}:{i % 60:02d}.900\n"
+        f"{'田中' if i % 2 else '鈴木'}: 発言{i}の内容です。\n\n"
+        for i in range(count)
+    )
+
+
 class TestProcessRecordings:
     def test_skip_already_processed(self):
         mock_zoom = MagicMock()
@@ -110,9 +149,638 @@ class TestProcessRecordings:
 
         mock_discord = MagicMock()
 
+        metrics = Metrics()
         new_ids = process_recordings(
-            mock_zoom, mock_gdocs, mock_discord, [],
+            mock_zoom, mock_gdocs, mock_discord, [], metrics=metrics,
         )
         assert new_ids == ["meeting_456"]
         mock_gdocs.create_document.assert_called_once()
         mock_discord.notify.assert_called_once()
+
+        report = metrics.report()
+        assert set(report["stages"]) == {"list_recordings", "download", "render", "docs", "discord"}
+        assert set(report["meetings"]["meeting_456"]) == {"download", "render", "docs", "discord"}
+        assert metrics.counter("meetings", result="processed") == 1
+
+    def test_local_export_backend(self, tmp_path):
+        mock_zoom = _mock_zoom([{
+            "uuid": "meeting_456", "topic": "新しい会議", "start_time": "2026-02-15T14:00:00Z", "recording_files": [],
+        }])
+        output = LocalExportBackend(str(tmp_path / "export"))
+
+        assert process_recordings(mock_zoom, output, None, []) == ["meeting_456"]
+        (sidecar,) = (tmp_path / "export").glob("*.json")
+        metadata = json.loads(sidecar.read_text())
+        assert metadata["meeting_id"] == "meeting_456"
+        assert [s["speaker"] for s in metadata["speakers"]] == ["田中"]
+        assert "田中" in sidecar.with_suffix(".md").read_text()
+
+    def test_compaction_is_reported(self):
+        mock_zoom = _mock_zoom(
+            [{"uuid": "meeting_0", "topic": "会議", "recording_files": []}],
+            "WEBVTT\n\n" + "".join(
+                f"{i + 1}\n00:00:{i:02d}.000 --> 00:00:{i:02d}.900\n{'田中' if i % 2 else '鈴木'}: 発言{i}\n\n"
+                for i in range(20)
+            ),
+        )
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.return_value = "doc_0"
+        metrics = Metrics()
+
+        process_recordings(mock_zoom, mock_gdocs, None, [], metrics=metrics, compact_window=60)
+
+        markdown = mock_gdocs.create_document.call_args.kwargs["markdown_content"]
+        assert markdown.count("### ") == 1
+        assert metrics.counter("compaction_saved_requests") > 0
+        assert metrics.counter("compaction_saved_chars") > 0
+
+    def test_meetings_over_daily_budget_are_carried_over(self, tmp_path):
+        mock_zoom = _mock_zoom([
+            {"uuid": f"meeting_{i}", "topic": f"会議{i}", "recording_files": []} for i in range(3)
+        ])
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.return_value = "doc"
+        store = ProcessedStore(str(tmp_path / "processed.json"))
+        metrics = Metrics()
+
+        # 1件あたり書き込み3回の見積もりで、7回の予算には2件まで収まる
+        new_ids = process_recordings(
+            mock_zoom, mock_gdocs, None, [], store=store, metrics=metrics,
+            budget=QuotaBudget(google_writes_per_day=7),
+        )
+        assert new_ids == ["meeting_0", "meeting_1"]
+        assert metrics.counter("meetings", result="deferred") == 1
+        reloaded = ProcessedStore(store.path)
+        assert [m["uuid"] for m in reloaded.deferred()] == ["meeting_2"]
+        assert store.failures() == {}
+
+        # 今日の残りでは足りないため、再実行しても繰り越したまま
+        assert process_recordings(
+            mock_zoom, mock_gdocs, None, reloaded.processed_ids, store=reloaded,
+            budget=QuotaBudget(google_writes_per_day=7),
+        ) == []
+
+        # 録画一覧の取得期間から外れても、予算があれば繰り越した会議を処理する
+        mock_zoom.get_recordings.return_value = []
+        assert process_recordings(
+            mock_zoom, mock_gdocs, None, reloaded.processed_ids, store=reloaded,
+            budget=QuotaBudget(google_writes_per_day=100),
+        ) == ["meeting_2"]
+        # 繰り越しにはダウンロードURLを保存しないため、録画情報を取得し直してから処理する
+        mock_zoom.get_meeting_recordings.assert_called_once_with("meeting_2")
+        assert reloaded.deferred() == []
+
+    def test_shards_split_the_remaining_daily_budget(self, tmp_path):
+        meetings = [{"uuid": f"meeting_{i}", "topic": f"会議{i}", "recording_files": []} for i in range(8)]
+        assert all(sum(_shard_of(m["uuid"], 2) == i for m in meetings) >= 2 for i in range(2))
+        days = quota_days(datetime.now(timezone.utc))
+        main_store = ProcessedStore(str(tmp_path / "processed.json"))
+        main_store.add_quota_usage(days, google_writes=90)
+        main_store.save()
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.return_value = "doc"
+
+        # 残り10回を2つのシャードで5回ずつ分け、1件あたり3回の見積もりで各シャード1件まで処理する
+        for index in range(2):
+            shard_store = ProcessedStore(str(tmp_path / f"shard-{index}.json"), seed_path=main_store.path)
+            new_ids = process_recordings(
+                _mock_zoom(meetings), mock_gdocs, None, shard_store.processed_ids, store=shard_store,
+                shard=(index, 2), budget=QuotaBudget(google_writes_per_day=100),
+            )
+            assert len(new_ids) == 1
+            assert shard_store.quota_usage(days)["google_writes"] == 3
+
+        for index in range(2):
+            main_store.merge_from(str(tmp_path / f"shard-{index}.json"))
+        assert ProcessedStore(main_store.path).quota_usage(days)["google_writes"] == 96
+
+    def test_schedule_processes_fresh_small_meetings_first(self, tmp_path):
+        def meeting(uuid, start, size):
+            return {"uuid": uuid, "topic": uuid, "start_time": start, "recording_files": [
+                {"recording_type": "audio_transcript", "file_size": size},
+            ]}
+
+        mock_zoom = _mock_zoom([
+            meeting("backfill", "2025-04-01T09:00:00Z", 100_000),
+            meeting("review", "2026-02-16T13:00:00Z", 90_000),
+            meeting("standup", "2026-02-16T13:00:00Z", 10_000),
+        ])
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.return_value = "doc"
+        store = ProcessedStore(str(tmp_path / "processed.json"))
+
+        # 並べ替えてから予算を計画するため、繰り越されるのは古い会議になる
+        new_ids = process_recordings(
+            mock_zoom, mock_gdocs, None, set(), store=store,
+            budget=QuotaBudget(google_writes_per_day=6),
+            schedule=SchedulePolicy(("recency", "size")),
+        )
+        assert new_ids == ["standup", "review"]
+        titles = [c.kwargs["title"] for c in mock_gdocs.create_document.call_args_list]
+        assert "standup" in titles[0] and "review" in titles[1]
+        assert [m["uuid"] for m in store.deferred()] == ["backfill"]
+
+    def test_processed_meetings_are_indexed(self, tmp_path):
+        mock_zoom = _mock_zoom(
+            [
+                {"uuid": f"meeting_{i}", "topic": f"会議{i}", "start_time": "2026-02-15T14:00:00Z",
+                 "recording_files": []}
+                for i in range(2)
+            ],
+            "WEBVTT\n\n1\n00:01:05.500 --> 00:01:08.000\n田中: 予算を確認します\n",
+        )
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.side_effect = ["doc_0", RuntimeError("boom")]
+        mock_gdocs.get_document_url.side_effect = lambda doc_id: f"https://docs.example/{doc_id}"
+
+        index = SearchIndex(str(tmp_path))
+        process_recordings(mock_zoom, mock_gdocs, None, [], index=index)
+
+        hits = SearchIndex(str(tmp_path)).search("予算")
+        assert [(h.meeting_id, h.speaker, h.start_ms, h.url) for h in hits] == [
+            ("meeting_0", "田中", 65_500, "https://docs.example/doc_0"),
+        ]
+
+    def test_duplicate_recording_links_to_existing_document(self, tmp_path):
+        mock_zoom = _mock_zoom(
+            [
+                {"uuid": f"meeting_{i}", "topic": "定例", "start_time": f"2026-02-15T14:0{i}:00Z",
+                 "recording_files": []}
+                for i in range(2)
+            ],
+            "WEBVTT\n\n" + "".join(
+                f"{i + 1}\n00:00:{i:02d}.000 --> 00:00:{i + 1:02d}.000\n"
+                f"田中: 議題{i}について、来週までの対応方針を確認します。\n\n"
+                for i in range(20)
+            ),
+        )
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.return_value = "doc_0"
+        store = ProcessedStore(str(tmp_path / "processed.json"))
+        metrics = Metrics()
+
+        new_ids = process_recordings(mock_zoom, mock_gdocs, None, [], store=store, metrics=metrics)
+
+        assert sorted(new_ids) == ["meeting_0", "meeting_1"]
+        mock_gdocs.create_document.assert_called_once()
+        assert metrics.counter("meetings", result="processed") == 1
+        assert metrics.counter("meetings", result="duplicate") == 1
+        documents = ProcessedStore(store.path).documents()
+        assert {d["doc_id"] for d in documents.values()} == {"doc_0"}
+        assert sum("duplicate_of" in d for d in documents.values()) == 1
+
+    def test_long_meeting_is_split_into_part_documents(self, tmp_path):
+        mock_zoom = _mock_zoom([
+            {"uuid": "meeting_0", "topic": "ワークショップ", "start_time": "2026-02-15T10:00:00Z", "recording_files": []},
+        ], _utterances_vtt(100))
+        created = []
+        lock = threading.Lock()
+
+        def create_document(title, markdown_content, docs_requests, metadata):
+            with lock:
+                created.append((title, markdown_content))
+                return f"doc_{len(created)}"
+
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.side_effect = create_document
+        mock_gdocs.get_document_url.side_effect = lambda doc_id: f"https://docs.example/{doc_id}"
+        store = ProcessedStore(str(tmp_path / "processed.json"))
+
+        process_recordings(mock_zoom, mock_gdocs, None, [], store=store, part_max_chars=2000)
+
+        *parts, (index_title, index_markdown) = created
+        assert len(parts) > 1
+        assert index_title == "2026-02-15_鈴木、田中【ワークショップ】"
+        part_ids = [f"doc_{no}" for no in range(1, len(parts) + 1)]
+        for doc_id in part_ids:
+            assert f"https://docs.example/{doc_id}" in index_markdown
+        assert "発言0の内容です。" not in index_markdown
+        record = store.documents()["meeting_0"]
+        assert record["doc_id"] == f"doc_{len(created)}"
+        assert sorted(record["parts"]) == part_ids
+
+    def test_early_publish_notifies_before_transcript(self, tmp_path):
+        mock_zoom = _mock_zoom([
+            {"uuid": "meeting_0", "topic": "定例", "start_time": "2026-02-15T10:00:00Z", "recording_files": []},
+        ], _utterances_vtt(1000))
+        mock_zoom.get_recording_url.side_effect = lambda m, t: f"https://zoom.us/download/{t}"
+        mock_zoom.download_summary.return_value = {"overall_summary": "テスト要約"}
+        # 呼び出しの順序を1つのモックに記録する
+        calls = MagicMock()
+        calls.gdocs.create_document.return_value = "doc_0"
+        store = ProcessedStore(str(tmp_path / "processed.json"))
+        metrics = Metrics()
+
+        new_ids = process_recordings(
+            mock_zoom, calls.gdocs, calls.discord, [], store=store, metrics=metrics, early_publish=True,
+        )
+        assert new_ids == ["meeting_0"]
+        names = [name for name, _, _ in calls.mock_calls if name.endswith(("_document", ".notify"))]
+        assert names[:2] == ["gdocs.create_document", "discord.notify"]
+        assert set(names[2:]) == {"gdocs.append_document"} and len(names) > 3
+
+        head = calls.gdocs.create_document.call_args.kwargs["docs_requests"]
+        head_text = "".join(r["insertText"]["text"] for r in head if "insertText" in r)
+        assert "テスト要約" in head_text and "発言0" not in head_text
+        appended = [r for c in calls.gdocs.append_document.call_args_list for r in c.args[1]]
+        full = markdown_to_docs_requests(calls.gdocs.create_document.call_args.kwargs["markdown_content"])
+        assert [r for r in head + appended if "insertText" in r] == [r for r in full if "insertText" in r]
+        assert {c.args[0] for c in calls.gdocs.append_document.call_args_list} == {"doc_0"}
+        assert store.documents()["meeting_0"]["doc_id"] == "doc_0"
+        assert "fill" in metrics.report()["stages"]
+
+    def test_early_publish_links_parts_after_notifying(self, tmp_path):
+        mock_zoom = _mock_zoom([
+            {"uuid": "meeting_0", "topic": "ワークショップ", "start_time": "2026-02-15T10:00:00Z", "recording_files": []},
+        ], _utterances_vtt(100))
+        created = []
+        lock = threading.Lock()
+
+        def create_document(title, markdown_content, docs_requests, metadata):
+            with lock:
+                created.append(title)
+                return f"doc_{len(created)}"
+
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.side_effect = create_document
+        mock_gdocs.get_document_url.side_effect = lambda doc_id: f"https://docs.example/{doc_id}"
+        mock_discord = MagicMock()
+        store = ProcessedStore(str(tmp_path / "processed.json"))
+
+        process_recordings(
+            mock_zoom, mock_gdocs, mock_discord, [], store=store, part_max_chars=2000, early_publish=True,
+        )
+
+        # 目次を先に作成して通知し、パートを作成してからリンクを追記する
+        assert created[0] == "2026-02-15_鈴木、田中【ワークショップ】"
+        mock_discord.notify.assert_called_once()
+        assert mock_discord.notify.call_args.kwargs["gdocs_url"] == "https://docs.example/doc_1"
+        (doc_id, requests), = [c.args for c in mock_gdocs.append_document.call_args_list]
+        assert doc_id == "doc_1"
+        linked = {r["updateTextStyle"]["textStyle"]["link"]["url"] for r in requests if "link" in str(r)}
+        part_ids = [f"doc_{no}" for no in range(2, len(created) + 1)]
+        assert linked == {f"https://docs.example/{i}" for i in part_ids}
+        record = store.documents()["meeting_0"]
+        assert record["doc_id"] == "doc_1"
+        assert sorted(record["parts"]) == part_ids
+
+    def test_early_publish_fill_failure_is_resumed_on_retry(self, tmp_path):
+        # 同じ会議の録画が2つある（重複）
+        mock_zoom = _mock_zoom([
+            {"uuid": uuid, "topic": "定例", "start_time": "2026-02-15T10:00:00Z", "recording_files": []}
+            for uuid in ("A", "B")
+        ], _utterances_vtt(300))
+        created = []
+        lock = threading.Lock()
+
+        def create_document(title, markdown_content, docs_requests, metadata):
+            with lock:
+                created.append(metadata["meeting_id"])
+                return f"doc_{metadata['meeting_id']}"
+
+        fail_fill = {"doc_A"}
+
+        def append_document(doc_id, requests):
+            if doc_id in fail_fill:
+                raise RuntimeError("quota exceeded")
+
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.side_effect = create_document
+        mock_gdocs.append_document.side_effect = append_document
+        mock_discord = MagicMock()
+        store = ProcessedStore(str(tmp_path / "processed.json"))
+
+        assert process_recordings(
+            mock_zoom, mock_gdocs, mock_discord, set(), store=store, early_publish=True,
+        ) == ["B"]
+        # 追記に失敗した会議には重複を紐付けず、通知済みのドキュメントを失敗履歴に残す
+        assert store.documents()["B"]["doc_id"] == "doc_B"
+        assert "duplicate_of" not in store.documents()["B"]
+        assert store.failures()["A"]["doc_id"] == "doc_A"
+        assert mock_discord.notify.call_count == 2
+
+        # バックオフを過ぎた再試行では、通知済みのドキュメントを作り直して追記する
+        state = json.loads((tmp_path / "processed.json").read_text())
+        state["failures"]["A"]["next_retry_at"] = "2000-01-01T00:00:00+00:00"
+        (tmp_path / "processed.json").write_text(json.dumps(state))
+        fail_fill.clear()
+        mock_gdocs.append_document.reset_mock()
+        retry_store = ProcessedStore(str(tmp_path / "processed.json"))
+
+        assert process_recordings(
+            mock_zoom, mock_gdocs, mock_discord, retry_store.processed_ids, store=retry_store, early_publish=True,
+        ) == ["A"]
+        assert sorted(created) == ["A", "B"]
+        assert mock_gdocs.replace_document.call_args.args[0] == "doc_A"
+        assert {c.args[0] for c in mock_gdocs.append_document.call_args_list} == {"doc_A"}
+        assert mock_discord.notify.call_count == 2
+        record = retry_store.documents()["A"]
+        assert record["doc_id"] == "doc_A" and "duplicate_of" not in record
+        assert retry_store.failures() == {}
+
+    def test_requeued_fill_failure_reuses_parts(self, tmp_path):
+        mock_zoom = _mock_zoom([
+            {"uuid": "meeting_0", "topic": "ワークショップ", "start_time": "2026-02-15T10:00:00Z", "recording_files": []},
+        ], _utterances_vtt(100))
+        created = []
+        lock = threading.Lock()
+
+        def create_document(title, markdown_content, docs_requests, metadata):
+            with lock:
+                created.append(title)
+                return f"doc_{len(created)}"
+
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.side_effect = create_document
+        mock_gdocs.append_document.side_effect = RuntimeError("quota exceeded")
+        mock_gdocs.get_document_url.side_effect = lambda doc_id: f"https://docs.example/{doc_id}"
+        path = str(tmp_path / "processed.json")
+        store = ProcessedStore(path)
+
+        assert process_recordings(
+            mock_zoom, mock_gdocs, MagicMock(), set(), store=store, part_max_chars=2000, early_publish=True,
+        ) == []
+        part_ids = [f"doc_{no}" for no in range(2, len(created) + 1)]
+        assert len(part_ids) > 1
+        # 再キューしても、通知済みのドキュメントと作成済みのパートは引き継ぐ
+        assert ProcessedStore(path).requeue("meeting_0")
+        entry = ProcessedStore(path).failures()["meeting_0"]
+        assert entry["doc_id"] == "doc_1"
+        assert sorted(entry["part_doc_ids"]) == part_ids
+
+        mock_gdocs.create_document.reset_mock()
+        mock_gdocs.append_document.reset_mock(side_effect=True)
+        retry_store = ProcessedStore(path)
+
+        assert process_recordings(
+            mock_zoom, mock_gdocs, MagicMock(), retry_store.processed_ids, store=retry_store,
+            part_max_chars=2000, early_publish=True,
+        ) == ["meeting_0"]
+        # パートを作成し直さず、同じドキュメントの本文を作り直す
+        mock_gdocs.create_document.assert_not_called()
+        replaced = [c.args[0] for c in mock_gdocs.replace_document.call_args_list]
+        assert sorted(replaced) == sorted(["doc_1", *part_ids])
+        (doc_id, requests), = [c.args for c in mock_gdocs.append_document.call_args_list]
+        assert doc_id == "doc_1"
+        linked = {r["updateTextStyle"]["textStyle"]["link"]["url"] for r in requests if "link" in str(r)}
+        assert linked == {f"https://docs.example/{i}" for i in part_ids}
+        record = retry_store.documents()["meeting_0"]
+        assert record["doc_id"] == "doc_1"
+        assert sorted(record["parts"]) == part_ids
+
+    def test_downloads_are_archived_and_reused(self, tmp_path):
+        mock_zoom = _mock_zoom([
+            {"uuid": "meeting_0", "topic": "定例", "start_time": "2026-02-15T10:00:00Z", "recording_files": []},
+        ])
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.side_effect = [RuntimeError("boom"), "doc_0"]
+        archive = RawArchive(str(tmp_path))
+
+        assert process_recordings(mock_zoom, mock_gdocs, None, [], archive=archive) == []
+        assert archive.get("meeting_0").vtt_text.endswith("田中: テスト\n")
+
+        # 公開に失敗した会議の再試行ではダウンロードし直さない
+        assert process_recordings(mock_zoom, mock_gdocs, None, [], archive=archive) == ["meeting_0"]
+        mock_zoom.download_transcript.assert_called_once()
+
+    def test_checkpoint_after_each_meeting(self, tmp_path):
+        mock_zoom = _mock_zoom([
+            {
+                "uuid": f"meeting_{i}",
+                "topic": f"会議{i}",
+                "start_time": "2026-02-15T14:00:00Z",
+                "recording_files": [],
+            }
+            for i in range(2)
+        ])
+        path = tmp_path / "processed.json"
+        store = ProcessedStore(str(path))
+
+        def create_document(title, markdown_content, **kwargs):
+            # 2件目の作成時点で1件目が既に保存されていること
+            if "会議1" in title:
+                saved = json.loads(path.read_text())["processed_ids"]
+                assert saved == ["meeting_0"]
+                raise RuntimeError("killed")
+            return "doc_0"
+
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.side_effect = create_document
+
+        new_ids = process_recordings(
+            mock_zoom, mock_gdocs, None, store.processed_ids, store=store,
+        )
+        assert new_ids == ["meeting_0"]
+        assert json.loads(path.read_text())["processed_ids"] == ["meeting_0"]
+
+    def test_failure_is_backed_off_and_notified_once(self, tmp_path):
+        mock_zoom = MagicMock()
+        mock_zoom.get_recordings.return_value = [
+            {"uuid": "meeting_err", "topic": "失敗会議", "recording_files": []},
+        ]
+        mock_zoom.get_recording_url.return_value = "https://zoom.us/download/vtt"
+        mock_zoom.download_transcript.side_effect = RuntimeError("download failed")
+        mock_discord = MagicMock()
+        store = ProcessedStore(str(tmp_path / "processed.json"))
+
+        for _ in range(2):
+            process_recordings(
+                mock_zoom, MagicMock(), mock_discord, store.processed_ids, store=store,
+            )
+
+        assert mock_zoom.download_transcript.call_count == 1
+        mock_discord.notify_error.assert_called_once()
+        assert store.failures()["meeting_err"]["attempts"] == 1
+
+    def test_render_in_process_pool(self):
+        mock_zoom = _mock_zoom([
+            {"uuid": f"meeting_{i}", "topic": f"会議{i}", "recording_files": []}
+            for i in range(3)
+        ])
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.return_value = "doc_abc"
+
+        new_ids = process_recordings(
+            mock_zoom, mock_gdocs, None, set(), cpu_workers=2,
+        )
+        assert new_ids == ["meeting_0", "meeting_1", "meeting_2"]
+        kwargs = mock_gdocs.create_document.call_args.kwargs
+        assert any("insertText" in r for r in kwargs["docs_requests"])
+
+    def test_given_cpu_pool_is_reused_and_left_open(self, caplog):
+        mock_zoom = _mock_zoom([])
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.return_value = "doc_abc"
+        cpu_pool = MagicMock(wraps=ThreadPoolExecutor(max_workers=2))
+
+        with patch("zoom_moji_nayu.__main__.ProcessPoolExecutor") as new_pool:
+            for cycle in range(2):
+                mock_zoom.get_recordings.return_value = [
+                    {"uuid": f"meeting_{cycle}", "topic": "会議", "recording_files": []}
+                ]
+                new_ids = process_recordings(
+                    mock_zoom, mock_gdocs, None, set(), render_workers=4, cpu_workers=2, cpu_pool=cpu_pool,
+                )
+                assert new_ids == [f"meeting_{cycle}"]
+        # 常駐中は同じプロセスプールを使い回し、呼び出しごとに起動・終了しない
+        new_pool.assert_not_called()
+        assert cpu_pool.submit.call_count == 2
+        cpu_pool.shutdown.assert_not_called()
+        assert "render_workers=4 is ignored" in caplog.text
+        cpu_pool.shutdown()
+
+    def test_shards_partition_meetings(self):
+        meetings = [
+            {"uuid": f"uuid_{i}==", "topic": f"会議{i}", "recording_files": []}
+            for i in range(20)
+        ]
+        seen = []
+        for index in range(3):
+            new_ids = process_recordings(
+                _mock_zoom(meetings), MagicMock(), None, set(), shard=(index, 3),
+            )
+            assert all(_shard_of(mid, 3) == index for mid in new_ids)
+            seen.extend(new_ids)
+        assert sorted(seen) == sorted(m["uuid"] for m in meetings)
+
+    def test_explicit_date_range(self):
+        mock_zoom = MagicMock()
+        mock_zoom.get_recordings.return_value = []
+        process_recordings(
+            mock_zoom, MagicMock(), None, set(),
+            from_dt=datetime(2026, 1, 1, tzinfo=timezone.utc),
+            to_dt=datetime(2026, 2, 15, 23, 59, 59, tzinfo=timezone.utc),
+        )
+        calls = [c.kwargs for c in mock_zoom.get_recordings.call_args_list]
+        assert calls[0]["from_date"] == "2026-01-01"
+        assert calls[-1]["to_date"] == "2026-02-15"
+
+    def test_skip_meeting_leased_by_other_run(self, tmp_path):
+        mock_zoom = _mock_zoom([
+            {"uuid": "meeting_a", "topic": "会議A", "recording_files": []},
+            {"uuid": "meeting_b", "topic": "会議B", "recording_files": []},
+        ])
+        path = str(tmp_path / "processed.json")
+        other_run = LeaseManager(ProcessedStore(path), owner="other")
+        assert other_run.claim("meeting_a")
+
+        mock_gdocs = MagicMock()
+        mock_gdocs.create_document.return_value = "doc_b"
+        store = ProcessedStore(path)
+        with LeaseManager(store, owner="this") as leases:
+            new_ids = process_recordings(
+                mock_zoom, mock_gdocs, None, set(), store=store, leases=leases,
+            )
+        assert new_ids == ["meeting_b"]
+        assert mock_zoom.download_transcript.call_count == 1
+        assert store.failures() == {}
+
+
+class TestMain:
+    def test_noop_run_skips_google_and_discord_setup(self, tmp_path):
+        write_noop_cassette(str(tmp_path), meetings=3)
+        argv = ["zoom_moji_nayu", "--replay", str(tmp_path), "--replay-latency-scale", "0"]
+        with patch("sys.argv", argv), patch("zoom_moji_nayu.__main__._build_publishers") as build:
+            main()
+        build.assert_not_called()
+
+    def test_recorded_duplicate_is_linked_again_on_replay(self, tmp_path, monkeypatch):
+        vtt = _utterances_vtt(100)
+        state = tmp_path / "processed.json"
+        original = {"uuid": "orig", "topic": "定例", "start_time": "2026-02-15T10:00:00Z", "recording_files": []}
+        process_recordings(
+            _mock_zoom([original], vtt), LocalExportBackend(str(tmp_path / "before")), None, set(),
+            store=ProcessedStore(str(state)),
+        )
+        duplicate = {
+            "uuid": "dup", "topic": "定例", "start_time": "2026-02-15T10:01:00Z",
+            "recording_files": [{"recording_type": "audio_transcript", "download_url": "https://zoom.us/rec/dup"}],
+        }
+
+        def request(method, url, **kwargs):
+            resp = requests.Response()
+            resp.status_code = 200
+            if "oauth" in url:
+                resp._content = json.dumps({"access_token": "token", "expires_in": 3600}).encode()
+            elif "recordings" in url:
+                resp._content = json.dumps({"meetings": [duplicate]}).encode()
+            else:
+                resp._content = vtt.encode()
+            return resp
+
+        for name in ("ZOOM_ACCOUNT_ID", "ZOOM_CLIENT_ID", "ZOOM_CLIENT_SECRET", "DISCORD_WEBHOOK_URL"):
+            monkeypatch.setenv(name, "x")
+        cassette = str(tmp_path / "cassette")
+        common = ["--state", str(state), "--no-discord", "--replay-latency-scale", "0"]
+        argv = ["zoom_moji_nayu", *common, "--record", cassette, "--export-dir", str(tmp_path / "recorded")]
+        with patch("sys.argv", argv), patch.object(requests.Session, "request", side_effect=request):
+            main()
+        assert not list((tmp_path / "recorded").glob("*.md"))
+
+        # 再生は記録開始時点のドキュメントの指紋から始まるため、同じく重複として紐付ける
+        argv = ["zoom_moji_nayu", *common, "--replay", cassette, "--export-dir", str(tmp_path / "replayed")]
+        with patch("sys.argv", argv), patch.object(requests.Session, "request", side_effect=AssertionError("network")):
+            main()
+        assert not list((tmp_path / "replayed").glob("*.md"))
+        replayed = json.loads((tmp_path / "cassette" / "replay-state.json").read_text())
+        assert replayed["documents"]["dup"]["duplicate_of"] == "orig"
+
+    def test_accounts_are_synced_with_separate_state(self, tmp_path):
+        config = tmp_path / "accounts.toml"
+        config.write_text("".join(
+            f'[[accounts]]\nname = "{name}"\nzoom_account_id = "{name}"\nzoom_client_id = "id"\n'
+            f'zoom_client_secret = "secret"\ndrive_folder_id = "folder-{name}"\n\n'
+            for name in ("sales", "dev", "broken")
+        ) + '[google]\nclient_id = "g"\nclient_secret = "g"\nrefresh_token = "g"\n')
+
+        def zoom_client(account_id, **kwargs):
+            zoom = _mock_zoom([{
+                "uuid": f"{account_id}_meeting", "topic": f"{account_id}の定例",
+                "start_time": "2026-02-15T14:00:00Z", "recording_files": [],
+            }], f"WEBVTT\n\n1\n00:00:00.000 --> 00:00:05.000\n田中: {account_id}のテスト\n")
+            if account_id == "broken":
+                zoom.get_recordings.side_effect = RuntimeError("zoom down")
+            return zoom
+
+        argv = [
+            "zoom_moji_nayu", "--state", str(tmp_path / "processed.json"), "--accounts", str(config),
+            "--export-dir", str(tmp_path / "export"),
+        ]
+        close = patch.object(LocalExportBackend, "close", autospec=True, side_effect=LocalExportBackend.close)
+        with patch("sys.argv", argv), patch("zoom_moji_nayu.__main__.ZoomClient", side_effect=zoom_client), \
+                close as mock_close:
+            with pytest.raises(SystemExit, match="broken"):
+                main()
+        # 書き出したアカウントごとにスレッドプールを止める
+        assert mock_close.call_count == 2
+
+        for name in ("sales", "dev"):
+            state = json.loads((tmp_path / f"processed-{name}.json").read_text())
+            assert state["processed_ids"] == [f"{name}_meeting"]
+            assert len(list((tmp_path / "export" / name).glob("*.md"))) == 1
+        assert not (tmp_path / "processed-broken.json").exists()
+
+    def test_daemon_polls_and_saves_state_on_exit(self, tmp_path):
+        zoom = MagicMock()
+        zoom.get_recordings.return_value = []
+        state = tmp_path / "processed.json"
+        state.write_text('{"processed_ids": ["meeting_old"]}')
+        argv = ["zoom_moji_nayu", "--state", str(state), "daemon", "--max-cycles", "2", "--busy-interval", "0"]
+        stop = threading.Event()
+        with patch("sys.argv", argv), \
+                patch("zoom_moji_nayu.__main__.install_shutdown_handlers", return_value=stop), \
+                patch("zoom_moji_nayu.__main__._build_zoom", return_value=zoom), \
+                patch("zoom_moji_nayu.__main__.PollSchedule.next_interval", return_value=0):
+            main()
+        assert zoom.get_recordings.call_count == 2
+        assert json.loads(state.read_text())["processed_ids"] == ["meeting_old"]
+
+    def test_stop_leaves_unstarted_meetings(self):
+        mock_zoom = _mock_zoom([
+            {"uuid": f"meeting_{i}", "topic": f"会議{i}", "recording_files": []} for i in range(3)
+        ])
+        stop = threading.Event()
+        stop.set()
+        new_ids = process_recordings(mock_zoom, MagicMock(), None, set(), stop=stop)
+        assert new_ids == []
+        mock_zoom.download_transcript.assert_not_called()
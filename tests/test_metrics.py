@@ -0,0 +1,66 @@
+"""実行メトリクスのテスト"""
+
+import json
+from unittest.mock import MagicMock, patch
+
+from zoom_moji_nayu.metrics import DISABLED, Metrics
+from zoom_moji_nayu.zoom_client import ZoomClient
+
+
+class TestMetrics:
+    def test_span_records_stage_and_meeting(self):
+        metrics = Metrics()
+        with metrics.span("download", "m1"):
+            pass
+        metrics.observe("download", 0.5, "m2")
+        report = metrics.report()
+        assert report["stages"]["download"]["count"] == 2
+        assert report["stages"]["download"]["max_seconds"] == 0.5
+        assert set(report["meetings"]) == {"m1", "m2"}
+
+    def test_counters_by_label(self):
+        metrics = Metrics()
+        metrics.incr("api_calls", api="zoom.recordings")
+        metrics.incr("api_calls", api="zoom.recordings")
+        metrics.incr("bytes_received", 1024, api="zoom.transcript")
+        assert metrics.counter("api_calls", api="zoom.recordings") == 2
+        assert metrics.counter("bytes_received", api="zoom.transcript") == 1024
+        json.dumps(metrics.report())
+
+    def test_disabled_records_nothing(self):
+        with DISABLED.span("download", "m1"):
+            DISABLED.incr("api_calls", api="zoom.recordings")
+        report = DISABLED.report()
+        assert report["stages"] == {}
+        assert report["counters"] == []
+
+    def test_prometheus_textfile(self):
+        metrics = Metrics()
+        metrics.incr("rate_limited", api="zoom.recordings")
+        metrics.observe("docs", 1.5, "m1")
+        text = metrics.to_prometheus()
+        assert "# TYPE zoom_moji_nayu_rate_limited_total counter" in text
+        assert 'zoom_moji_nayu_rate_limited_total{api="zoom.recordings"} 1' in text
+        assert 'zoom_moji_nayu_stage_seconds_count{stage="docs"} 1' in text
+        assert "zoom_moji_nayu_run_duration_seconds " in text
+        # 会議IDはラベルにしない（系列数が増え続けるため）
+        assert "m1" not in text
+
+
+class TestClientCounters:
+    @patch("zoom_moji_nayu.zoom_client.time.sleep")
+    @patch("zoom_moji_nayu.zoom_client.requests.get")
+    @patch("zoom_moji_nayu.zoom_client.requests.post")
+    def test_zoom_counts_calls_and_rate_limits(self, mock_post, mock_get, _sleep):
+        mock_post.return_value = MagicMock(status_code=200, json=lambda: {"access_token": "t"})
+        limited = MagicMock(status_code=429)
+        ok = MagicMock(status_code=200, content=b'{"meetings": []}', json=lambda: {"meetings": []})
+        mock_get.side_effect = [limited, ok]
+
+        metrics = Metrics()
+        client = ZoomClient("acc", "cid", "secret", metrics=metrics)
+        client.get_recordings("2026-02-14", "2026-02-15")
+        assert metrics.counter("api_calls", api="zoom.recordings") == 2
+        assert metrics.counter("rate_limited", api="zoom.recordings") == 1
+        assert metrics.counter("retries", api="zoom.recordings") == 1
+        assert metrics.counter("bytes_received", api="zoom.recordings") == len(ok.content)
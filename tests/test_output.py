@@ -0,0 +1,45 @@
+"""議事録の出力先のテスト"""
+
+import json
+import os
+
+from zoom_moji_nayu.output import LocalExportBackend, markdown_to_html
+
+MARKDOWN = (
+    "# 定例 <進捗>\n\n- 日時: 2026-02-15 10:00\n- 録画: https://zoom.us/rec/share/xyz\n\n"
+    "## 文字起こし\n\n### 00:00:00 - 00:00:05\n\n**田中**\nA & B を確認します\n"
+)
+
+
+class TestMarkdownToHtml:
+    def test_elements_are_escaped_and_linked(self):
+        html = markdown_to_html(MARKDOWN, "定例")
+        assert "<h1>定例 &lt;進捗&gt;</h1>" in html
+        assert "<ul>\n<li><strong>日時:</strong> 2026-02-15 10:00</li>" in html
+        assert '<a href="https://zoom.us/rec/share/xyz">https://zoom.us/rec/share/xyz</a></li>\n</ul>' in html
+        assert '<h3 class="timestamp">00:00:00 - 00:00:05</h3>' in html
+        assert '<p class="speaker">田中</p>\n<p>A &amp; B を確認します</p>' in html
+
+
+class TestLocalExportBackend:
+    def test_writes_markdown_html_and_sidecar(self, tmp_path):
+        backend = LocalExportBackend(str(tmp_path))
+        doc_id = backend.create_document("2026-02-15【定例/週次】", MARKDOWN, metadata={"meeting_id": "m1"})
+        backend.close()
+
+        assert doc_id == "2026-02-15【定例_週次】"
+        assert (tmp_path / f"{doc_id}.md").read_text() == MARKDOWN
+        assert "<h2>文字起こし</h2>" in (tmp_path / f"{doc_id}.html").read_text()
+        sidecar = json.loads((tmp_path / f"{doc_id}.json").read_text())
+        assert sidecar["title"] == "2026-02-15【定例/週次】"
+        assert sidecar["meeting_id"] == "m1"
+        assert sidecar["html"] == f"{doc_id}.html"
+        assert backend.get_document_url(doc_id) == (tmp_path / f"{doc_id}.html").as_uri()
+        assert not [name for name in os.listdir(tmp_path) if name.startswith(".tmp-")]
+
+    def test_same_title_gets_distinct_names(self, tmp_path):
+        backend = LocalExportBackend(str(tmp_path))
+        first = backend.create_document("定例", "本文1")
+        second = LocalExportBackend(str(tmp_path)).create_document("定例", "本文2")
+        assert (first, second) == ("定例", "定例_2")
+        assert (tmp_path / "定例.md").read_text() == "本文1"
@@ -0,0 +1,95 @@
+"""パイプライン実行のテスト"""
+
+import threading
+import time
+
+import pytest
+
+from zoom_moji_nayu.pipeline import Stage, run_pipeline
+
+
+class TestRunPipeline:
+    def test_results_in_input_order(self):
+        def slow_for_small(x):
+            # 先頭の要素ほど遅く終わるようにして、完了順と入力順をずらす
+            time.sleep(0.01 * (5 - x))
+            return x
+
+        results = []
+        run_pipeline(
+            range(5),
+            [Stage("slow", slow_for_small, workers=5), Stage("double", lambda x: x * 2)],
+            lambda job: results.append(job.value),
+        )
+        assert results == [0, 2, 4, 6, 8]
+
+    def test_error_skips_later_stages(self):
+        calls = []
+
+        def fail_on_two(x):
+            if x == 2:
+                raise ValueError("bad")
+            return x
+
+        def record(x):
+            calls.append(x)
+            return x
+
+        results = []
+        run_pipeline(
+            range(4),
+            [Stage("check", fail_on_two), Stage("record", record)],
+            results.append,
+        )
+        assert sorted(calls) == [0, 1, 3]
+        failed = [job for job in results if job.error]
+        assert len(failed) == 1
+        assert failed[0].value == 2
+        assert failed[0].failed_stage == "check"
+        assert isinstance(failed[0].error, ValueError)
+
+    def test_bounded_queue_applies_backpressure(self):
+        started = []
+        release = threading.Event()
+
+        def produce(x):
+            started.append(x)
+            return x
+
+        def blocked(x):
+            release.wait()
+            return x
+
+        results = []
+        t = threading.Thread(target=run_pipeline, args=(
+            range(20),
+            [Stage("produce", produce), Stage("blocked", blocked)],
+            results.append,
+        ), kwargs={"queue_size": 2})
+        t.start()
+        time.sleep(0.1)
+        # 下流が止まっている間、上流はキュー容量分しか先に進まない
+        assert len(started) < 10
+        release.set()
+        t.join(timeout=5)
+        assert [job.value for job in results] == list(range(20))
+
+    def test_on_result_error_stops_pipeline_threads(self):
+        calls = []
+
+        def record(x):
+            calls.append(x)
+            return x
+
+        def fail(job):
+            raise RuntimeError("commit failed")
+
+        with pytest.raises(RuntimeError, match="commit failed"):
+            run_pipeline(range(50), [Stage("record", record, workers=2), Stage("next", record)], fail,
+                         queue_size=1)
+        # 残りのジョブは処理されず、パイプラインのスレッドはすべて終了している
+        assert len(calls) < 100
+        deadline = time.monotonic() + 5
+        while any(t.name.startswith("pipeline-") for t in threading.enumerate()) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not any(t.name.startswith("pipeline-") for t in threading.enumerate())
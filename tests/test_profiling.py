@@ -0,0 +1,97 @@
+"""プロファイリングのテスト"""
+
+import cProfile
+import json
+import pstats
+import threading
+import time
+
+from zoom_moji_nayu.metrics import Metrics
+from zoom_moji_nayu import profiling
+from zoom_moji_nayu.profiling import Profiler, safe_filename
+
+
+def _work():
+    return [str(i) * 10 for i in range(2000)]
+
+
+class TestProfiler:
+    def test_safe_filename_keeps_uuids_distinct(self):
+        assert safe_filename("ab/c+d==") == "ab_c-d=="
+        assert safe_filename("a/b") != safe_filename("a+b")
+
+    def test_profile_per_run_and_meeting(self, tmp_path):
+        profiler = Profiler(str(tmp_path), profile="meeting")
+        metrics = Metrics(hooks=[profiler.hook])
+        with profiler:
+            with metrics.span("render", "abc/def=="):
+                _work()
+            with metrics.span("list_recordings"):
+                _work()
+        written = profiler.write()
+
+        names = sorted(p.name for p in tmp_path.iterdir())
+        assert names == [
+            f"meeting-{profiler.run_id}-abc_def==.pstats",
+            f"meeting-{profiler.run_id}-abc_def==.txt",
+            f"run-{profiler.run_id}.pstats",
+            f"run-{profiler.run_id}.txt",
+        ]
+        assert len(written) == 4
+        stats = pstats.Stats(str(tmp_path / f"run-{profiler.run_id}.pstats"))
+        assert any(func[2] == "_work" and stat[0] == 2 for func, stat in stats.stats.items())
+
+    def test_overlapping_spans_on_worker_threads(self, tmp_path, monkeypatch):
+        class ExclusiveProfile(cProfile.Profile):
+            """Python 3.12以降と同じく、同時に1つしか有効にできないプロファイラー。"""
+            active = None
+
+            def enable(self, *args, **kwargs):
+                if ExclusiveProfile.active not in (None, self):
+                    raise ValueError("Another profiling tool is already active")
+                ExclusiveProfile.active = self
+                super().enable(*args, **kwargs)
+
+            def disable(self):
+                super().disable()
+                if ExclusiveProfile.active is self:
+                    ExclusiveProfile.active = None
+
+        monkeypatch.setattr(profiling.cProfile, "Profile", ExclusiveProfile)
+        profiler = Profiler(str(tmp_path), profile="meeting")
+        metrics = Metrics(hooks=[profiler.hook])
+        errors = []
+
+        def fetch(meeting_id: str) -> None:
+            try:
+                with metrics.span("download", meeting_id):
+                    with metrics.span("archive", meeting_id):
+                        _work()
+                    time.sleep(0.05)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=fetch, args=(f"m{no}",)) for no in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert sorted(profiler._meeting_stats) == ["m0", "m1"]
+
+    def test_trace_memory_per_stage(self, tmp_path):
+        profiler = Profiler(str(tmp_path), trace_memory=True)
+        metrics = Metrics(hooks=[profiler.hook])
+        with profiler:
+            with metrics.span("render", "m1"):
+                kept = _work()
+        profiler.write()
+
+        report = json.loads((tmp_path / f"memory-{profiler.run_id}.json").read_text())
+        render = report["stages"]["render"]
+        assert render["spans"] == 1
+        assert render["peak_kib"] > 0
+        assert render["peak_kib_by_meeting"]["m1"] == round(render["peak_kib"], 1)
+        assert any("test_profiling.py" in site["site"] for site in render["top_sites"])
+        assert kept
@@ -0,0 +1,56 @@
+"""API割り当ての見積もり・実行計画のテスト"""
+
+from datetime import datetime, timezone
+
+from zoom_moji_nayu.quota import MeetingCost, QuotaBudget, estimate_cost, plan_run, quota_days
+
+
+def _meeting(size: int | None, summary: bool = False) -> dict:
+    files = [{"recording_type": "audio_transcript", "file_size": size}]
+    if summary:
+        files.append({"recording_type": "summary"})
+    return {"uuid": "m", "recording_files": files}
+
+
+class TestEstimateCost:
+    def test_single_document(self):
+        assert estimate_cost(_meeting(100_000)) == MeetingCost(google_writes=3, zoom_requests=1)
+        assert estimate_cost(_meeting(None, summary=True)) == MeetingCost(google_writes=3, zoom_requests=2)
+
+    def test_split_meeting_counts_parts_and_index(self):
+        # 約100万バイト（8時間）: 約4.7万リクエストで4パート + 目次
+        assert estimate_cost(_meeting(1_000_000)).google_writes == 15
+        assert estimate_cost(_meeting(1_000_000), part_max_chars=10**7, part_max_requests=10**6).google_writes == 3
+
+    def test_early_publish_adds_fill_batches(self):
+        # 12万バイトで約4.8万文字: 2万文字ずつ3回の追記
+        assert estimate_cost(_meeting(120_000), early_publish=True).google_writes == 6
+        assert estimate_cost(_meeting(1_000_000), early_publish=True).google_writes == 16
+
+
+class TestPlanRun:
+    def test_defers_what_does_not_fit_todays_budget(self):
+        costs = {"a": MeetingCost(3, 1), "big": MeetingCost(12, 1), "b": MeetingCost(3, 2), "c": MeetingCost(3, 1)}
+        budget = QuotaBudget(google_writes_per_day=20, zoom_requests_per_day=10, google_writes_per_minute=3)
+        plan = plan_run(list(costs), budget, {"google_writes": 8}, costs.__getitem__)
+        assert plan.scheduled == ["a", "b", "c"]
+        assert plan.deferred == ["big"]
+        assert (plan.google_writes, plan.zoom_requests, plan.minutes) == (9, 4, 3.0)
+
+    def test_no_daily_limit_schedules_everything(self):
+        plan = plan_run(["a", "b"], QuotaBudget(), {}, lambda _: MeetingCost(3, 1))
+        assert plan.scheduled == ["a", "b"] and plan.deferred == []
+
+
+def test_shard_share_splits_what_is_left_today():
+    budget = QuotaBudget(google_writes_per_day=100, zoom_requests_per_day=None, google_writes_per_minute=60)
+    share = budget.shard_share({"google_writes": 91}, 2)
+    assert share == QuotaBudget(google_writes_per_day=4, google_writes_per_minute=60)
+    assert budget.shard_share({"google_writes": 120}, 2).google_writes_per_day == 0
+
+
+def test_quota_days_use_each_reset_timezone():
+    # 協定世界時の2月16日3時は、太平洋時間ではまだ2月15日
+    assert quota_days(datetime(2026, 2, 16, 3, tzinfo=timezone.utc)) == {
+        "google_writes": "2026-02-15", "zoom_requests": "2026-02-16",
+    }
@@ -0,0 +1,39 @@
+"""レート制限のテスト"""
+
+from zoom_moji_nayu.ratelimit import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class TestRateLimiter:
+    def test_calls_are_spaced_by_interval(self):
+        clock = FakeClock()
+        limiter = RateLimiter(60, clock=clock, sleep=clock.sleep)
+        assert [limiter.acquire() for _ in range(3)] == [0.0, 1.0, 1.0]
+        assert clock.now == 2.0
+
+    def test_burst_and_refill(self):
+        clock = FakeClock()
+        limiter = RateLimiter(120, burst=3, clock=clock, sleep=clock.sleep)
+        assert [limiter.acquire() for _ in range(4)] == [0.0, 0.0, 0.0, 0.5]
+        clock.now += 10
+        # 補充はburstまで
+        assert [limiter.acquire() for _ in range(4)] == [0.0, 0.0, 0.0, 0.5]
+
+    def test_waiting_callers_reserve_consecutive_slots(self):
+        clock = FakeClock()
+        slept = []
+        limiter = RateLimiter(60, clock=clock, sleep=slept.append)
+        # 眠っている間に時刻が進まなくても、後続は前の予約の後ろに並ぶ
+        for _ in range(3):
+            limiter.acquire()
+        assert slept == [1.0, 2.0]
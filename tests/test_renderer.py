@@ -0,0 +1,104 @@
+"""議事録生成のテスト"""
+
+from zoom_moji_nayu.formatter import Segment
+from zoom_moji_nayu.renderer import render_meeting, split_segments, staged_requests
+
+MEETING = {"topic": "終日ワークショップ", "start_time": "2026-02-15T10:00:00Z"}
+
+
+def _vtt(cues: int) -> str:
+    lines = ["WEBVTT", ""]
+    for i in range(cues):
+        lines += [
+            str(i + 1),
+            f"00:{i // 60:02d}:{i % 60:02d}.000 --> 00:{i // 60:02d}:{i % 60:02d}.900",
+            f"{'田中' if i % 2 else '鈴木'}: 発言{i}の内容です。",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+class TestSplitSegments:
+    def test_parts_are_balanced_and_within_limits(self):
+        # 1発言あたり84文字。上限いっぱいに詰めると35・35・30件になる
+        segments = [Segment("田中", "あ" * 50, "00:00:00", "00:00:05") for _ in range(100)]
+        parts = split_segments(segments, max_chars=3000, max_requests=10**6)
+        assert [len(p) for p in parts] == [34, 34, 32]
+        assert sum(parts, []) == segments
+
+    def test_request_limit(self):
+        # 1発言あたり9リクエスト
+        segments = [Segment("田中", "発言", "00:00:00", "00:00:05") for _ in range(10)]
+        parts = split_segments(segments, max_chars=10**6, max_requests=40)
+        assert len(parts) == 3
+        assert max(len(p) for p in parts) == 4
+        assert sum(parts, []) == segments
+
+    def test_oversized_segment_gets_own_part(self):
+        segments = [
+            Segment("田中", "短い", "00:00:00", "00:00:05"),
+            Segment("鈴木", "長" * 500, "00:00:05", "00:00:10"),
+            Segment("田中", "短い", "00:00:10", "00:00:15"),
+        ]
+        assert [len(p) for p in split_segments(segments, max_chars=100, max_requests=1000)] == [1, 1, 1]
+
+
+class TestRenderMeeting:
+    def test_short_meeting_is_not_split(self):
+        rendered = render_meeting(MEETING, _vtt(10), None)
+        assert rendered.parts == []
+        assert rendered.docs_requests
+
+    def test_long_meeting_is_split_into_parts(self):
+        rendered = render_meeting(MEETING, _vtt(200), None, max_chars=3000)
+        assert len(rendered.parts) > 1
+        assert rendered.markdown == ""
+        for no, part in enumerate(rendered.parts, 1):
+            assert len(part.markdown) <= 3000
+            assert part.title.endswith(f"（{no}/{len(rendered.parts)}）")
+        assert rendered.parts[0].start == "00:00:00"
+        assert rendered.parts[-1].end == "00:03:19"
+
+        urls = [f"https://docs.example/{no}" for no in range(len(rendered.parts))]
+        markdown, requests = rendered.index_document(urls)
+        assert "## 発言の統計" in markdown
+        assert f"- 第1部（00:00:00 - {rendered.parts[0].end}）: https://docs.example/0" in markdown
+        links = [r for r in requests if "link" in r.get("updateTextStyle", {}).get("textStyle", {})]
+        assert len(links) == len(urls)
+
+    def test_compaction_reduces_requests_but_keeps_segments(self):
+        plain = render_meeting(MEETING, _vtt(120), None)
+        compacted = render_meeting(MEETING, _vtt(120), None, compact_seconds=60)
+
+        assert compacted.segments == plain.segments
+        assert "\n**田中**\n" not in compacted.markdown
+        assert "\n田中: 発言1の内容です。\n" in compacted.markdown
+        stats = compacted.compaction
+        assert stats.requests_after < stats.requests_before // 3
+        assert stats.chars_after < stats.chars_before
+        assert len(plain.docs_requests) - len(compacted.docs_requests) == stats.requests_before - stats.requests_after
+        assert plain.compaction is None
+
+
+class TestStagedRequests:
+    def test_batches_rebuild_the_same_document(self):
+        rendered = render_meeting(MEETING, _vtt(200), {"overall_summary": "要約です"})
+        batches = staged_requests(rendered.markdown, batch_chars=2000)
+        assert len(batches) > 3
+
+        # 1つ目は要約・文字起こしの見出しまでで、発言を含まない
+        head = "".join(r["insertText"]["text"] for r in batches[0] if "insertText" in r)
+        assert "要約です" in head and head.endswith("文字起こし\n")
+        assert "発言0" not in head
+        # 追記する塊は発言の区切りで分かれる
+        for batch in batches[1:]:
+            texts = [r["insertText"]["text"] for r in batch if "insertText" in r]
+            assert next(t for t in texts if t != "\n").startswith("00:")
+
+        def without_font(requests):
+            return [r for r in requests if "weightedFontFamily" not in str(r)]
+
+        staged = [r for batch in batches for r in batch]
+        inserts = [r for r in staged if "insertText" in r]
+        assert inserts == [r for r in rendered.docs_requests if "insertText" in r]
+        assert sorted(map(str, without_font(staged))) == sorted(map(str, without_font(rendered.docs_requests)))
@@ -0,0 +1,74 @@
+"""ドキュメント再生成のテスト"""
+
+from unittest.mock import MagicMock
+
+from zoom_moji_nayu.archive import RawArchive
+from zoom_moji_nayu.rerender import rerender_documents
+from zoom_moji_nayu.state import ProcessedStore
+
+
+def _vtt(cues: int) -> str:
+    lines = ["WEBVTT", ""]
+    for i in range(cues):
+        lines += [
+            str(i + 1),
+            f"00:{i // 60:02d}:{i % 60:02d}.000 --> 00:{i // 60:02d}:{i % 60:02d}.900",
+            f"{'田中' if i % 2 else '鈴木'}: 発言{i}の内容です。",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def _setup(tmp_path, cues: int = 10):
+    store = ProcessedStore(str(tmp_path / "processed.json"))
+    archive = RawArchive(str(tmp_path))
+    for no in (1, 2):
+        meeting = {"uuid": f"m{no}", "topic": f"定例{no}", "start_time": "2026-02-15T10:00:00Z"}
+        archive.put(meeting, _vtt(cues), None)
+        store.mark_processed(f"m{no}", {"doc_id": f"d{no}"})
+    gdocs = MagicMock()
+    gdocs.create_document.side_effect = lambda title, **kwargs: f"new-{title}"
+    gdocs.get_document_url.side_effect = lambda doc_id: f"https://docs.example/{doc_id}"
+    return store, archive, gdocs
+
+
+class TestRerenderDocuments:
+    def test_rerenders_then_skips_unchanged(self, tmp_path):
+        store, archive, gdocs = _setup(tmp_path)
+        results = rerender_documents(store, archive, gdocs)
+        assert results == {"rerendered": 2}
+        assert sorted(c.args[0] for c in gdocs.replace_document.call_args_list) == ["d1", "d2"]
+        gdocs.create_document.assert_not_called()
+        assert all(entry["render_hash"] for entry in store.documents().values())
+
+        gdocs.reset_mock()
+        reloaded = ProcessedStore(store.path)
+        assert rerender_documents(reloaded, archive, gdocs) == {"unchanged": 2}
+        gdocs.replace_document.assert_not_called()
+        assert rerender_documents(reloaded, archive, gdocs, meeting_ids=["m1"], force=True) == {"rerendered": 1}
+
+    def test_skips_duplicates_and_reports_missing_archive(self, tmp_path):
+        store, archive, gdocs = _setup(tmp_path)
+        store.mark_processed("m3", {"doc_id": "d1", "duplicate_of": "m1"})
+        store.mark_processed("m4", {"doc_id": "d4"})
+        results = rerender_documents(store, archive, gdocs)
+        assert results == {"rerendered": 2, "not_archived": 1}
+        assert "d4" not in [c.args[0] for c in gdocs.replace_document.call_args_list]
+
+    def test_dry_run_does_not_touch_google(self, tmp_path):
+        store, archive, _ = _setup(tmp_path)
+        assert rerender_documents(store, archive, None, dry_run=True) == {"changed": 2}
+        assert "render_hash" not in store.documents()["m1"]
+
+    def test_split_meeting_reuses_existing_parts(self, tmp_path):
+        store, archive, gdocs = _setup(tmp_path, cues=200)
+        store.update_document("m1", parts=["p1"])
+        rerender_documents(store, archive, gdocs, meeting_ids=["m1"], part_max_chars=3000)
+
+        parts = store.documents()["m1"]["parts"]
+        assert len(parts) > 2
+        assert parts[0] == "p1"
+        assert all(doc_id.startswith("new-") for doc_id in parts[1:])
+        # 目次はパートのURLが揃ってから書き直す
+        assert [c.args[0] for c in gdocs.replace_document.call_args_list] == ["p1", "d1"]
+        gdocs.get_document_url.assert_any_call("p1")
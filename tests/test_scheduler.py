@@ -0,0 +1,52 @@
+"""処理順の方針のテスト"""
+
+import pytest
+
+from zoom_moji_nayu.scheduler import SchedulePolicy, parse_order, schedule_policy
+
+
+def _meeting(uuid: str, start: str | None, size: int | None = None, host: str = "a@example.com") -> dict:
+    meeting = {"uuid": uuid, "host_email": host, "recording_files": [
+        {"recording_type": "audio_transcript", "file_size": size},
+    ]}
+    if start:
+        meeting["start_time"] = start
+    return meeting
+
+
+MEETINGS = [
+    _meeting("backfill", "2025-04-01T09:00:00Z", 2_000_000),
+    _meeting("standup", "2026-02-16T09:00:00Z", 20_000),
+    _meeting("allhands", "2026-02-16T09:00:00Z", 500_000, host="CEO@example.com"),
+    _meeting("unknown", None, 10_000),
+]
+
+
+def _uuids(meetings: list[dict]) -> list[str]:
+    return [m["uuid"] for m in meetings]
+
+
+class TestSchedulePolicy:
+    def test_recency_then_size(self):
+        policy = SchedulePolicy(("recency", "size"))
+        assert _uuids(policy.order(MEETINGS)) == ["standup", "allhands", "backfill", "unknown"]
+
+    def test_size(self):
+        assert _uuids(SchedulePolicy(("size",)).order(MEETINGS)) == ["unknown", "standup", "allhands", "backfill"]
+
+    def test_priority_host_first_and_stable(self):
+        policy = schedule_policy(priority_hosts=["ceo@example.com"])
+        assert policy.keys == ("host",)
+        assert _uuids(policy.order(MEETINGS)) == ["allhands", "backfill", "standup", "unknown"]
+
+    def test_no_policy_keeps_listing_order(self):
+        assert schedule_policy() is None
+        assert SchedulePolicy().order(MEETINGS) == MEETINGS
+
+
+def test_parse_order():
+    assert parse_order("recency, size") == ("recency", "size")
+    with pytest.raises(ValueError):
+        parse_order("oldest")
+    with pytest.raises(ValueError):
+        parse_order("size,size")
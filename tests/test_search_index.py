@@ -0,0 +1,120 @@
+"""全文検索インデックスのテスト"""
+
+import os
+
+from zoom_moji_nayu import search_index
+from zoom_moji_nayu.formatter import Segment
+from zoom_moji_nayu.search_index import (
+    IndexedMeeting, SearchIndex, format_ms, indexed_meeting, snippet,
+)
+
+
+def _meeting(meeting_id, date, segments, topic="定例"):
+    """(話者, 開始ミリ秒, 本文) のリストから、各発言1秒のIndexedMeetingを作る。"""
+    return IndexedMeeting(
+        meeting_id=meeting_id, topic=topic, date=date, url=f"https://docs.example/{meeting_id}",
+        speakers=list(dict.fromkeys(s for s, _, _ in segments)),
+        segments=[(speaker, start, start + 1000, 1000, text) for speaker, start, text in segments],
+    )
+
+
+def _index(tmp_path, *meetings):
+    index = SearchIndex(str(tmp_path))
+    for meeting in meetings:
+        index.add(meeting)
+    index.commit()
+    return index
+
+
+class TestSearchIndex:
+    def test_finds_japanese_substring_with_speaker_and_timestamp(self, tmp_path):
+        index = _index(tmp_path, _meeting("m1", "2026-02-15 10:00", [
+            ("田中", 0, "今日は予算の話をします"),
+            ("佐藤", 65_000, "来期の予算案を共有します"),
+        ]))
+        hits = index.search("予算案")
+        assert [(h.meeting_id, h.speaker, h.start_ms) for h in hits] == [("m1", "佐藤", 65_000)]
+        assert hits[0].url == "https://docs.example/m1"
+
+    def test_normalizes_width_and_case(self, tmp_path):
+        index = _index(tmp_path, _meeting("m1", "2026-02-15 10:00", [("田中", 0, "ＡＰＩの仕様")]))
+        assert len(index.search("api")) == 1
+
+    def test_single_character_query(self, tmp_path):
+        index = _index(tmp_path, _meeting("m1", "2026-02-15 10:00", [
+            ("田中", 0, "猫"), ("田中", 1000, "犬を飼っています"),
+        ]))
+        assert [h.text for h in index.search("猫")] == ["猫"]
+
+    def test_speaker_filter(self, tmp_path):
+        index = _index(tmp_path, _meeting("m1", "2026-02-15 10:00", [
+            ("田中", 0, "リリースは来週です"), ("佐藤", 1000, "リリースを延期します"),
+        ]))
+        assert [h.speaker for h in index.search("リリース", speaker="佐藤")] == ["佐藤"]
+
+    def test_incremental_commits_and_newest_first(self, tmp_path):
+        _index(tmp_path, _meeting("m1", "2026-02-14 10:00", [("田中", 0, "議事録を確認")]))
+        index = _index(tmp_path, _meeting("m2", "2026-02-15 10:00", [("佐藤", 0, "議事録を共有")]))
+        assert [h.meeting_id for h in index.search("議事録")] == ["m2", "m1"]
+        assert index.meeting_count() == 2
+
+    def test_reindexed_meeting_supersedes_old_content(self, tmp_path):
+        _index(tmp_path, _meeting("m1", "2026-02-15 10:00", [("田中", 0, "古い内容")]))
+        index = _index(tmp_path, _meeting("m1", "2026-02-15 10:00", [("田中", 0, "新しい内容")]))
+        assert index.search("古い") == []
+        assert len(index.search("内容")) == 1
+        assert index.meeting_count() == 1
+
+    def test_compacts_parts(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(search_index, "MAX_PARTS", 2)
+        for no in range(4):
+            _index(tmp_path, _meeting(f"m{no}", f"2026-02-1{no} 10:00", [("田中", no * 1000, f"報告{no}です")]))
+        _index(tmp_path, _meeting("m0", "2026-02-10 10:00", [("田中", 0, "差し替え")]))
+        index = SearchIndex(str(tmp_path))
+        parts = index._manifest()["parts"]
+        assert len(parts) <= 2
+        assert sorted(p for p in os.listdir(index.directory) if p.isdigit()) == sorted(parts)
+        assert [h.meeting_id for h in index.search("報告")] == ["m3", "m2", "m1"]
+        assert [h.meeting_id for h in index.search("差し替え")] == ["m0"]
+
+    def test_compaction_keeps_large_old_part(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(search_index, "MAX_PARTS", 3)
+        _index(tmp_path, *[
+            _meeting(f"old{no}", "2026-01-01 10:00", [("田中", 0, "過去の議事録" * 20)] * 20)
+            for no in range(10)
+        ])
+        index = SearchIndex(str(tmp_path))
+        oldest = index._manifest()["parts"][0]
+        for no in range(4):
+            _index(tmp_path, _meeting(f"m{no}", "2026-02-15 10:00", [("田中", 0, "議事録")]))
+        parts = index._manifest()["parts"]
+        assert parts[0] == oldest
+        assert len(parts) <= 3
+        assert index.meeting_count() == 14
+
+    def test_limit_and_empty_index(self, tmp_path):
+        assert SearchIndex(str(tmp_path)).search("何か") == []
+        index = _index(tmp_path, _meeting("m1", "2026-02-15 10:00", [
+            ("田中", n * 1000, f"確認{n}") for n in range(10)
+        ]))
+        assert len(index.search("確認", limit=3)) == 3
+
+
+class TestIndexedMeeting:
+    def test_from_segments(self):
+        meeting = indexed_meeting("m1", "定例", "2026-02-15 10:00", "https://docs.example/m1", [
+            Segment(
+                speaker="田中", text="こんにちは", start="00:01:05", end="00:01:08",
+                start_ms=65_500, end_ms=68_000, talk_ms=2_500,
+            ),
+        ])
+        assert meeting.segments == [("田中", 65_500, 68_000, 2_500, "こんにちは")]
+        assert meeting.speakers == ["田中"]
+
+    def test_snippet(self):
+        text = "あ" * 50 + "予算" + "い" * 50
+        assert snippet(text, "予算", width=3) == "…あああ予算いいい…"
+        assert snippet("ＡＰＩの仕様", "api") == "apiの仕様"
+
+    def test_format_ms(self):
+        assert format_ms(3_725_000) == "01:02:05"
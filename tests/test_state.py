@@ -0,0 +1,257 @@
+"""処理状態の永続化のテスト"""
+
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+
+from zoom_moji_nayu.state import LeaseManager, ProcessedStore, atomic_write_json
+
+
+class TestAtomicWriteJson:
+    def test_writes_and_leaves_no_temp_files(self, tmp_path):
+        path = tmp_path / "processed.json"
+        atomic_write_json(str(path), {"processed_ids": ["id1"]})
+        assert json.loads(path.read_text()) == {"processed_ids": ["id1"]}
+        assert os.listdir(tmp_path) == ["processed.json"]
+
+    def test_failure_keeps_previous_content(self, tmp_path):
+        path = tmp_path / "processed.json"
+        path.write_text('{"processed_ids": ["old"]}')
+        with patch("zoom_moji_nayu.state.os.replace", side_effect=OSError("disk full")):
+            with pytest.raises(OSError):
+                atomic_write_json(str(path), {"processed_ids": ["new"]})
+        assert json.loads(path.read_text()) == {"processed_ids": ["old"]}
+        assert os.listdir(tmp_path) == ["processed.json"]
+
+
+class TestProcessedStore:
+    def test_missing_file_starts_empty(self, tmp_path):
+        store = ProcessedStore(str(tmp_path / "processed.json"))
+        assert store.processed_ids == set()
+
+    def test_mark_processed_persists_immediately(self, tmp_path):
+        path = tmp_path / "processed.json"
+        path.write_text('{"processed_ids": ["id1"]}')
+        store = ProcessedStore(str(path))
+        store.mark_processed("id2")
+        store.mark_processed("id2")
+        assert json.loads(path.read_text())["processed_ids"] == ["id1", "id2"]
+        assert ProcessedStore(str(path)).processed_ids == {"id1", "id2"}
+
+    def test_failure_backoff_and_dead_letter(self, tmp_path):
+        store = ProcessedStore(str(tmp_path / "processed.json"))
+        now = datetime(2026, 2, 15, 10, 0, tzinfo=timezone.utc)
+
+        entry = store.record_failure("m1", "会議", "boom", now, max_attempts=3)
+        assert entry["attempts"] == 1
+        assert not store.should_attempt("m1", now + timedelta(minutes=59))
+        assert store.should_attempt("m1", now + timedelta(hours=1))
+
+        entry = store.record_failure("m1", "会議", "boom", now, max_attempts=3)
+        assert not store.should_attempt("m1", now + timedelta(hours=1))
+        assert store.should_attempt("m1", now + timedelta(hours=2))
+
+        entry = store.record_failure("m1", "会議", "boom", now, max_attempts=3)
+        assert entry["dead"]
+        assert not store.should_attempt("m1", now + timedelta(days=30))
+
+        reloaded = ProcessedStore(store.path)
+        assert reloaded.failures()["m1"]["attempts"] == 3
+        assert reloaded.requeue("m1")
+        assert reloaded.should_attempt("m1", now)
+        assert not reloaded.requeue("m1")
+
+    def test_requeue_survives_save_from_stale_store(self, tmp_path):
+        path = str(tmp_path / "processed.json")
+        now = datetime(2026, 2, 15, 10, 0, tzinfo=timezone.utc)
+        daemon = ProcessedStore(path)
+        meeting = {"uuid": "m1", "topic": "定例", "start_time": "2026-01-05T10:00:00Z"}
+        daemon.record_failure("m1", "定例", "boom", now, max_attempts=1, meeting=meeting)
+
+        assert ProcessedStore(path).requeue("m1", now + timedelta(days=1))
+        # 再キュー前の失敗履歴を持つ実行が保存しても、再キューは取り消されない
+        daemon.mark_processed("m2")
+        reloaded = ProcessedStore(path)
+        assert reloaded.should_attempt("m1", now + timedelta(days=1))
+        assert reloaded.failures()["m1"]["attempts"] == 0
+        # 録画一覧の取得期間を過ぎた会議も処理対象になるよう繰り越す
+        assert reloaded.deferred() == [meeting]
+
+        reloaded.record_failure("m1", "定例", "boom again", now + timedelta(days=1))
+        daemon.mark_processed("m3")
+        assert ProcessedStore(path).failures()["m1"]["last_error"] == "boom again"
+
+    def test_mark_processed_clears_failure(self, tmp_path):
+        store = ProcessedStore(str(tmp_path / "processed.json"))
+        now = datetime(2026, 2, 15, 10, 0, tzinfo=timezone.utc)
+        store.record_failure("m1", "会議", "boom", now)
+        store.mark_processed("m1")
+        assert store.failures() == {}
+
+    def test_seeded_from_main_state(self, tmp_path):
+        main = tmp_path / "processed.json"
+        main.write_text('{"processed_ids": ["id1"]}')
+        store = ProcessedStore(str(tmp_path / "shard-0.json"), seed_path=str(main))
+        assert store.processed_ids == {"id1"}
+
+    def test_merge_from_shards(self, tmp_path):
+        now = datetime(2026, 2, 15, 10, 0, tzinfo=timezone.utc)
+        main = ProcessedStore(str(tmp_path / "processed.json"))
+        main.mark_processed("id1")
+        days = {"google_writes": "2026-02-15"}
+        main.defer([{"uuid": "id2"}, {"uuid": "id5"}])
+        main.add_quota_usage(days, google_writes=10)
+        main.save()
+        shard0 = ProcessedStore(str(tmp_path / "shard-0.json"), seed_path=main.path)
+        shard0.mark_processed("id2")
+        shard0.record_failure("id4", "会議", "boom", now)
+        shard0.defer([{"uuid": "id6"}])
+        shard0.add_quota_usage(days, google_writes=3)
+        shard0.save()
+        shard1 = ProcessedStore(str(tmp_path / "shard-1.json"), seed_path=main.path)
+        shard1.mark_processed("id3")
+        shard1.record_failure("id2", "会議", "boom", now)
+        shard1.add_quota_usage(days, google_writes=6)
+        shard1.save()
+
+        assert main.merge_from(shard0.path) == 1
+        assert main.merge_from(shard1.path) == 1
+        reloaded = ProcessedStore(main.path)
+        assert reloaded.processed_ids == {"id1", "id2", "id3"}
+        assert set(reloaded.failures()) == {"id4"}
+        # 処理済みになった会議を除き、シャードが繰り越した会議を引き継ぐ
+        assert sorted(m["uuid"] for m in reloaded.deferred()) == ["id5", "id6"]
+        # シャードには元のファイルの使用回数を引き継がず、シャードが使った分だけを加算する
+        assert reloaded.quota_usage(days) == {"google_writes": 19}
+
+    def test_documents_recorded_and_old_minhash_pruned(self, tmp_path):
+        path = str(tmp_path / "processed.json")
+        store = ProcessedStore(path)
+        store.mark_processed("m1", {"doc_id": "d1", "start_time": "2026-02-01T10:00:00Z", "minhash": "AAAA"})
+        store.mark_processed("m2", {"doc_id": "d2", "start_time": "2026-02-07T10:00:00Z", "minhash": "BBBB"})
+        assert ProcessedStore(path).documents()["m1"]["minhash"] == "AAAA"
+
+        store.mark_processed("m3", {"doc_id": "d3", "start_time": "2026-02-10T10:00:00Z", "minhash": "CCCC"})
+        documents = ProcessedStore(path).documents()
+        assert documents["m1"] == {"doc_id": "d1", "start_time": "2026-02-01T10:00:00Z"}
+        assert documents["m2"]["minhash"] == "BBBB"
+
+    def test_merge_documents_from_shard(self, tmp_path):
+        main = ProcessedStore(str(tmp_path / "processed.json"))
+        main.mark_processed("id1", {"doc_id": "d1"})
+        shard = ProcessedStore(str(tmp_path / "shard-0.json"), seed_path=main.path)
+        shard.mark_processed("id2", {"doc_id": "d2"})
+        main.merge_from(shard.path)
+        assert ProcessedStore(main.path).documents() == {"id1": {"doc_id": "d1"}, "id2": {"doc_id": "d2"}}
+
+    def test_update_document(self, tmp_path):
+        path = str(tmp_path / "processed.json")
+        store = ProcessedStore(path)
+        store.mark_processed("m1", {"doc_id": "d1", "parts": ["p1", "p2"]})
+        store.update_document("m1", render_hash="abc", parts=None)
+        assert ProcessedStore(path).documents()["m1"] == {"doc_id": "d1", "render_hash": "abc"}
+
+    def test_update_document_survives_save_from_other_store(self, tmp_path):
+        path = str(tmp_path / "processed.json")
+        store = ProcessedStore(path)
+        store.mark_processed("m1", {"doc_id": "d1", "parts": ["p1", "p2"]})
+        daemon = ProcessedStore(path)
+        rerender = ProcessedStore(path)
+
+        rerender.update_document("m1", render_hash="abc", parts=["p3"])
+        # 古い記録を持つ実行の保存でも、別の実行が更新した項目は戻らない
+        daemon.mark_processed("m2", {"doc_id": "d2"})
+        daemon.update_document("m1", note="x")
+        assert ProcessedStore(path).documents() == {
+            "m1": {"doc_id": "d1", "parts": ["p3"], "render_hash": "abc", "note": "x"},
+            "m2": {"doc_id": "d2"},
+        }
+
+    def test_deferred_meetings_until_processed(self, tmp_path):
+        path = str(tmp_path / "processed.json")
+        store = ProcessedStore(path)
+        store.defer([{"uuid": "m1", "topic": "定例"}, {"uuid": "m2"}])
+        assert [m["uuid"] for m in ProcessedStore(path).deferred()] == ["m1", "m2"]
+        store.mark_processed("m1")
+        assert [m["uuid"] for m in ProcessedStore(path).deferred()] == ["m2"]
+
+    def test_deferred_meetings_keep_no_urls_or_passcodes(self, tmp_path):
+        path = tmp_path / "processed.json"
+        store = ProcessedStore(str(path))
+        store.defer([{
+            "uuid": "m1", "topic": "定例", "start_time": "2026-02-15T10:00:00Z", "host_email": "a@example.com",
+            "share_url": "https://zoom.us/rec/share/secret", "recording_play_passcode": "pass",
+            "recording_files": [{
+                "recording_type": "audio_transcript", "file_size": 1200,
+                "download_url": "https://zoom.us/rec/download/secret", "play_url": "https://zoom.us/rec/play/secret",
+            }],
+        }])
+        assert store.deferred() == [{
+            "uuid": "m1", "topic": "定例", "start_time": "2026-02-15T10:00:00Z", "host_email": "a@example.com",
+            "recording_files": [{"recording_type": "audio_transcript", "file_size": 1200}],
+        }]
+        assert "secret" not in path.read_text() and "pass" not in path.read_text()
+
+    def test_usage_saved_when_meeting_was_processed_elsewhere(self, tmp_path):
+        path = str(tmp_path / "processed.json")
+        days = {"google_writes": "2026-02-15"}
+        store = ProcessedStore(path)
+        store.mark_processed("m1")
+        store.add_quota_usage(days, google_writes=3)
+        store.mark_processed("m1")
+        assert ProcessedStore(path).quota_usage(days) == {"google_writes": 3}
+
+    def test_quota_usage_adds_across_processes(self, tmp_path):
+        path = str(tmp_path / "processed.json")
+        days = {"google_writes": "2026-02-15", "zoom_requests": "2026-02-16"}
+        first, second = ProcessedStore(path), ProcessedStore(path)
+        first.add_quota_usage(days, google_writes=3, zoom_requests=1)
+        assert first.quota_usage(days) == {"google_writes": 3, "zoom_requests": 1}
+        first.save()
+        second.add_quota_usage(days, google_writes=6, zoom_requests=2)
+        second.save()
+        assert ProcessedStore(path).quota_usage(days) == {"google_writes": 9, "zoom_requests": 3}
+        # 日付が変わると0から数える
+        assert ProcessedStore(path).quota_usage({"google_writes": "2026-02-16"}) == {"google_writes": 0}
+
+    def test_save_keeps_ids_written_by_other_process(self, tmp_path):
+        path = str(tmp_path / "processed.json")
+        first = ProcessedStore(path)
+        second = ProcessedStore(path)
+        first.mark_processed("id1")
+        second.mark_processed("id2")
+        assert ProcessedStore(path).processed_ids == {"id1", "id2"}
+
+
+class TestLeaseManager:
+    def test_concurrent_runs_claim_disjoint_meetings(self, tmp_path):
+        path = str(tmp_path / "processed.json")
+        cron = LeaseManager(ProcessedStore(path), owner="cron")
+        manual = LeaseManager(ProcessedStore(path), owner="manual")
+        assert cron.claim("m1")
+        assert not manual.claim("m1")
+        assert manual.claim("m2")
+        cron.release("m1")
+        assert manual.claim("m1")
+
+    def test_expired_lease_can_be_taken_over(self, tmp_path):
+        path = str(tmp_path / "processed.json")
+        crashed = LeaseManager(ProcessedStore(path), ttl=-1, owner="crashed")
+        assert crashed.claim("m1")
+        assert LeaseManager(ProcessedStore(path), owner="next").claim("m1")
+
+    def test_processed_meeting_cannot_be_claimed(self, tmp_path):
+        path = str(tmp_path / "processed.json")
+        other = ProcessedStore(path)
+        leases = LeaseManager(ProcessedStore(path), owner="late")
+        other.mark_processed("m1")
+        assert not leases.claim("m1")
+
+    def test_exit_releases_held_leases(self, tmp_path):
+        path = str(tmp_path / "processed.json")
+        with LeaseManager(ProcessedStore(path), owner="a") as leases:
+            assert leases.claim("m1")
+        assert LeaseManager(ProcessedStore(path), owner="b").claim("m1")
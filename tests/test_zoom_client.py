@@ -57,6 +57,56 @@ class TestZoomClient:
         assert recordings[0]["topic"] == "テスト会議"
         assert recordings[0]["share_url"] == "https://zoom.us/rec/share/abc123"
 
+    @patch("zoom_moji_nayu.zoom_client.requests.get")
+    @patch("zoom_moji_nayu.zoom_client.requests.post")
+    def test_get_recordings_follows_pagination(self, mock_post, mock_get):
+        mock_post.return_value = MagicMock(
+            status_code=200,
+            json=lambda: {"access_token": "test_token", "expires_in": 3600},
+        )
+        pages = [
+            {"meetings": [{"uuid": "m1"}], "next_page_token": "page2"},
+            {"meetings": [{"uuid": "m2"}], "next_page_token": ""},
+        ]
+        mock_get.side_effect = [MagicMock(status_code=200, json=lambda p=p: p) for p in pages]
+        client = self._make_client()
+        recordings = client.get_recordings(from_date="2026-02-01", to_date="2026-02-15")
+        assert [r["uuid"] for r in recordings] == ["m1", "m2"]
+        assert "next_page_token" not in mock_get.call_args_list[0].kwargs["params"]
+        assert mock_get.call_args_list[1].kwargs["params"]["next_page_token"] == "page2"
+
+    @patch("zoom_moji_nayu.zoom_client.time.monotonic")
+    @patch("zoom_moji_nayu.zoom_client.requests.post")
+    def test_token_refreshed_before_expiry(self, mock_post, mock_monotonic):
+        tokens = iter(["token1", "token2"])
+        mock_post.side_effect = lambda *a, **kw: MagicMock(
+            status_code=200, json=lambda t=next(tokens): {"access_token": t, "expires_in": 3600},
+        )
+        client = self._make_client()
+        mock_monotonic.return_value = 1000.0
+        assert client._ensure_token() == "token1"
+        mock_monotonic.return_value = 1000.0 + 3000
+        assert client._ensure_token() == "token1"
+        # 有効期限の5分前を過ぎたら取得し直す
+        mock_monotonic.return_value = 1000.0 + 3301
+        assert client._ensure_token() == "token2"
+        assert mock_post.call_count == 2
+
+    @patch("zoom_moji_nayu.zoom_client.requests.get")
+    @patch("zoom_moji_nayu.zoom_client.requests.post")
+    def test_retry_with_new_token_on_401(self, mock_post, mock_get):
+        tokens = iter(["expired", "fresh"])
+        mock_post.side_effect = lambda *a, **kw: MagicMock(
+            status_code=200, json=lambda t=next(tokens): {"access_token": t, "expires_in": 3600},
+        )
+        mock_get.side_effect = [
+            MagicMock(status_code=401),
+            MagicMock(status_code=200, json=lambda: {"meetings": [], "next_page_token": ""}),
+        ]
+        client = self._make_client()
+        assert client.get_recordings(from_date="2026-02-15", to_date="2026-02-15") == []
+        assert mock_get.call_args_list[1].kwargs["headers"]["Authorization"] == "Bearer fresh"
+
     @patch("zoom_moji_nayu.zoom_client.requests.get")
     @patch("zoom_moji_nayu.zoom_client.requests.post")
     def test_download_transcript(self, mock_post, mock_get):
@@ -73,6 +123,34 @@ class TestZoomClient:
         assert "WEBVTT" in vtt
         assert "テスト" in vtt
 
+    @patch("zoom_moji_nayu.zoom_client.requests.get")
+    @patch("zoom_moji_nayu.zoom_client.requests.post")
+    def test_limiter_paces_api_calls_and_downloads(self, mock_post, mock_get):
+        mock_post.return_value = MagicMock(
+            status_code=200,
+            json=lambda: {"access_token": "test_token", "expires_in": 3600},
+        )
+        mock_get.return_value = MagicMock(status_code=200, text="WEBVTT", json=lambda: {"meetings": []})
+        limiter = MagicMock()
+        client = ZoomClient("test_account", "test_client", "test_secret", limiter=limiter)
+        client.get_recordings(from_date="2026-02-15", to_date="2026-02-15")
+        client.download_transcript("https://zoom.us/download/transcript")
+        assert limiter.acquire.call_count == 2
+
+    @patch("zoom_moji_nayu.zoom_client.requests.get")
+    @patch("zoom_moji_nayu.zoom_client.requests.post")
+    def test_get_meeting_recordings_double_encodes_uuid(self, mock_post, mock_get):
+        mock_post.return_value = MagicMock(
+            status_code=200,
+            json=lambda: {"access_token": "test_token", "expires_in": 3600},
+        )
+        mock_get.return_value = MagicMock(status_code=200, content=b"{}", json=lambda: {"uuid": "/ab//c=="})
+        client = self._make_client()
+        assert client.get_meeting_recordings("/ab//c==")["uuid"] == "/ab//c=="
+        assert mock_get.call_args.args[0] == "https://api.zoom.us/v2/meetings/%252Fab%252F%252Fc%253D%253D/recordings"
+        client.get_meeting_recordings("abc==")
+        assert mock_get.call_args.args[0] == "https://api.zoom.us/v2/meetings/abc%3D%3D/recordings"
+
     def test_get_recording_url_found(self):
         client = self._make_client()
         meeting = {
@@ -3,168 +3,1099 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
+import itertools
 import json
 import logging
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field
 from datetime import datetime, timedelta, timezone
+from functools import partial
 from pathlib import Path
+from typing import TYPE_CHECKING
+from zoneinfo import ZoneInfo
 
-from zoom_moji_nayu.config import get_zoom_config, get_google_config, get_discord_config
+import requests
+
+from zoom_moji_nayu.archive import RawArchive
+from zoom_moji_nayu.config import (
+    AccountConfig, AccountsConfig, get_zoom_config, get_google_config, get_discord_config, load_accounts_config,
+)
+from zoom_moji_nayu.daemon import PollSchedule, install_shutdown_handlers
 from zoom_moji_nayu.zoom_client import ZoomClient
-from zoom_moji_nayu.formatter import (
-    parse_vtt, format_full_document,
-    MeetingMetadata, SummaryData,
+from zoom_moji_nayu.renderer import (
+    PART_MAX_CHARS, PART_MAX_REQUESTS, PART_WORKERS, RenderedMeeting, render_meeting, staged_requests,
+    _extract_participants, _parse_zoom_summary,
 )
-from zoom_moji_nayu.gdocs_client import GDocsClient
 from zoom_moji_nayu.discord_notifier import DiscordNotifier
+from zoom_moji_nayu.formatter import format_duration
+from zoom_moji_nayu.metrics import DISABLED, Metrics
+from zoom_moji_nayu.pipeline import Job, Stage, run_pipeline
+from zoom_moji_nayu.profiling import Profiler
+from zoom_moji_nayu.quota import MeetingCost, QuotaBudget, estimate_cost, plan_run, quota_days
+from zoom_moji_nayu.ratelimit import RateLimiter
+from zoom_moji_nayu.scheduler import SchedulePolicy, parse_order, schedule_policy
+from zoom_moji_nayu.search_index import SearchIndex, format_ms, indexed_meeting, snippet
+from zoom_moji_nayu.state import (
+    LeaseManager, ProcessedStore, atomic_write_json, atomic_write_text, load_processed, save_processed,
+)
+
+if TYPE_CHECKING:
+    from zoom_moji_nayu.fingerprint import DuplicateIndex
+    # Google APIクライアントは読み込みが重いため、処理する会議がある場合にだけimportする
+    from zoom_moji_nayu.cassette import Cassette
+    from zoom_moji_nayu.gdocs_client import GDocsClient
+    from zoom_moji_nayu.output import OutputBackend
 
 logger = logging.getLogger(__name__)
 
 PROCESSED_FILE = str(Path(__file__).parent.parent / "processed.json")
 
 
-def load_processed(path: str) -> list[str]:
-    """処理済みIDリストを読み込む。"""
-    with open(path) as f:
-        data = json.load(f)
-    return data.get("processed_ids", [])
+def _date_chunks(from_dt: datetime, to_dt: datetime, max_days: int = 30):
+    """日付範囲をZoom APIの上限（30日）ごとに分割する。"""
+    cursor = from_dt
+    while cursor < to_dt:
+        chunk_end = min(cursor + timedelta(days=max_days), to_dt)
+        yield cursor.strftime("%Y-%m-%d"), chunk_end.strftime("%Y-%m-%d")
+        cursor = chunk_end + timedelta(days=1)
 
 
-def save_processed(path: str, ids: list[str]) -> None:
-    """処理済みIDリストを保存する。"""
-    with open(path, "w") as f:
-        json.dump({"processed_ids": ids}, f, ensure_ascii=False, indent=2)
+def _shard_of(meeting_id: str, count: int) -> int:
+    """会議UUIDの安定ハッシュからシャード番号を求める（実行環境によらず同じ値になる）。"""
+    digest = hashlib.sha256(meeting_id.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % count
 
 
-def _extract_participants(segments) -> list[str]:
-    """Segmentリストからユニークな話者名を抽出する。"""
-    seen = set()
-    participants = []
-    for seg in segments:
-        if seg.speaker and seg.speaker not in seen:
-            seen.add(seg.speaker)
-            participants.append(seg.speaker)
-    return participants
+def _parse_shard(value: str) -> tuple[int, int]:
+    """'i/n' 形式のシャード指定をパースする。"""
+    try:
+        index, count = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"シャードは i/n 形式で指定してください: {value}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"シャード番号が範囲外です: {value}")
+    return index, count
 
 
-def _parse_zoom_summary(summary_data: dict) -> SummaryData | None:
-    """Zoom AI Companionの要約JSONをSummaryDataに変換する。"""
-    overall = summary_data.get("overall_summary", "")
-    items = summary_data.get("items", [])
+def _parse_order(value: str) -> tuple[str, ...]:
+    """--orderのカンマ区切りの並べ替えキーをパースする。"""
+    try:
+        return parse_order(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
-    chapter_lines = []
-    for item in items:
-        label = item.get("label", "")
-        summary = item.get("summary", "")
-        if label and summary:
-            chapter_lines.append(f"- {label}: {summary}")
-        elif label:
-            chapter_lines.append(f"- {label}")
-        elif summary:
-            chapter_lines.append(f"- {summary}")
 
-    if not overall and not chapter_lines:
-        return None
+def _parse_date(value: str) -> datetime:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日付は YYYY-MM-DD 形式で指定してください: {value}")
 
-    return SummaryData(
-        summary=overall,
-        chapters="\n".join(chapter_lines),
-    )
 
+@dataclass
+class _MeetingJob:
+    """パイプラインの各ステージで受け渡す会議1件分の処理状態。"""
+    meeting: dict
+    transcript_url: str
+    summary_url: str | None = None
+    vtt_text: str = ""
+    summary_json: dict | None = None
+    rendered: RenderedMeeting | None = None
+    doc_id: str = ""
+    # 長い会議を分割した場合の各パートのドキュメントID（doc_idは目次のドキュメント）
+    part_doc_ids: list[str] = field(default_factory=list)
+    # 内容が重複していた元の会議（ドキュメントを作成せずに紐付けた場合）
+    duplicate_of: str | None = None
+    # 早期公開で、作成したドキュメントの末尾に順に追記するbatchUpdateリクエスト
+    fill_requests: list[list[dict]] = field(default_factory=list)
+    # 早期公開で本文の追記を_fill_stageに残した場合にTrue
+    filling: bool = False
+    # 前回の実行で早期公開の通知まで済ませ、本文の追記に失敗したドキュメント（失敗履歴から引き継ぐ）
+    announced_doc_id: str | None = None
+    # そのドキュメントのために前回の実行で作成した各パートのドキュメント
+    announced_part_ids: list[str] = field(default_factory=list)
 
-def _date_chunks(from_dt: datetime, to_dt: datetime, max_days: int = 30):
-    """日付範囲をZoom APIの上限（30日）ごとに分割する。"""
-    cursor = from_dt
-    while cursor < to_dt:
-        chunk_end = min(cursor + timedelta(days=max_days), to_dt)
-        yield cursor.strftime("%Y-%m-%d"), chunk_end.strftime("%Y-%m-%d")
-        cursor = chunk_end + timedelta(days=1)
+    @property
+    def meeting_id(self) -> str:
+        return self.meeting["uuid"]
 
 
-def process_recordings(
+class _ClaimedElsewhere(Exception):
+    """別の実行がリースを保持している、または既に処理済みの会議。"""
+
+
+def _fetch_stage(
     zoom: ZoomClient,
-    gdocs: GDocsClient,
+    leases: LeaseManager | None,
+    archive: RawArchive | None,
+    metrics: Metrics,
+    job: _MeetingJob,
+) -> _MeetingJob:
+    """リースを取得し、文字起こしVTTとZoom AI Companion要約をダウンロードする。
+
+    archiveを渡すとダウンロードしたものを保存する。前回の実行で保存済みの会議（公開に失敗して
+    再試行する場合など）はダウンロードを省く。
+    """
+    if leases and not leases.claim(job.meeting_id):
+        raise _ClaimedElsewhere(job.meeting_id)
+    archived = archive.get(job.meeting_id) if archive else None
+    # 保存時になかった要約が今はある場合はダウンロードし直す
+    if archived and (archived.summary_json is not None or not job.summary_url):
+        logger.info("Using archived transcript: %s", job.meeting_id)
+        job.vtt_text, job.summary_json = archived.vtt_text, archived.summary_json
+        return job
+    with metrics.span("download", job.meeting_id):
+        job.vtt_text = zoom.download_transcript(job.transcript_url)
+        # Zoom AI Companion要約を取得（なければNoneで続行）
+        if job.summary_url:
+            job.summary_json = zoom.download_summary(job.summary_url)
+    if archive:
+        with metrics.span("archive", job.meeting_id):
+            archive.put(job.meeting, job.vtt_text, job.summary_json)
+    return job
+
+
+def _render_stage(
+    pool: Executor | None, metrics: Metrics, render_options: tuple[int, int, int], job: _MeetingJob,
+) -> _MeetingJob:
+    """VTTをパースし、議事録Markdown・タイトル・batchUpdateリクエストを生成する。
+
+    poolを渡した場合はワーカープロセスで生成し、GILを握るパース・整形処理を並列化する。
+    render_optionsは1つのドキュメントに収める文字数・リクエスト数の上限と、文字起こしをまとめる時間枠の秒数。
+    """
+    with metrics.span("render", job.meeting_id):
+        if pool is None:
+            job.rendered = render_meeting(job.meeting, job.vtt_text, job.summary_json, *render_options)
+        else:
+            job.rendered = pool.submit(
+                render_meeting, job.meeting, job.vtt_text, job.summary_json, *render_options,
+            ).result()
+    _report_compaction(metrics, job.meeting_id, job.rendered)
+    # 生成後は元のVTTを保持しておく必要がない
+    job.vtt_text = ""
+    return job
+
+
+def _report_compaction(metrics: Metrics, meeting_id: str, rendered: RenderedMeeting) -> None:
+    """文字起こしを時間枠でまとめた場合の削減量をログとメトリクスに残す。"""
+    stats = rendered.compaction
+    if stats is None:
+        return
+    logger.info("Compacted transcript of %s: %s", meeting_id, stats.describe())
+    metrics.incr("compaction_saved_chars", stats.chars_before - stats.chars_after)
+    metrics.incr("compaction_saved_requests", stats.requests_before - stats.requests_after)
+
+
+def _link_duplicate(duplicates: DuplicateIndex, job: _MeetingJob) -> bool:
+    """内容が重複する会議のドキュメントがあれば紐付けてTrueを返す。なければこの会議を元として登録する。"""
+    while True:
+        pending = duplicates.claim(job.meeting_id, job.rendered.fingerprint, job.meeting.get("start_time", ""))
+        if pending is None:
+            return False
+        # 同じ実行内の元の会議がドキュメントを作成中なら、その完了を待つ
+        linked = pending.result()
+        if linked is not None:
+            job.duplicate_of, job.doc_id = linked
+            logger.info("Linked duplicate recording %s to the document of %s", job.meeting_id, job.duplicate_of)
+            return True
+        # 元の会議のドキュメント作成が失敗した場合は、改めて照合する
+
+
+def _create_documents(output: OutputBackend, job: _MeetingJob) -> str:
+    """議事録のドキュメントを作成してIDを返す。
+
+    文字起こしを分割した会議は、各パートを並行して作成してから、それらへのリンクを載せた目次を作成する。
+    """
+    rendered = job.rendered
+    metadata = {"meeting_id": job.meeting_id, **rendered.export_metadata()}
+    if not rendered.parts:
+        return output.create_document(
+            title=rendered.doc_title,
+            markdown_content=rendered.markdown,
+            docs_requests=rendered.docs_requests,
+            metadata=metadata,
+        )
+
+    job.part_doc_ids = _create_parts(output, job)
+    markdown, docs_requests = rendered.index_document([output.get_document_url(i) for i in job.part_doc_ids])
+    return output.create_document(
+        title=rendered.doc_title, markdown_content=markdown, docs_requests=docs_requests,
+        metadata={**metadata, "parts": job.part_doc_ids},
+    )
+
+
+def _create_parts(output: OutputBackend, job: _MeetingJob) -> list[str]:
+    """分割した文字起こしの各パートのドキュメントを並行して作成し、IDを順に返す。"""
+    parts = job.rendered.parts
+
+    def create_part(numbered) -> str:
+        no, part = numbered
+        return output.create_document(
+            title=part.title, markdown_content=part.markdown, docs_requests=part.docs_requests,
+            metadata={"meeting_id": job.meeting_id, "part": no, "start": part.start, "end": part.end},
+        )
+
+    with ThreadPoolExecutor(max_workers=min(PART_WORKERS, len(parts))) as parts_pool:
+        return list(parts_pool.map(create_part, enumerate(parts, 1)))
+
+
+def _replace_parts(output: GDocsClient, job: _MeetingJob, part_ids: list[str]) -> list[str]:
+    """前回の実行で作成した各パートのドキュメントの本文を、並行して作り直す。"""
+    parts = job.rendered.parts
+
+    def replace_part(numbered) -> str:
+        part_id, part = numbered
+        output.replace_document(part_id, part.title, part.docs_requests)
+        return part_id
+
+    with ThreadPoolExecutor(max_workers=min(PART_WORKERS, len(parts))) as parts_pool:
+        return list(parts_pool.map(replace_part, zip(part_ids, parts)))
+
+
+def _create_head_document(output: GDocsClient, job: _MeetingJob) -> str:
+    """早期公開: 会議情報・要約と文字起こしの見出しまでのドキュメントを作成してIDを返す。
+
+    残りの本文は_fill_stageで追記する。分割した会議のパートへのリンクは、パートの作成後に追記する。
+    前回の実行で通知済みのドキュメントがあれば、新しく作成せずにその本文を見出しまでに作り直す。
+    """
+    rendered = job.rendered
+    markdown = rendered.index_document([""] * len(rendered.parts))[0] if rendered.parts else rendered.markdown
+    head, *job.fill_requests = staged_requests(markdown)
+    job.filling = True
+    if job.announced_doc_id:
+        # 途中まで追記した本文を消してから、改めて末尾に追記する
+        output.replace_document(job.announced_doc_id, rendered.doc_title, head)
+        return job.announced_doc_id
+    return output.create_document(
+        title=rendered.doc_title, markdown_content=markdown, docs_requests=head,
+        metadata={"meeting_id": job.meeting_id, **rendered.export_metadata()},
+    )
+
+
+def _publish_stage(
+    output: OutputBackend,
     discord: DiscordNotifier | None,
+    metrics: Metrics,
+    duplicates: DuplicateIndex,
+    early: bool,
+    job: _MeetingJob,
+) -> _MeetingJob:
+    """出力先（Google Docsなど）にドキュメントを作成し、Discordに通知する。
+
+    文字起こしが既存の会議と重複する場合は、ドキュメントを作成せずにその会議のドキュメントに紐付ける。
+    earlyがTrueの場合は会議情報・要約だけのドキュメントを作成して通知し、文字起こしは_fill_stageで追記する。
+    前回の実行で通知済みのドキュメントがある会議は、earlyに関係なくそのドキュメントに追記し直し、
+    重複の紐付けも再通知もしない。
+    """
+    rendered = job.rendered
+    announced = job.announced_doc_id is not None
+    fingerprinted = rendered.fingerprint is not None and not announced
+    if fingerprinted and _link_duplicate(duplicates, job):
+        return job
+    try:
+        with metrics.span("docs", job.meeting_id):
+            if early or announced:
+                job.doc_id = _create_head_document(output, job)
+            else:
+                job.doc_id = _create_documents(output, job)
+        # 早期公開では、本文の追記を終えるまで重複の紐付け先にしない
+        if fingerprinted and not job.filling:
+            duplicates.resolve(job.meeting_id, job.doc_id)
+
+        if discord and not announced:
+            with metrics.span("discord", job.meeting_id):
+                discord.notify(
+                    meeting_topic=rendered.doc_title,
+                    gdocs_url=output.get_document_url(job.doc_id),
+                    recording_url=rendered.metadata.recording_url,
+                )
+    except BaseException:
+        if fingerprinted and (job.filling or not job.doc_id):
+            duplicates.abandon(job.meeting_id)
+        raise
+    return job
+
+
+def _fill_stage(output: GDocsClient, metrics: Metrics, duplicates: DuplicateIndex, job: _MeetingJob) -> _MeetingJob:
+    """早期公開したドキュメントの末尾に、文字起こし（分割した会議はパートへのリンク）を順に追記する。
+
+    追記を終えてから、同じ内容の会議をこのドキュメントに紐付けられるようにする。
+    前回の実行で作成したパートがあれば、新しく作成せずにその本文を作り直す。
+    """
+    if not job.filling:
+        return job
+    fingerprinted = job.rendered.fingerprint is not None and job.announced_doc_id is None
+    try:
+        with metrics.span("fill", job.meeting_id):
+            rendered = job.rendered
+            if rendered.parts and len(job.announced_part_ids) == len(rendered.parts):
+                job.part_doc_ids = _replace_parts(output, job, job.announced_part_ids)
+            elif rendered.parts:
+                if job.announced_part_ids:
+                    logger.warning(
+                        "Split of %s changed; creating new parts instead of %s", job.meeting_id, job.announced_part_ids,
+                    )
+                job.part_doc_ids = _create_parts(output, job)
+            if rendered.parts:
+                markdown, _ = rendered.index_document([output.get_document_url(i) for i in job.part_doc_ids])
+                job.fill_requests = staged_requests(markdown)[1:]
+            for requests in job.fill_requests:
+                output.append_document(job.doc_id, requests)
+    except BaseException:
+        if fingerprinted:
+            duplicates.abandon(job.meeting_id)
+        logger.warning("Document %s of %s was published without its full transcript", job.doc_id, job.meeting_id)
+        raise
+    if fingerprinted:
+        duplicates.resolve(job.meeting_id, job.doc_id)
+    job.fill_requests = []
+    return job
+
+
+def _document_record(job: _MeetingJob) -> dict:
+    """stateのdocumentsに記録する、ドキュメントID・重複検出用の指紋・生成内容のハッシュ。"""
+    record = {"doc_id": job.doc_id, "start_time": job.meeting.get("start_time", "")}
+    if not job.duplicate_of:
+        # rerenderで書式・レイアウトが変わっていない会議を飛ばすために使う
+        record["render_hash"] = job.rendered.render_hash()
+    if job.rendered.fingerprint is not None:
+        record.update(job.rendered.fingerprint.to_dict())
+    if job.part_doc_ids:
+        record["parts"] = job.part_doc_ids
+    if job.duplicate_of:
+        record["duplicate_of"] = job.duplicate_of
+    return record
+
+
+def list_pending(
+    zoom: ZoomClient,
     processed_ids: set[str],
     days: int = 1,
-) -> list[str]:
-    """未処理の録画を処理し、新たに処理したIDのリストを返す。"""
+    store: ProcessedStore | None = None,
+    from_dt: datetime | None = None,
+    to_dt: datetime | None = None,
+    shard: tuple[int, int] | None = None,
+    metrics: Metrics | None = None,
+    awaiting_transcript: list[dict] | None = None,
+) -> list[_MeetingJob]:
+    """録画一覧を取得し、処理対象の会議を絞り込む。
+
+    storeに繰り越した会議があれば、取得期間に関係なく録画一覧より先に加える。繰り越した会議はダウンロードURLを
+    保存していないため、録画一覧にない会議は処理対象として残った時点で録画情報を取得し直す。
+    処理済み・バックオフ中・担当外のシャード・文字起こしのない会議を除く。
+    awaiting_transcriptにリストを渡すと、文字起こしがまだない会議をそこに追加する。
+    """
+    metrics = metrics or DISABLED
     now = datetime.now(timezone.utc)
-    from_dt = now - timedelta(days=days)
+    to_dt = to_dt or now
+    from_dt = from_dt or to_dt - timedelta(days=days)
 
-    recordings = []
-    for from_date, to_date in _date_chunks(from_dt, now):
-        recordings.extend(zoom.get_recordings(from_date=from_date, to_date=to_date))
-    new_ids: list[str] = []
+    listed: list[dict] = []
+    with metrics.span("list_recordings"):
+        for from_date, to_date in _date_chunks(from_dt, to_dt):
+            listed.extend(zoom.get_recordings(from_date=from_date, to_date=to_date))
+    # API割り当ての不足や再キューで前回までに繰り越した会議を先に処理する
+    listed_by_id = {meeting["uuid"]: meeting for meeting in listed}
+    deferred = store.deferred() if store else []
+    stale = {meeting["uuid"] for meeting in deferred} - listed_by_id.keys()
+    recordings = [listed_by_id.get(meeting["uuid"], meeting) for meeting in deferred] + listed
 
+    jobs: list[_MeetingJob] = []
+    seen: set[str] = set()
     for meeting in recordings:
         meeting_id = meeting["uuid"]
+        if meeting_id in seen:
+            continue
+        seen.add(meeting_id)
+        if shard and _shard_of(meeting_id, shard[1]) != shard[0]:
+            continue
         if meeting_id in processed_ids:
             logger.info("Skipping already processed: %s", meeting_id)
             continue
+        if store and not store.should_attempt(meeting_id, now):
+            logger.info("Skipping failed meeting until backoff expires: %s", meeting_id)
+            continue
+        if meeting_id in stale:
+            try:
+                meeting = zoom.get_meeting_recordings(meeting_id)
+            except requests.RequestException as e:
+                logger.warning("Failed to fetch recordings of carried-over meeting %s: %s", meeting_id, e)
+                continue
 
         transcript_url = zoom.get_recording_url(meeting, "audio_transcript")
         if not transcript_url:
             logger.info("No transcript for: %s", meeting.get("topic", meeting_id))
+            if awaiting_transcript is not None:
+                awaiting_transcript.append(meeting)
             continue
+        jobs.append(_MeetingJob(
+            meeting=meeting,
+            transcript_url=transcript_url,
+            summary_url=zoom.get_recording_url(meeting, "summary"),
+        ))
+    return jobs
+
+
+def process_recordings(
+    zoom: ZoomClient,
+    output: OutputBackend,
+    discord: DiscordNotifier | None,
+    processed_ids: set[str],
+    days: int = 1,
+    store: ProcessedStore | None = None,
+    fetch_workers: int = 1,
+    render_workers: int = 1,
+    publish_workers: int = 1,
+    cpu_workers: int = 0,
+    cpu_pool: Executor | None = None,
+    from_dt: datetime | None = None,
+    to_dt: datetime | None = None,
+    shard: tuple[int, int] | None = None,
+    leases: LeaseManager | None = None,
+    metrics: Metrics | None = None,
+    jobs: list[_MeetingJob] | None = None,
+    stop: threading.Event | None = None,
+    index: SearchIndex | None = None,
+    part_max_chars: int = PART_MAX_CHARS,
+    part_max_requests: int = PART_MAX_REQUESTS,
+    archive: RawArchive | None = None,
+    compact_window: int = 0,
+    budget: QuotaBudget | None = None,
+    schedule: SchedulePolicy | None = None,
+    early_publish: bool = False,
+) -> list[str]:
+    """未処理の録画を処理し、新たに処理したIDのリストを返す。
+
+    ダウンロード・整形・ドキュメント作成の各ステージは有界キューでつながり、
+    それぞれ指定したワーカー数で並行に動く。結果は録画一覧の順に確定する。
+    cpu_workersを1以上にすると、整形ステージをその数のワーカープロセスで実行する（render_workersは使わない）。
+    cpu_poolに起動済みのプロセスプールを渡すと、新しく起動せずにそれを使い、終了時にも閉じない。
+    storeを渡すと、会議1件の処理が終わるたびに処理済みIDを保存する。
+    失敗した会議は指数バックオフで再試行を見送り、上限回数に達したらデッドレターに移す。
+    from_dt/to_dtで期間を明示でき、shard=(i, n)を渡すとUUIDのハッシュがiになる会議だけを処理する。
+    leasesを渡すと会議ごとにリースを取得してから処理し、並行する別の実行と作業を分け合う。
+    metricsを渡すと、録画一覧の取得と会議ごとの各ステージの処理時間を記録する。
+    jobsにlist_pendingの結果を渡すと、録画一覧の取得を省いてそれを処理する。
+    stopがセットされると未着手の会議には手を付けず、処理中の会議だけを完了させて戻る。
+    indexを渡すと、処理した会議の発言を検索インデックスに追加する（実行の最後にまとめて書き出す）。
+    文字起こしが処理済みの会議や同じ実行内の会議と重複する場合は、そのドキュメントに紐付ける。
+    議事録がpart_max_chars文字またはpart_max_requests件のリクエストを超える会議は、文字起こしを
+    複数のドキュメントに分け、それらへのリンクを載せた目次のドキュメントを作成する。
+    archiveを渡すと、ダウンロードしたVTTと要約JSONを圧縮して保存する。
+    outputはドキュメントの出力先で、GDocsClientまたはLocalExportBackendを渡す。
+    compact_windowを1以上にすると、文字起こしをその秒数の時間枠ごとにまとめてリクエスト数を減らす。
+    budgetを渡すと会議ごとのAPI呼び出し回数を見積もってstateに使用回数を記録し、1日の予算の残りに
+    収まらない会議は処理せずに次回の実行へ繰り越す（1分あたりの予算はクライアントのレート制限で守る）。
+    shardと組み合わせると、シャード用のstateファイルを作成した時点の残りの予算をシャード数で等分して使う。
+    scheduleを渡すと、処理待ちの会議をその方針で並べ替えてから予算の計画・処理を行う。
+    early_publishをTrueにすると、会議情報・要約だけのドキュメントを作成した時点でDiscordに通知し、
+    文字起こしは後段のステージで数回のbatchUpdateに分けて追記する（出力先はGDocsClientに限る）。
+    """
+    metrics = metrics or DISABLED
+    now = datetime.now(timezone.utc)
+    if jobs is None:
+        jobs = list_pending(
+            zoom, processed_ids, days=days, store=store,
+            from_dt=from_dt, to_dt=to_dt, shard=shard, metrics=metrics,
+        )
+
+    if schedule is not None:
+        jobs = schedule.order(jobs, lambda job: job.meeting)
+
+    quota_day = quota_days(now)
 
+    def cost_of(job: _MeetingJob) -> MeetingCost:
+        return estimate_cost(job.meeting, part_max_chars, part_max_requests, early_publish)
+
+    if budget is not None and budget.has_daily_limit and jobs:
+        plan_budget = budget
+        if shard:
+            # 並行して動く他のシャードと合わせて1日の予算を超えないよう、シャード開始前の使用回数を除いた残りを等分する
+            plan_budget = budget.shard_share(store.seed_quota_usage(quota_day) if store else {}, shard[1])
+        plan = plan_run(jobs, plan_budget, store.quota_usage(quota_day) if store else {}, cost_of)
+        logger.info("Run plan: %s", plan.describe())
+        if plan.deferred:
+            if store:
+                store.defer([job.meeting for job in plan.deferred])
+            metrics.incr("meetings", len(plan.deferred), result="deferred")
+        jobs = plan.scheduled
+
+    new_ids: list[str] = []
+
+    def charge(job: _MeetingJob) -> None:
+        """見積もった使用回数を、次のチェックポイントで保存するよう記録する。"""
+        if budget is None or not store:
+            return
+        cost = cost_of(job)
+        # 重複として紐付けた会議はドキュメントを作成していない
+        google_writes = 0 if job.duplicate_of else cost.google_writes
+        store.add_quota_usage(quota_day, google_writes=google_writes, zoom_requests=cost.zoom_requests)
+
+    def commit(result: Job) -> None:
+        job: _MeetingJob = result.value
         try:
-            vtt_text = zoom.download_transcript(transcript_url)
-            segments = parse_vtt(vtt_text)
-            participants = _extract_participants(segments)
-
-            start_time = meeting.get("start_time", "")
-            date_str = start_time[:10] + " " + start_time[11:16] if start_time else ""
-            recording_url = meeting.get("share_url", "")
-
-            metadata = MeetingMetadata(
-                date=date_str,
-                topic=meeting.get("topic", "無題の会議"),
-                participants=participants,
-                recording_url=recording_url,
+            record_result(result, job)
+        finally:
+            if leases:
+                leases.release(job.meeting_id)
+
+    def record_result(result: Job, job: _MeetingJob) -> None:
+        meeting_id = job.meeting_id
+        if isinstance(result.error, _ClaimedElsewhere):
+            logger.info("Skipping meeting claimed by another run: %s", meeting_id)
+            metrics.incr("meetings", result="claimed_elsewhere")
+            return
+        charge(job)
+        if result.error is None:
+            metrics.incr("meetings", result="duplicate" if job.duplicate_of else "processed")
+            new_ids.append(meeting_id)
+            if store:
+                store.mark_processed(meeting_id, _document_record(job))
+            if index and not job.duplicate_of:
+                rendered = job.rendered
+                index.add(indexed_meeting(
+                    meeting_id, rendered.metadata.topic, rendered.metadata.date,
+                    output.get_document_url(job.doc_id), rendered.segments,
+                ))
+            logger.info("Processed: %s", job.rendered.metadata.topic)
+            return
+
+        logger.error(
+            "Failed to process meeting at %s stage: %s", result.failed_stage, meeting_id,
+            exc_info=result.error,
+        )
+        metrics.incr("meetings", result="failed", stage=result.failed_stage)
+        topic = job.meeting.get("topic", meeting_id)
+        error_message = str(result.error)
+        if store:
+            # 追記で失敗した会議は通知まで済んでいるため、再試行ではそのドキュメントとパートに追記し直す
+            filling = result.failed_stage == "fill"
+            entry = store.record_failure(
+                meeting_id, topic, error_message, now, meeting=job.meeting,
+                doc_id=job.doc_id if filling else None, part_doc_ids=job.part_doc_ids if filling else None,
+            )
+            if entry["dead"]:
+                error_message = f"{entry['attempts']}回失敗したため再試行を停止しました: {error_message}"
+            elif entry["attempts"] > 1:
+                # 再試行中の失敗は通知せず、初回とデッドレター移行時のみ通知する
+                return
+        if discord:
+            discord.notify_error(
+                meeting_topic=topic,
+                error_message=error_message,
             )
 
-            # Zoom AI Companion要約を取得（なければNoneで続行）
-            summary = None
-            summary_url = zoom.get_recording_url(meeting, "summary")
-            if summary_url:
-                summary_json = zoom.download_summary(summary_url)
-                summary = _parse_zoom_summary(summary_json)
-            else:
-                logger.info("No summary available for: %s", metadata.topic)
+    if not jobs:
+        return new_ids
+
+    from zoom_moji_nayu.fingerprint import DuplicateIndex
+
+    duplicates = DuplicateIndex(store.documents() if store else None)
+    pool = cpu_pool or _cpu_pool(cpu_workers)
+    if cpu_workers > 0:
+        if render_workers != 1:
+            logger.warning(
+                "render_workers=%d is ignored; rendering runs in %d worker processes", render_workers, cpu_workers,
+            )
+        render_workers = cpu_workers
+    items = jobs
+    if stop is not None:
+        items = itertools.takewhile(lambda _: not stop.is_set(), jobs)
+    stages = [
+        Stage("fetch", partial(_fetch_stage, zoom, leases, archive, metrics), fetch_workers),
+        Stage(
+            "render",
+            partial(_render_stage, pool, metrics, (part_max_chars, part_max_requests, compact_window)),
+            render_workers,
+        ),
+        Stage("publish", partial(_publish_stage, output, discord, metrics, duplicates, early_publish), publish_workers),
+    ]
+    if store and hasattr(output, "replace_document"):
+        # 前回の実行で通知まで済ませて追記に失敗した会議は、そのドキュメントに追記し直す
+        failures = store.failures()
+        for job in jobs:
+            entry = failures.get(job.meeting_id, {})
+            job.announced_doc_id = entry.get("doc_id")
+            job.announced_part_ids = entry.get("part_doc_ids", [])
+    if early_publish or any(job.announced_doc_id for job in jobs):
+        # 通知を済ませた会議の文字起こしを追記する間に、次の会議の作成・通知を進める
+        stages.append(Stage("fill", partial(_fill_stage, output, metrics, duplicates), publish_workers))
+    try:
+        run_pipeline(items, stages, commit)
+    finally:
+        if pool is not None and pool is not cpu_pool:
+            pool.shutdown()
+        if index:
+            index.commit()
+
+    return new_ids
+
+
+def _cpu_pool(cpu_workers: int) -> ProcessPoolExecutor | None:
+    """cpu_workersが1以上なら、整形ステージを実行するワーカープロセスのプールを作る。"""
+    if cpu_workers <= 0:
+        return None
+    # スレッド稼働中のforkを避けるためspawnでワーカープロセスを起動する
+    return ProcessPoolExecutor(max_workers=cpu_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _per_minute_limiter(per_minute: float | None) -> RateLimiter | None:
+    return RateLimiter(per_minute) if per_minute else None
+
+
+def _quota_budget(args: argparse.Namespace) -> QuotaBudget | None:
+    """--*-per-minute・--*-per-dayの指定からAPI呼び出しの予算を作る。どれも指定がなければNone。"""
+    budget = QuotaBudget(
+        google_writes_per_minute=args.google_writes_per_minute,
+        google_writes_per_day=args.google_writes_per_day,
+        zoom_requests_per_minute=args.zoom_requests_per_minute,
+        zoom_requests_per_day=args.zoom_requests_per_day,
+    )
+    return budget if budget != QuotaBudget() else None
+
+
+def _schedule_policy(args: argparse.Namespace) -> SchedulePolicy | None:
+    """--order・--priority-hostの指定から処理順の方針を作る。どちらも指定がなければNone。"""
+    return schedule_policy(args.order or (), args.priority_host)
+
+
+def _build_zoom(
+    cassette: Cassette | None,
+    metrics: Metrics | None = None,
+    session: requests.Session | None = None,
+    limiter: RateLimiter | None = None,
+) -> ZoomClient:
+    """Zoomクライアントを生成する。カセット指定時は記録・再生用の接続を使う。"""
+    if cassette and cassette.mode == "replay":
+        # 再生時は認証情報が不要なのでダミー値を使う
+        zoom_config = {"account_id": "replay", "client_id": "replay", "client_secret": "replay"}
+    else:
+        zoom_config = get_zoom_config()
+    if cassette:
+        session = cassette.session()
+    return ZoomClient(**zoom_config, session=session, metrics=metrics, limiter=limiter)
+
+
+def _build_gdocs(
+    cassette: Cassette | None,
+    metrics: Metrics | None = None,
+    write_limiter: RateLimiter | None = None,
+    read_limiter: RateLimiter | None = None,
+) -> GDocsClient:
+    """Google Docsクライアントを生成する。カセット指定時は記録・再生用の接続を使う。"""
+    from zoom_moji_nayu.gdocs_client import GDocsClient, authorized_http
+
+    if cassette and cassette.mode == "replay":
+        google_config = {
+            "client_id": "replay", "client_secret": "replay",
+            "refresh_token": "replay", "drive_folder_id": "replay",
+        }
+    else:
+        google_config = get_google_config()
+
+    http_factory = None
+    if cassette:
+        def http_factory(creds):
+            if cassette.mode == "replay":
+                return cassette.http()
+            return cassette.http(authorized_http(creds))
+
+    return GDocsClient(
+        client_id=google_config["client_id"],
+        client_secret=google_config["client_secret"],
+        refresh_token=google_config["refresh_token"],
+        folder_id=google_config["drive_folder_id"],
+        http_factory=http_factory,
+        metrics=metrics,
+        write_limiter=write_limiter,
+        read_limiter=read_limiter,
+    )
+
+
+def _build_publishers(
+    args: argparse.Namespace,
+    cassette: Cassette | None,
+    metrics: Metrics | None = None,
+    session: requests.Session | None = None,
+) -> tuple[OutputBackend, DiscordNotifier | None]:
+    """ドキュメントの出力先とDiscordのクライアントを生成する。処理する会議がある場合にだけ呼ぶ。
+
+    --export-dirを指定した場合は、Google Docsの代わりにそのディレクトリへ書き出す。
+    """
+    if args.export_dir:
+        from zoom_moji_nayu.output import LocalExportBackend
+
+        output = LocalExportBackend(args.export_dir)
+    else:
+        output = _build_gdocs(cassette, metrics, write_limiter=_per_minute_limiter(args.google_writes_per_minute))
+    if cassette and cassette.mode == "replay":
+        discord_config = {"webhook_url": "https://discord.com/api/webhooks/replay"}
+    else:
+        discord_config = get_discord_config()
+    if cassette:
+        session = cassette.session()
+    discord = None
+    if not args.no_discord:
+        discord = DiscordNotifier(
+            webhook_url=discord_config["webhook_url"], session=session, metrics=metrics,
+        )
+    return output, discord
+
+
+def _close_output(output: OutputBackend) -> None:
+    """出力先が保持するスレッドプールを止める（LocalExportBackend。GDocsClientには止めるものがない）。"""
+    close = getattr(output, "close", None)
+    if close is not None:
+        close()
+
 
-            markdown = format_full_document(segments, metadata, summary)
+def _cmd_failures(args: argparse.Namespace) -> None:
+    """失敗中・デッドレターの会議を一覧表示し、指定があれば再キューする。"""
+    store = ProcessedStore(args.state)
+    failures = store.failures()
 
-            # トピック名に含まれる話者(ホスト)を参加者リストから除外
-            filtered = [p for p in participants[:5] if p not in metadata.topic]
-            participants_str = "、".join(filtered) if filtered else ""
-            if participants_str:
-                doc_title = f"{date_str[:10]}_{participants_str}【{metadata.topic}】"
+    targets = list(args.requeue)
+    if args.requeue_all:
+        targets.extend(mid for mid, entry in failures.items() if entry.get("dead"))
+    if targets:
+        for meeting_id in dict.fromkeys(targets):
+            if store.requeue(meeting_id):
+                print(f"再キューしました: {meeting_id}")
             else:
-                doc_title = f"{date_str[:10]}【{metadata.topic}】"
-            doc_id = gdocs.create_document(title=doc_title, markdown_content=markdown)
-            gdocs_url = gdocs.get_document_url(doc_id)
+                print(f"失敗履歴がありません: {meeting_id}")
+        return
 
-            # Discord通知
-            if discord:
-                discord.notify(
-                    meeting_topic=doc_title,
-                    gdocs_url=gdocs_url,
-                    recording_url=recording_url,
+    if not failures:
+        print("失敗中の会議はありません")
+        return
+    for meeting_id, entry in failures.items():
+        if entry.get("dead"):
+            status = "dead"
+        elif "next_retry_at" not in entry:
+            status = "requeued"
+        else:
+            status = f"retry@{entry['next_retry_at']}"
+        print(
+            f"{meeting_id}\t{entry.get('attempts', 0)}回\t{status}\t"
+            f"{entry.get('topic', '')}\t{entry.get('last_error', '')}"
+        )
+
+
+def _cmd_merge_state(args: argparse.Namespace) -> None:
+    """シャードごとのstateファイルをメインのstateファイルに統合する。"""
+    store = ProcessedStore(args.state)
+    for path in args.shard_states:
+        added = store.merge_from(path)
+        print(f"{path}: {added}件を統合しました")
+
+
+def _cmd_search(args: argparse.Namespace) -> None:
+    """検索インデックスから発言を検索して表示する。"""
+    hits = SearchIndex(args.data_dir).search(args.query, speaker=args.speaker, limit=args.limit)
+    if args.json:
+        print(json.dumps([asdict(hit) for hit in hits], ensure_ascii=False, indent=2))
+        return
+    if not hits:
+        print("見つかりませんでした")
+        return
+    current = None
+    for hit in hits:
+        if hit.meeting_id != current:
+            current = hit.meeting_id
+            print(f"{hit.date}  {hit.topic}  {hit.url}")
+        print(f"  [{format_ms(hit.start_ms)}] {hit.speaker}: {snippet(hit.text, args.query)}")
+
+
+def _cmd_analytics(args: argparse.Namespace) -> None:
+    """検索インデックスに記録された発言から、期間内の話者別の統計を集計して表示する。"""
+    from zoom_moji_nayu.analytics import aggregate_speaker_stats, load_columns
+
+    since = args.since.strftime("%Y-%m-%d") if args.since else None
+    until = args.until.strftime("%Y-%m-%d") if args.until else None
+    columns, meeting_count = load_columns(SearchIndex(args.data_dir), since, until)
+    stats = aggregate_speaker_stats(columns)
+    total = sum(s.talk_ms for s in stats) or 1
+    if args.speaker:
+        stats = [s for s in stats if args.speaker in s.speaker]
+    stats = stats[:args.top]
+    if args.json:
+        print(json.dumps(
+            {"meetings": meeting_count, "speakers": [asdict(s) for s in stats]},
+            ensure_ascii=False, indent=2,
+        ))
+        return
+    print(f"{since or '最初'}〜{until or '現在'}: 会議{meeting_count}件")
+    for s in stats:
+        print(
+            f"  {s.speaker}: {format_duration(s.talk_ms)}（{s.talk_ms * 100 / total:.0f}%）、"
+            f"会議{s.meetings}件、発言{s.turns}回、最長{format_duration(s.longest_ms)}、割り込み{s.interruptions}回"
+        )
+
+
+def _cmd_archive(args: argparse.Namespace) -> None:
+    """アーカイブの件数とサイズ、または指定した会議の保存内容を表示する。"""
+    archive = RawArchive(args.data_dir)
+    if args.show:
+        archived = archive.get(args.show)
+        if archived is None:
+            raise SystemExit(f"アーカイブにありません: {args.show}")
+        if args.summary:
+            print(json.dumps(archived.summary_json, ensure_ascii=False, indent=2))
+        else:
+            print(archived.vtt_text)
+        return
+    stats = archive.stats()
+    ratio = stats["pack_bytes"] * 100 / stats["raw_bytes"] if stats["raw_bytes"] else 0
+    print(
+        f"会議{stats['meetings']}件: {stats['pack_bytes'] / 1e6:.1f}MB"
+        f"（圧縮前{stats['raw_bytes'] / 1e6:.1f}MBの{ratio:.0f}%）"
+    )
+
+
+def _cmd_rerender(args: argparse.Namespace, metrics: Metrics | None) -> None:
+    """アーカイブした文字起こしから、記録したドキュメントの本文を作り直す。"""
+    from zoom_moji_nayu.rerender import rerender_documents
+
+    stop = install_shutdown_handlers()
+    store = ProcessedStore(args.state, seed_path=PROCESSED_FILE)
+    gdocs = None
+    if not args.dry_run:
+        gdocs = _build_gdocs(
+            None, metrics,
+            write_limiter=RateLimiter(args.writes_per_minute),
+            read_limiter=RateLimiter(args.reads_per_minute),
+        )
+    try:
+        results = rerender_documents(
+            store, RawArchive(args.data_dir), gdocs,
+            meeting_ids=args.meeting or None,
+            workers=args.workers,
+            part_max_chars=args.part_max_chars,
+            part_max_requests=args.part_max_requests,
+            compact_window=args.compact_window,
+            force=args.force,
+            dry_run=args.dry_run,
+            metrics=metrics,
+            stop=stop,
+        )
+    finally:
+        if metrics:
+            _export_metrics(metrics, args.metrics_json, args.metrics_prom)
+    summary = ", ".join(f"{count} {result}" for result, count in sorted(results.items())) or "nothing to do"
+    logger.info("Rerender finished: %s", summary)
+
+
+def _parse_hours(value: str) -> tuple[int, int]:
+    """'9-20' 形式の時間帯をパースする。"""
+    try:
+        start, end = (int(x) for x in value.split("-"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"時間帯は 開始-終了 の形式で指定してください: {value}")
+    if not 0 <= start < end <= 24:
+        raise argparse.ArgumentTypeError(f"時間帯が範囲外です: {value}")
+    return start, end
+
+
+def _cmd_daemon(args: argparse.Namespace, metrics: Metrics | None) -> None:
+    """常駐して録画一覧をポーリングし、新しい録画を処理し続ける。
+
+    Zoom・Google・DiscordのクライアントとHTTP接続、整形用のワーカープロセスは起動中ずっと使い回す。
+    SIGTERM・SIGINTを受けると処理中の会議だけを完了させ、処理状態を保存して終了する。
+    """
+    stop = install_shutdown_handlers()
+    schedule = PollSchedule(
+        busy_seconds=args.busy_interval,
+        work_seconds=args.work_interval,
+        idle_seconds=args.idle_interval,
+        work_start_hour=args.work_hours[0],
+        work_end_hour=args.work_hours[1],
+        tz=ZoneInfo(args.timezone),
+    )
+    session = requests.Session()
+    zoom = _build_zoom(None, metrics, session=session, limiter=_per_minute_limiter(args.zoom_requests_per_minute))
+    publishers = None
+    store = ProcessedStore(args.state, seed_path=PROCESSED_FILE)
+    archive = RawArchive(args.data_dir) if args.data_dir else None
+    cpu_pool = _cpu_pool(args.cpu_workers)
+    failures = 0
+
+    with LeaseManager(store) as leases:
+        for cycle in itertools.count(1):
+            awaiting: list[dict] = []
+            jobs: list[_MeetingJob] = []
+            try:
+                jobs = list_pending(
+                    zoom, store.processed_ids, days=args.days, store=store,
+                    shard=args.shard, metrics=metrics, awaiting_transcript=awaiting,
                 )
+                if jobs:
+                    # 初回だけ生成し、以降はdiscoveryの読み込み・トークン・接続を使い回す
+                    if publishers is None:
+                        publishers = _build_publishers(args, None, metrics, session=session)
+                    output, discord = publishers
+                    new_ids = process_recordings(
+                        zoom, output, discord, store.processed_ids, store=store,
+                        fetch_workers=args.fetch_workers,
+                        render_workers=args.render_workers,
+                        publish_workers=args.publish_workers,
+                        cpu_workers=args.cpu_workers,
+                        cpu_pool=cpu_pool,
+                        leases=leases,
+                        metrics=metrics,
+                        jobs=jobs,
+                        stop=stop,
+                        index=SearchIndex(args.data_dir) if args.data_dir else None,
+                        part_max_chars=args.part_max_chars,
+                        part_max_requests=args.part_max_requests,
+                        compact_window=args.compact_window,
+                        archive=archive,
+                        budget=_quota_budget(args),
+                        schedule=_schedule_policy(args),
+                        early_publish=args.early_publish,
+                    )
+                    logger.info("Processed %d new recordings", len(new_ids))
+                failures = 0
+            except Exception:
+                failures += 1
+                logger.exception("Polling failed (%d consecutive)", failures)
+            if metrics:
+                _export_metrics(metrics, args.metrics_json, args.metrics_prom)
 
-            new_ids.append(meeting_id)
-            logger.info("Processed: %s", metadata.topic)
-
-        except Exception as e:
-            logger.exception("Failed to process meeting: %s", meeting_id)
-            if discord:
-                discord.notify_error(
-                    meeting_topic=meeting.get("topic", meeting_id),
-                    error_message=str(e),
+            if stop.is_set() or (args.max_cycles and cycle >= args.max_cycles):
+                break
+            interval = schedule.next_interval(
+                datetime.now(timezone.utc), found=len(jobs),
+                awaiting_transcript=awaiting, failures=failures,
+            )
+            logger.info("Next poll in %ds", interval)
+            if stop.wait(interval):
+                break
+
+    if publishers is not None:
+        _close_output(publishers[0])
+    if cpu_pool is not None:
+        cpu_pool.shutdown()
+    store.save()
+    logger.info("Daemon stopped; state saved to %s", args.state)
+
+
+def _sync_accounts(
+    args: argparse.Namespace, config: AccountsConfig, to_dt: datetime | None, metrics: Metrics | None,
+) -> None:
+    """設定ファイルの各Zoomアカウントの録画を、1つのプロセスで並行して処理する。
+
+    Zoomのレート制限・処理状態・Driveフォルダ・Discord Webhookはアカウントごとに分け、
+    HTTP接続のプール・Googleのクライアントと書き込みのレート制限・整形用のワーカープロセス・--data-dirは
+    全アカウントで共有する。
+    1つのアカウントが失敗しても他のアカウントの処理は続ける。
+    """
+    accounts = config.accounts
+    session = requests.Session()
+    # 全アカウントのワーカーが同じホスト（zoom.us・discord.com）へ同時に接続できるようにする
+    adapter = requests.adapters.HTTPAdapter(
+        pool_maxsize=len(accounts) * (args.fetch_workers + args.publish_workers),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    archive = RawArchive(args.data_dir) if args.data_dir else None
+    state_dir = os.path.dirname(os.path.abspath(args.state))
+    google_lock = threading.Lock()
+    shared_gdocs: GDocsClient | None = None
+    cpu_pool = _cpu_pool(args.cpu_workers)
+
+    def build_output(account: AccountConfig) -> OutputBackend:
+        nonlocal shared_gdocs
+        if args.export_dir:
+            from zoom_moji_nayu.output import LocalExportBackend
+
+            return LocalExportBackend(os.path.join(args.export_dir, account.name))
+        # 新しい録画のあるアカウントが出てから、最初の1回だけ生成する
+        with google_lock:
+            if shared_gdocs is None:
+                from zoom_moji_nayu.gdocs_client import GDocsClient
+
+                shared_gdocs = GDocsClient(
+                    **config.google, folder_id=account.drive_folder_id, metrics=metrics,
+                    write_limiter=RateLimiter(config.google_writes_per_minute),
                 )
-            continue
+        return shared_gdocs.with_folder(account.drive_folder_id)
+
+    def sync(account: AccountConfig) -> int:
+        zoom = ZoomClient(
+            **account.zoom, session=session, metrics=metrics,
+            limiter=RateLimiter(account.zoom_requests_per_minute),
+        )
+        store = ProcessedStore(account.state or os.path.join(state_dir, f"processed-{account.name}.json"))
+        jobs = list_pending(
+            zoom, store.processed_ids, days=args.days, store=store,
+            from_dt=args.from_date, to_dt=to_dt, shard=args.shard, metrics=metrics,
+        )
+        if not jobs:
+            logger.info("[%s] No new recordings to process", account.name)
+            return 0
+        discord = None
+        if account.discord_webhook_url and not args.no_discord:
+            discord = DiscordNotifier(account.discord_webhook_url, session=session, metrics=metrics)
+        output = build_output(account)
+        try:
+            with LeaseManager(store) as leases:
+                new_ids = process_recordings(
+                    zoom, output, discord, store.processed_ids, store=store,
+                    fetch_workers=args.fetch_workers,
+                    render_workers=args.render_workers,
+                    publish_workers=args.publish_workers,
+                    cpu_workers=args.cpu_workers,
+                    cpu_pool=cpu_pool,
+                    leases=leases,
+                    metrics=metrics,
+                    jobs=jobs,
+                    index=SearchIndex(args.data_dir) if args.data_dir else None,
+                    part_max_chars=args.part_max_chars,
+                    part_max_requests=args.part_max_requests,
+                    compact_window=args.compact_window,
+                    archive=archive,
+                    schedule=_schedule_policy(args),
+                    early_publish=args.early_publish,
+                )
+        finally:
+            _close_output(output)
+        logger.info("[%s] Processed %d new recordings", account.name, len(new_ids))
+        return len(new_ids)
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(accounts), thread_name_prefix="account") as pool:
+            futures = {account.name: pool.submit(sync, account) for account in accounts}
+    finally:
+        if cpu_pool is not None:
+            cpu_pool.shutdown()
+    failed = []
+    processed = 0
+    for name, future in futures.items():
+        try:
+            processed += future.result()
+        except Exception:
+            logger.exception("Failed to sync account %s", name)
+            failed.append(name)
+    logger.info("Processed %d new recordings across %d accounts", processed, len(accounts))
+    if failed:
+        raise SystemExit(f"同期に失敗したアカウントがあります: {', '.join(failed)}")
 
-    return new_ids
+
+def _export_metrics(metrics: Metrics, json_path: str | None, prom_path: str | None) -> None:
+    """実行レポートをJSONとPrometheusのtextfile形式で書き出す。"""
+    if json_path:
+        atomic_write_json(json_path, metrics.report())
+        logger.info("Wrote metrics report: %s", json_path)
+    if prom_path:
+        # node_exporterが書きかけのファイルを読まないよう、リネームで置き換える
+        atomic_write_text(prom_path, metrics.to_prometheus())
+        logger.info("Wrote Prometheus metrics: %s", prom_path)
 
 
 def main() -> None:
@@ -173,33 +1104,354 @@ def main() -> None:
         "--days", type=int, default=1,
         help="何日前まで遡って取得するか（デフォルト: 1）",
     )
+    parser.add_argument(
+        "--from", dest="from_date", type=_parse_date,
+        help="取得期間の開始日（YYYY-MM-DD、指定時は--daysより優先）",
+    )
+    parser.add_argument(
+        "--to", dest="to_date", type=_parse_date,
+        help="取得期間の終了日（YYYY-MM-DD、この日を含む。省略時は現在まで）",
+    )
+    parser.add_argument(
+        "--shard", type=_parse_shard,
+        help="i/n 形式。会議UUIDのハッシュでn分割したうちi番目だけを処理する",
+    )
+    parser.add_argument(
+        "--state", default=PROCESSED_FILE,
+        help="処理状態を保存するファイル（デフォルト: processed.json）。"
+             "存在しない場合はprocessed.jsonの内容を引き継いで作成する",
+    )
+    parser.add_argument(
+        "--data-dir",
+        help="検索インデックスなどのローカルデータを置くディレクトリ。"
+             "指定すると処理した文字起こしを索引に追加し、ダウンロードしたVTT・要約をアーカイブに保存する",
+    )
+    parser.add_argument(
+        "--accounts", metavar="FILE",
+        help="複数のZoomアカウントを記述した設定ファイル（TOML）。各アカウントを並行して処理する",
+    )
+    parser.add_argument(
+        "--export-dir", metavar="DIR",
+        help="Google Docsの代わりに、議事録をDIRへMarkdown・HTMLとメタデータのJSONとして書き出す",
+    )
     parser.add_argument(
         "--no-discord", action="store_true",
         help="Discord通知をスキップする",
     )
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument(
+        "--record", metavar="DIR",
+        help="Zoom・Google・Discordとの通信をすべてDIRに記録する",
+    )
+    cassette_group.add_argument(
+        "--replay", metavar="DIR",
+        help="--recordで記録した通信を再生し、認証情報やネットワークなしで処理を実行する",
+    )
+    parser.add_argument(
+        "--replay-latency-scale", type=float, default=1.0,
+        help="再生時に記録された応答時間へ掛ける倍率（0で待機なし、デフォルト: 1.0）",
+    )
+    parser.add_argument(
+        "--fetch-workers", type=int, default=2,
+        help="Zoomからのダウンロードを並行して行うワーカー数（デフォルト: 2）",
+    )
+    parser.add_argument(
+        "--render-workers", type=int,
+        help="VTTのパース・整形を行うワーカー数（デフォルト: 1）",
+    )
+    parser.add_argument(
+        "--cpu-workers", type=int, default=0,
+        help="パース・整形をワーカープロセスで実行する場合のプロセス数（デフォルト: 0 = スレッドで実行）。"
+        "--render-workers とは併用できない",
+    )
+    parser.add_argument(
+        "--publish-workers", type=int, default=1,
+        help="Google Docs作成・Discord通知を並行して行うワーカー数（デフォルト: 1）",
+    )
+    parser.add_argument(
+        "--part-max-chars", type=int, default=PART_MAX_CHARS,
+        help=f"1つのドキュメントに収める議事録の文字数。超える会議は文字起こしを分割する（デフォルト: {PART_MAX_CHARS}）",
+    )
+    parser.add_argument(
+        "--part-max-requests", type=int, default=PART_MAX_REQUESTS,
+        help=f"1つのドキュメントのbatchUpdateリクエスト数の上限。超える会議は文字起こしを分割する（デフォルト: {PART_MAX_REQUESTS}）",
+    )
+    parser.add_argument(
+        "--google-writes-per-minute", type=float, metavar="N",
+        help="Google Docs/Driveの書き込みを1分あたりN回までに抑える",
+    )
+    parser.add_argument(
+        "--google-writes-per-day", type=int, metavar="N",
+        help="Google Docs/Driveの書き込みの1日の予算。見積もりが残りを超える会議は次回の実行に繰り越す",
+    )
+    parser.add_argument(
+        "--zoom-requests-per-minute", type=float, metavar="N",
+        help="Zoom APIの呼び出し・ダウンロードを1分あたりN回までに抑える",
+    )
+    parser.add_argument(
+        "--zoom-requests-per-day", type=int, metavar="N",
+        help="Zoomのダウンロードの1日の予算。見積もりが残りを超える会議は次回の実行に繰り越す",
+    )
+    parser.add_argument(
+        "--order", type=_parse_order, metavar="KEYS",
+        help="処理待ちの会議を並べ替えるキーをカンマ区切りで指定する。"
+        "host（--priority-hostの主催者が先）・recency（新しい順）・size（文字起こしが小さい順）"
+        "（例: recency,size。デフォルト: 録画一覧の順）",
+    )
+    parser.add_argument(
+        "--priority-host", action="append", default=[], metavar="EMAIL",
+        help="この主催者（メールアドレスまたはユーザーID）の会議を先に処理する（複数指定可）",
+    )
+    parser.add_argument(
+        "--early-publish", action="store_true",
+        help="会議情報・要約だけのドキュメントを作成した時点でDiscordに通知し、文字起こしは後から追記する",
+    )
+    parser.add_argument(
+        "--compact-window", type=int, default=0, metavar="SECONDS",
+        help="文字起こしをこの秒数の時間枠ごとに、話者名付きの行でまとめる（例: 60。デフォルト: 0でまとめない）",
+    )
+    parser.add_argument(
+        "--metrics-json", metavar="PATH",
+        help="ステージごとの処理時間・API呼び出し回数などの実行レポートをJSONで書き出す",
+    )
+    parser.add_argument(
+        "--metrics-prom", metavar="PATH",
+        help="実行メトリクスをPrometheusのtextfile形式（.prom）で書き出す",
+    )
+    parser.add_argument(
+        "--profile", nargs="?", const="run", choices=["run", "meeting"],
+        help="cProfileで各ステージを計測し、pstatsを書き出す。"
+             "meetingを指定すると会議ごとのファイルも書き出す",
+    )
+    parser.add_argument(
+        "--trace-memory", action="store_true",
+        help="tracemallocで各ステージのピークメモリと確保量の多い箇所を記録する（ステージは直列に実行される）",
+    )
+    parser.add_argument(
+        "--profile-dir", default="profiles",
+        help="--profile・--trace-memoryの出力先ディレクトリ（デフォルト: profiles）",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    failures_parser = subparsers.add_parser(
+        "failures", help="失敗中・デッドレターの会議を表示・再キューする",
+    )
+    failures_parser.add_argument(
+        "--requeue", action="append", default=[], metavar="UUID",
+        help="指定した会議の失敗履歴を消去して再処理対象に戻す（複数指定可）",
+    )
+    failures_parser.add_argument(
+        "--requeue-all", action="store_true",
+        help="デッドレターの会議をすべて再処理対象に戻す",
+    )
+    merge_parser = subparsers.add_parser(
+        "merge-state", help="シャードごとのstateファイルを--stateのファイルに統合する",
+    )
+    merge_parser.add_argument("shard_states", nargs="+", metavar="SHARD_STATE")
+    search_parser = subparsers.add_parser(
+        "search", help="処理済みの文字起こしを--data-dirの検索インデックスから検索する",
+    )
+    search_parser.add_argument("query", help="検索語")
+    search_parser.add_argument("--speaker", help="話者名で絞り込む（部分一致）")
+    search_parser.add_argument("--limit", type=int, default=50, help="表示する件数（デフォルト: 50）")
+    search_parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    analytics_parser = subparsers.add_parser(
+        "analytics", help="--data-dirの検索インデックスから話者別の発言統計を集計する",
+    )
+    analytics_parser.add_argument("--since", type=_parse_date, help="集計期間の開始日（YYYY-MM-DD）")
+    analytics_parser.add_argument("--until", type=_parse_date, help="集計期間の終了日（YYYY-MM-DD、この日を含む）")
+    analytics_parser.add_argument("--speaker", help="話者名で絞り込む（部分一致）")
+    analytics_parser.add_argument("--top", type=int, default=30, help="表示する話者の数（デフォルト: 30）")
+    analytics_parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    archive_parser = subparsers.add_parser(
+        "archive", help="--data-dirに保存した文字起こしのアーカイブを確認する",
+    )
+    archive_parser.add_argument("--show", metavar="UUID", help="指定した会議の保存したVTTを表示する")
+    archive_parser.add_argument("--summary", action="store_true", help="--showでVTTの代わりに要約JSONを表示する")
+    rerender_parser = subparsers.add_parser(
+        "rerender", help="--data-dirのアーカイブから、作成済みのドキュメントを現在のレイアウト・書式で作り直す",
+    )
+    rerender_parser.add_argument(
+        "--meeting", action="append", default=[], metavar="UUID",
+        help="指定した会議だけを作り直す（複数指定可）",
+    )
+    rerender_parser.add_argument(
+        "--workers", type=int, default=4,
+        help="ドキュメントを並行して更新するワーカー数（デフォルト: 4）",
+    )
+    rerender_parser.add_argument(
+        "--writes-per-minute", type=float, default=60,
+        help="Google APIの書き込みの1分あたりの上限（デフォルト: 60）",
+    )
+    rerender_parser.add_argument(
+        "--reads-per-minute", type=float, default=300,
+        help="Google APIの読み取りの1分あたりの上限（デフォルト: 300）",
+    )
+    rerender_parser.add_argument(
+        "--force", action="store_true", help="内容が変わっていない会議も作り直す",
+    )
+    rerender_parser.add_argument(
+        "--dry-run", action="store_true", help="作り直す会議を表示するだけで、Googleには接続しない",
+    )
+    daemon_parser = subparsers.add_parser(
+        "daemon", help="常駐して録画一覧をポーリングし、新しい録画を処理し続ける",
+    )
+    daemon_parser.add_argument(
+        "--busy-interval", type=float, default=60,
+        help="会議の終了直後・新しい録画があった後のポーリング間隔（秒、デフォルト: 60）",
+    )
+    daemon_parser.add_argument(
+        "--work-interval", type=float, default=300,
+        help="勤務時間帯のポーリング間隔（秒、デフォルト: 300）",
+    )
+    daemon_parser.add_argument(
+        "--idle-interval", type=float, default=1800,
+        help="夜間・休日のポーリング間隔（秒、デフォルト: 1800）",
+    )
+    daemon_parser.add_argument(
+        "--work-hours", type=_parse_hours, default=(9, 20),
+        help="勤務時間帯（平日、開始-終了の時、デフォルト: 9-20）",
+    )
+    daemon_parser.add_argument(
+        "--timezone", default="Asia/Tokyo",
+        help="勤務時間帯のタイムゾーン（デフォルト: Asia/Tokyo）",
+    )
+    daemon_parser.add_argument(
+        "--max-cycles", type=int, default=0,
+        help="指定した回数だけポーリングして終了する（0で無制限、動作確認用）",
+    )
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
-    zoom_config = get_zoom_config()
-    google_config = get_google_config()
-    discord_config = get_discord_config()
+    if args.command == "failures":
+        _cmd_failures(args)
+        return
+    if args.command == "merge-state":
+        _cmd_merge_state(args)
+        return
+    if args.command in ("search", "analytics", "archive"):
+        if not args.data_dir:
+            parser.error(f"{args.command} には --data-dir を指定してください")
+        if args.command == "search":
+            _cmd_search(args)
+        elif args.command == "analytics":
+            _cmd_analytics(args)
+        else:
+            _cmd_archive(args)
+        return
+    if args.command == "rerender":
+        if not args.data_dir:
+            parser.error("rerender には --data-dir を指定してください")
+        if args.export_dir:
+            parser.error("rerender はGoogle Docsのドキュメントだけを作り直すため、--export-dir とは併用できません")
+        _cmd_rerender(args, Metrics() if args.metrics_json or args.metrics_prom else None)
+        return
+    if args.cpu_workers > 0 and args.render_workers is not None:
+        parser.error("--cpu-workers を指定すると整形はワーカープロセスで行うため、--render-workers とは併用できません")
+    if args.render_workers is None:
+        args.render_workers = 1
+    if args.early_publish and args.export_dir:
+        parser.error("--early-publish はGoogle Docsに作成する場合だけ使えるため、--export-dir とは併用できません")
+    if args.command == "daemon":
+        if args.accounts:
+            parser.error("daemon では --accounts は使えません")
+        if args.record or args.replay or args.from_date or args.to_date:
+            parser.error("daemon では --record・--replay・--from・--to は使えません")
+        if args.profile or args.trace_memory:
+            parser.error("daemon では --profile・--trace-memory は使えません")
+        _cmd_daemon(args, Metrics() if args.metrics_json or args.metrics_prom else None)
+        return
 
-    zoom = ZoomClient(**zoom_config)
-    gdocs = GDocsClient(
-        client_id=google_config["client_id"],
-        client_secret=google_config["client_secret"],
-        refresh_token=google_config["refresh_token"],
-        folder_id=google_config["drive_folder_id"],
-    )
-    discord = None if args.no_discord else DiscordNotifier(webhook_url=discord_config["webhook_url"])
+    to_dt = None
+    if args.to_date:
+        to_dt = args.to_date + timedelta(days=1) - timedelta(seconds=1)
+    if args.from_date and to_dt and args.from_date > to_dt:
+        parser.error("--from は --to 以前の日付を指定してください")
+
+    if args.accounts:
+        if args.record or args.replay or args.profile or args.trace_memory:
+            parser.error("--accounts では --record・--replay・--profile・--trace-memory は使えません")
+        if _quota_budget(args):
+            parser.error("--accounts ではAPIの予算を設定ファイルのアカウントごとの上限で指定してください")
+        try:
+            accounts_config = load_accounts_config(args.accounts)
+        except (OSError, ValueError, KeyError) as e:
+            parser.error(f"--accounts の設定を読み込めません: {e}")
+        metrics = Metrics() if args.metrics_json or args.metrics_prom else None
+        try:
+            _sync_accounts(args, accounts_config, to_dt, metrics)
+        finally:
+            if metrics:
+                _export_metrics(metrics, args.metrics_json, args.metrics_prom)
+        return
 
-    processed_ids = set(load_processed(PROCESSED_FILE))
-    new_ids = process_recordings(zoom, gdocs, discord, processed_ids, days=args.days)
+    cassette = None
+    state_path = args.state
+    if args.record or args.replay:
+        from zoom_moji_nayu.cassette import Cassette
+    if args.record:
+        cassette = Cassette(args.record, "record")
+    elif args.replay:
+        cassette = Cassette(args.replay, "replay", latency_scale=args.replay_latency_scale)
+        # 再生は記録開始時点の処理状態のコピーから毎回やり直す
+        state_path = os.path.join(args.replay, "replay-state.json")
+        shutil.copyfile(cassette.state_path, state_path)
+
+    profiler = None
+    hooks = []
+    if args.profile or args.trace_memory:
+        profiler = Profiler(args.profile_dir, profile=args.profile, trace_memory=args.trace_memory)
+        hooks.append(profiler.hook)
+    metrics = None
+    if args.metrics_json or args.metrics_prom or profiler:
+        metrics = Metrics(hooks=hooks)
+    zoom = _build_zoom(cassette, metrics, limiter=_per_minute_limiter(args.zoom_requests_per_minute))
+
+    store = ProcessedStore(state_path, seed_path=PROCESSED_FILE)
+    if args.record:
+        # 再生で同じ判断（重複の紐付け・繰り越し・予算）になるよう、リース以外の処理状態をすべて残す
+        atomic_write_json(cassette.state_path, store.snapshot())
+    new_ids: list[str] = []
+    try:
+        with profiler or nullcontext():
+            jobs = list_pending(
+                zoom, store.processed_ids, days=args.days, store=store,
+                from_dt=args.from_date, to_dt=to_dt, shard=args.shard, metrics=metrics,
+            )
+            # 新しい録画がなければGoogle・Discordのクライアントを生成せずに終える
+            if jobs:
+                output, discord = _build_publishers(args, cassette, metrics)
+                archive = RawArchive(args.data_dir) if args.data_dir else None
+                try:
+                    with LeaseManager(store) as leases:
+                        new_ids = process_recordings(
+                            zoom, output, discord, store.processed_ids, store=store,
+                            fetch_workers=args.fetch_workers,
+                            render_workers=args.render_workers,
+                            publish_workers=args.publish_workers,
+                            cpu_workers=args.cpu_workers,
+                            leases=leases,
+                            metrics=metrics,
+                            jobs=jobs,
+                            index=SearchIndex(args.data_dir) if args.data_dir else None,
+                            part_max_chars=args.part_max_chars,
+                            part_max_requests=args.part_max_requests,
+                            compact_window=args.compact_window,
+                            archive=archive,
+                            budget=_quota_budget(args),
+                            schedule=_schedule_policy(args),
+                            early_publish=args.early_publish,
+                        )
+                finally:
+                    _close_output(output)
+    finally:
+        # 途中で失敗した実行もレポートを残す
+        if profiler:
+            profiler.write()
+        if metrics:
+            _export_metrics(metrics, args.metrics_json, args.metrics_prom)
 
     if new_ids:
-        all_ids = list(processed_ids) + new_ids
-        save_processed(PROCESSED_FILE, all_ids)
         logger.info("Processed %d new recordings", len(new_ids))
     else:
         logger.info("No new recordings to process")
@@ -0,0 +1,190 @@
+"""話者ごとの発言統計
+
+発言（同じ話者の連続したキューをまとめたもの）を会議番号・話者番号・時刻の列に並べ、
+NumPyで会議×話者ごと、または話者ごとにまとめて集計する。
+
+- 発言時間: キューの長さの合計
+- 発言回数: 話者が切り替わった回数
+- 最長の発言: 1回の発言の開始から終了まで
+- 割り込み: 直前の別の話者の発言が終わる前に話し始めた回数
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from zoom_moji_nayu.formatter import Segment
+    from zoom_moji_nayu.search_index import SearchIndex
+
+# search_indexのsegments.binと同じレコードの並び
+SEGMENT_DTYPE = np.dtype([
+    ("text_offset", "<u8"),
+    ("text_length", "<u4"),
+    ("meeting", "<u4"),
+    ("start_ms", "<u4"),
+    ("speaker", "<u4"),
+    ("end_ms", "<u4"),
+    ("talk_ms", "<u4"),
+])
+
+
+@dataclass
+class SpeakerStats:
+    speaker: str
+    talk_ms: int
+    turns: int
+    longest_ms: int
+    interruptions: int
+    # 発言した会議の数（会議ごとの統計では1）
+    meetings: int = 1
+
+
+@dataclass
+class SegmentColumns:
+    """発言の列指向表現。会議ごと・時刻順に並んでいること。"""
+    meeting: np.ndarray
+    speaker: np.ndarray
+    start_ms: np.ndarray
+    end_ms: np.ndarray
+    talk_ms: np.ndarray
+    # 話者番号 → 話者名
+    speakers: list[str]
+
+    def __len__(self) -> int:
+        return len(self.meeting)
+
+
+def columns_from_segments(meetings: list[list[Segment]]) -> SegmentColumns:
+    """会議ごとのSegmentリストから列を作る。会議番号はリストの順。"""
+    codes: dict[str, int] = {}
+    rows = [
+        (meeting_no, codes.setdefault(seg.speaker, len(codes)), seg.start_ms, seg.end_ms, seg.talk_ms)
+        for meeting_no, segments in enumerate(meetings)
+        for seg in segments
+    ]
+    table = np.array(rows, dtype=np.int64).reshape(-1, 5)
+    return SegmentColumns(
+        meeting=table[:, 0], speaker=table[:, 1],
+        start_ms=table[:, 2], end_ms=table[:, 3], talk_ms=table[:, 4],
+        speakers=list(codes),
+    )
+
+
+def _interrupting(columns: SegmentColumns) -> np.ndarray:
+    """各発言が直前の別の話者の発言に割り込んだかどうか。"""
+    interrupted = np.zeros(len(columns), dtype=bool)
+    interrupted[1:] = (
+        (columns.meeting[1:] == columns.meeting[:-1])
+        & (columns.speaker[1:] != columns.speaker[:-1])
+        & (columns.start_ms[1:] < columns.end_ms[:-1])
+    )
+    return interrupted
+
+
+def _grouped(columns: SegmentColumns, keys: np.ndarray):
+    """keysごとに (キー, 発言時間, 発言回数, 最長の発言, 割り込み回数) を集計する。"""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    size = len(unique)
+    talk = np.bincount(inverse, weights=columns.talk_ms, minlength=size).astype(np.int64)
+    turns = np.bincount(inverse, minlength=size)
+    longest = np.zeros(size, dtype=np.int64)
+    np.maximum.at(longest, inverse, columns.end_ms - columns.start_ms)
+    interruptions = np.bincount(inverse[_interrupting(columns)], minlength=size)
+    return unique, talk, turns, longest, interruptions
+
+
+def _sorted_stats(stats: list[SpeakerStats]) -> list[SpeakerStats]:
+    return sorted(stats, key=lambda s: (-s.talk_ms, s.speaker))
+
+
+def meeting_speaker_stats(columns: SegmentColumns) -> list[list[SpeakerStats]]:
+    """会議ごとに、話者別の統計を発言時間の長い順に返す。話者名のない発言は除く。"""
+    meeting_count = int(columns.meeting.max()) + 1 if len(columns) else 0
+    result: list[list[SpeakerStats]] = [[] for _ in range(meeting_count)]
+    if not len(columns):
+        return result
+    width = len(columns.speakers)
+    keys, talk, turns, longest, interruptions = _grouped(
+        columns, columns.meeting.astype(np.int64) * width + columns.speaker,
+    )
+    for key, *values in zip(keys.tolist(), talk.tolist(), turns.tolist(), longest.tolist(), interruptions.tolist()):
+        meeting_no, speaker_no = divmod(key, width)
+        if columns.speakers[speaker_no]:
+            result[meeting_no].append(SpeakerStats(columns.speakers[speaker_no], *values))
+    return [_sorted_stats(stats) for stats in result]
+
+
+def speaker_stats(segments: list[Segment]) -> list[SpeakerStats]:
+    """1つの会議の話者別の統計。"""
+    stats = meeting_speaker_stats(columns_from_segments([segments]))
+    return stats[0] if stats else []
+
+
+def aggregate_speaker_stats(columns: SegmentColumns) -> list[SpeakerStats]:
+    """全会議を通した話者別の統計を発言時間の長い順に返す。"""
+    if not len(columns):
+        return []
+    width = len(columns.speakers)
+    speakers, talk, turns, longest, interruptions = _grouped(columns, columns.speaker)
+    attended = np.unique(columns.meeting.astype(np.int64) * width + columns.speaker) % width
+    meetings = np.bincount(attended, minlength=width)
+    return _sorted_stats([
+        SpeakerStats(columns.speakers[speaker_no], *values, meetings=int(meetings[speaker_no]))
+        for speaker_no, *values in zip(
+            speakers.tolist(), talk.tolist(), turns.tolist(), longest.tolist(), interruptions.tolist(),
+        )
+        if columns.speakers[speaker_no]
+    ])
+
+
+def load_columns(
+    index: SearchIndex,
+    date_from: str | None = None,
+    date_to: str | None = None,
+) -> tuple[SegmentColumns, int]:
+    """検索インデックスの全パートから列を作り、(列, 会議数) を返す。
+
+    日付（YYYY-MM-DD）の範囲で会議を絞り込める。再登録で古くなった会議は除く。
+    """
+    codes: dict[str, int] = {}
+    chunks = []
+    meeting_base = 0
+    meeting_count = 0
+    for meetings, records, live in index.segment_tables():
+        keep = np.array([
+            alive
+            and (date_from is None or m["date"][:10] >= date_from)
+            and (date_to is None or m["date"][:10] <= date_to)
+            for m, alive in zip(meetings, live)
+        ], dtype=bool)
+        # パート内の (会議番号, 話者番号) を全体の話者番号に変換する表
+        offsets = np.zeros(len(meetings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(m["speakers"]) for m in meetings])
+        lookup = np.array(
+            [codes.setdefault(name, len(codes)) for m in meetings for name in m["speakers"]],
+            dtype=np.int64,
+        )
+        table = np.frombuffer(records, dtype=SEGMENT_DTYPE)
+        meeting_no = table["meeting"].astype(np.int64)
+        mask = keep[meeting_no]
+        meeting_no = meeting_no[mask]
+        chunks.append((
+            meeting_no + meeting_base,
+            lookup[offsets[meeting_no] + table["speaker"][mask]],
+            table["start_ms"][mask].astype(np.int64),
+            table["end_ms"][mask].astype(np.int64),
+            table["talk_ms"][mask].astype(np.int64),
+        ))
+        meeting_base += len(meetings)
+        meeting_count += int(keep.sum())
+
+    if not chunks:
+        empty = np.zeros(0, dtype=np.int64)
+        return SegmentColumns(empty, empty, empty, empty, empty, []), 0
+    meeting, speaker, start, end, talk = (np.concatenate(column) for column in zip(*chunks))
+    columns = SegmentColumns(meeting, speaker, start, end, talk, speakers=list(codes))
+    return columns, meeting_count
@@ -0,0 +1,291 @@
+"""ダウンロードした文字起こしの圧縮アーカイブ
+
+Zoomの録画は保存期間を過ぎると消えるため、ダウンロードしたVTTと要約JSONを会議情報とともに
+lzmaで圧縮し、追記専用のパックファイルに保存する。会議UUIDからの索引は固定長エントリの
+オープンアドレス法のハッシュ表で、mmapで開くため会議数によらず1回の探索で取り出せる。
+
+ファイルの構成（いずれもリトルエンディアン）:
+    pack.bin   ファイルヘッダ (b"ZMPK", バージョン u32) に続く
+               レコード (b"ZMAR", 圧縮データのバイト長 u32, CRC32 u32, UUIDのバイト長 u16, UUID, 圧縮データ)
+    index.bin  ヘッダ (b"ZMAI", バージョン u32, スロット数 u64, 件数 u64, パックの確定済みの長さ u64) に続く
+               スロット (UUIDのSHA-256の先頭16バイト, レコードの位置 u64, レコードのバイト長 u32, 元のバイト長 u32)
+
+同じ会議を再び保存した場合は新しいレコードを追記し、索引は新しい方を指す。書き込みは
+パックの確定済みの長さから行うため、途中で止まった書き込みの残骸は次の書き込みで上書きされる。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import lzma
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from zoom_moji_nayu.state import file_lock
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = "archive"
+PACK_FILE = "pack.bin"
+INDEX_FILE = "index.bin"
+VERSION = 1
+INITIAL_SLOTS = 1024
+# 使用中のスロットがこの割合を超えたらスロット数を倍にする
+MAX_LOAD = 0.5
+
+_PACK_HEADER = struct.Struct("<4sI")
+_RECORD = struct.Struct("<4sIIH")
+_INDEX_HEADER = struct.Struct("<4sIQQQ")
+_SLOT = struct.Struct("<16sQII")
+
+
+@dataclass
+class ArchivedMeeting:
+    meeting: dict
+    vtt_text: str
+    summary_json: dict | None
+    archived_at: str
+
+
+def _key(meeting_id: str) -> bytes:
+    return hashlib.sha256(meeting_id.encode("utf-8")).digest()[:16]
+
+
+class RawArchive:
+    """data_dir/archive 以下のアーカイブ。スレッドセーフで、別プロセスとはロックファイルで書き込みを直列化する。"""
+
+    def __init__(self, data_dir: str):
+        self.directory = os.path.join(data_dir, ARCHIVE_DIR)
+        self.pack_path = os.path.join(self.directory, PACK_FILE)
+        self.index_path = os.path.join(self.directory, INDEX_FILE)
+        self.lock_path = os.path.join(self.directory, "archive.lock")
+        self._lock = threading.Lock()
+        self._index_file = None
+        self._index_map: mmap.mmap | None = None
+        self._index_inode: int | None = None
+
+    @contextmanager
+    def _locked(self):
+        """スレッド間・プロセス間で排他する。アーカイブがまだなければスレッド間だけ。"""
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                yield
+                return
+            with file_lock(self.lock_path):
+                yield
+
+    # --- 索引 ---
+
+    def _open_index_locked(self) -> bool:
+        """索引をmmapで開く（別プロセスが作り直していれば開き直す）。索引がなければFalse。"""
+        try:
+            inode = os.stat(self.index_path).st_ino
+        except FileNotFoundError:
+            if os.path.exists(self.pack_path):
+                self._rebuild_index_locked(INITIAL_SLOTS)
+                return self._open_index_locked()
+            return False
+        if inode == self._index_inode:
+            return True
+        self._close_index_locked()
+        self._index_file = open(self.index_path, "r+b")
+        self._index_map = mmap.mmap(self._index_file.fileno(), 0)
+        self._index_inode = inode
+        magic, version, *_ = _INDEX_HEADER.unpack_from(self._index_map, 0)
+        if magic != b"ZMAI" or version != VERSION:
+            raise ValueError(f"Unsupported archive index: {self.index_path}")
+        return True
+
+    def _close_index_locked(self) -> None:
+        if self._index_map is not None:
+            self._index_map.close()
+            self._index_file.close()
+        self._index_map = self._index_file = self._index_inode = None
+
+    def _header(self) -> tuple[int, int, int]:
+        """(スロット数, 件数, パックの確定済みの長さ)"""
+        _, _, slots, count, pack_end = _INDEX_HEADER.unpack_from(self._index_map, 0)
+        return slots, count, pack_end
+
+    def _probe(self, key: bytes) -> tuple[int, tuple[bytes, int, int, int] | None]:
+        """keyのスロット番号と、使用中ならその内容を返す。なければ最初の空きスロットを返す。"""
+        slots = self._header()[0]
+        slot = int.from_bytes(key[:8], "little") & (slots - 1)
+        while True:
+            entry = _SLOT.unpack_from(self._index_map, _INDEX_HEADER.size + slot * _SLOT.size)
+            if entry[1] == 0:
+                return slot, None
+            if entry[0] == key:
+                return slot, entry
+            slot = (slot + 1) & (slots - 1)
+
+    def _rebuild_index_locked(self, slots: int) -> None:
+        """索引がない場合に、パックを先頭から読んで作り直す。"""
+        entries: dict[bytes, tuple[int, int, int]] = {}
+        pack_end = _PACK_HEADER.size
+        if os.path.exists(self.pack_path):
+            with open(self.pack_path, "rb") as f:
+                for offset, length, meeting_id, payload in _scan(f):
+                    entries[_key(meeting_id)] = (offset, length, len(lzma.decompress(payload)))
+                    pack_end = offset + length
+        if entries:
+            logger.info("Rebuilt archive index from %d records", len(entries))
+        self._write_index_locked(entries, slots, pack_end)
+
+    def _grow_index_locked(self) -> None:
+        """スロット数を倍にした索引に書き換える。"""
+        slots, _, pack_end = self._header()
+        entries = {}
+        for slot in range(slots):
+            key, offset, length, raw_length = _SLOT.unpack_from(self._index_map, _INDEX_HEADER.size + slot * _SLOT.size)
+            if offset:
+                entries[key] = (offset, length, raw_length)
+        self._write_index_locked(entries, slots * 2, pack_end)
+
+    def _write_index_locked(self, entries: dict[bytes, tuple[int, int, int]], slots: int, pack_end: int) -> None:
+        while len(entries) > slots * MAX_LOAD:
+            slots *= 2
+
+        table = bytearray(_INDEX_HEADER.size + slots * _SLOT.size)
+        _INDEX_HEADER.pack_into(table, 0, b"ZMAI", VERSION, slots, len(entries), pack_end)
+        for key, (offset, length, raw_length) in entries.items():
+            slot = int.from_bytes(key[:8], "little") & (slots - 1)
+            while _SLOT.unpack_from(table, _INDEX_HEADER.size + slot * _SLOT.size)[1]:
+                slot = (slot + 1) & (slots - 1)
+            _SLOT.pack_into(table, _INDEX_HEADER.size + slot * _SLOT.size, key, offset, length, raw_length)
+
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".index-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(table)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.index_path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._close_index_locked()
+
+    # --- 書き込み ---
+
+    def put(self, meeting: dict, vtt_text: str, summary_json: dict | None) -> None:
+        """会議情報・VTT・要約JSONを保存する。"""
+        meeting_id = meeting["uuid"]
+        raw = json.dumps({
+            "meeting": meeting,
+            "vtt": vtt_text,
+            "summary": summary_json,
+            "archived_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }, ensure_ascii=False).encode("utf-8")
+        # 圧縮はロックの外で行い、並行するダウンロードの書き込みを待たせない
+        payload = lzma.compress(raw)
+        uuid = meeting_id.encode("utf-8")
+        record = _RECORD.pack(b"ZMAR", len(payload), zlib.crc32(payload), len(uuid)) + uuid + payload
+
+        os.makedirs(self.directory, exist_ok=True)
+        with self._locked():
+            if not self._open_index_locked():
+                self._rebuild_index_locked(INITIAL_SLOTS)
+                self._open_index_locked()
+            slots, count, pack_end = self._header()
+            slot, existing = self._probe(_key(meeting_id))
+            if existing is None and count + 1 > slots * MAX_LOAD:
+                self._grow_index_locked()
+                self._open_index_locked()
+                slots, count, pack_end = self._header()
+                slot, existing = self._probe(_key(meeting_id))
+
+            with open(self.pack_path, "r+b" if os.path.exists(self.pack_path) else "w+b") as f:
+                if pack_end == _PACK_HEADER.size:
+                    f.write(_PACK_HEADER.pack(b"ZMPK", VERSION))
+                f.seek(pack_end)
+                f.write(record)
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+
+            # 確定済みの長さを先に進めてからスロットを書く（途中で止まってもレコードが孤立するだけ）
+            if existing is None:
+                count += 1
+            _INDEX_HEADER.pack_into(self._index_map, 0, b"ZMAI", VERSION, slots, count, pack_end + len(record))
+            _SLOT.pack_into(
+                self._index_map, _INDEX_HEADER.size + slot * _SLOT.size,
+                _key(meeting_id), pack_end, len(record), len(raw),
+            )
+            self._index_map.flush()
+        logger.debug("Archived %s (%d -> %d bytes)", meeting_id, len(raw), len(record))
+
+    # --- 読み込み ---
+
+    def get(self, meeting_id: str) -> ArchivedMeeting | None:
+        """保存した会議を取り出す。なければNone。"""
+        with self._locked():
+            if not self._open_index_locked():
+                return None
+            _, entry = self._probe(_key(meeting_id))
+            if entry is None:
+                return None
+            _, offset, length, _ = entry
+            with open(self.pack_path, "rb") as f:
+                data = os.pread(f.fileno(), length, offset)
+        magic, payload_length, crc, uuid_length = _RECORD.unpack_from(data, 0)
+        payload = data[_RECORD.size + uuid_length:]
+        stored_id = data[_RECORD.size:_RECORD.size + uuid_length].decode("utf-8")
+        if magic != b"ZMAR" or len(payload) != payload_length or zlib.crc32(payload) != crc:
+            raise ValueError(f"Corrupted archive record for {meeting_id}")
+        if stored_id != meeting_id:
+            return None
+        body = json.loads(lzma.decompress(payload))
+        return ArchivedMeeting(body["meeting"], body["vtt"], body["summary"], body["archived_at"])
+
+    def __contains__(self, meeting_id: str) -> bool:
+        with self._locked():
+            return self._open_index_locked() and self._probe(_key(meeting_id))[1] is not None
+
+    def stats(self) -> dict:
+        """件数・パックのバイト数・圧縮前のバイト数。"""
+        with self._locked():
+            if not self._open_index_locked():
+                return {"meetings": 0, "pack_bytes": 0, "raw_bytes": 0}
+            slots, count, pack_end = self._header()
+            raw_bytes = sum(
+                _SLOT.unpack_from(self._index_map, _INDEX_HEADER.size + slot * _SLOT.size)[3]
+                for slot in range(slots)
+            )
+        return {"meetings": count, "pack_bytes": pack_end, "raw_bytes": raw_bytes}
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_index_locked()
+
+
+def _scan(f):
+    """パックのレコードを先頭から (位置, バイト長, UUID, 圧縮データ) の形で返す。壊れたレコードで止まる。"""
+    header = f.read(_PACK_HEADER.size)
+    if len(header) < _PACK_HEADER.size:
+        return
+    if _PACK_HEADER.unpack(header) != (b"ZMPK", VERSION):
+        raise ValueError(f"Unsupported archive pack: {f.name}")
+    offset = _PACK_HEADER.size
+    while True:
+        head = f.read(_RECORD.size)
+        if len(head) < _RECORD.size:
+            return
+        magic, payload_length, crc, uuid_length = _RECORD.unpack(head)
+        body = f.read(uuid_length + payload_length)
+        payload = body[uuid_length:]
+        if magic != b"ZMAR" or len(payload) != payload_length or zlib.crc32(payload) != crc:
+            logger.warning("Ignoring truncated archive record at offset %d", offset)
+            return
+        length = _RECORD.size + len(body)
+        yield offset, length, body[:uuid_length].decode("utf-8"), payload
+        offset += length
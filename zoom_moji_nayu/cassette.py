@@ -0,0 +1,202 @@
+"""HTTP通信の記録・再生（カセット）モジュール
+
+Zoom・Google・Discordとのリクエスト/レスポンスをディレクトリに記録し、
+認証情報やネットワークなしで同じ処理を再生できるようにする。プロファイリングやベンチマーク用。
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_FILE = "cassette.jsonl"
+STATE_FILE = "state.json"
+# 記録に残さないクエリパラメータとレスポンスJSONのフィールド
+REDACTED_PARAMS = {"access_token", "account_id", "key"}
+REDACTED_FIELDS = {"access_token", "refresh_token", "id_token"}
+# レスポンスヘッダーのうち再生時に意味を持つものだけを残す
+KEPT_HEADERS = {"content-type", "location", "retry-after"}
+
+
+class CassetteMiss(KeyError):
+    """再生時に、記録にないリクエストが発行された。"""
+
+
+def _redact_path(hostname: str | None, path: str) -> str:
+    # Discord WebhookのURLはパス自体がトークンになっている
+    if hostname and hostname.endswith("discord.com"):
+        return re.sub(r"^/api/webhooks/.*", "/api/webhooks/***", path)
+    return path
+
+
+def request_key(method: str, url: str) -> str:
+    """リクエストを照合するキー。日付などで変わるクエリは含めず、秘密情報を含むパスは伏せる。"""
+    parts = urlsplit(url)
+    return f"{method.upper()} {parts.hostname}{_redact_path(parts.hostname, parts.path)}"
+
+
+def _redact_url(url: str) -> str:
+    parts = urlsplit(url)
+    query = [
+        (k, "***" if k in REDACTED_PARAMS else v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+    ]
+    return parts._replace(
+        path=_redact_path(parts.hostname, parts.path), query=urlencode(query),
+    ).geturl()
+
+
+def _redact_body(body: bytes) -> bytes:
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    if not isinstance(data, dict) or not REDACTED_FIELDS & data.keys():
+        return body
+    for field in REDACTED_FIELDS & data.keys():
+        data[field] = "replayed-" + field
+    return json.dumps(data).encode()
+
+
+class Cassette:
+    """記録モードではレスポンスを追記し、再生モードでは記録順に返す。"""
+
+    def __init__(self, directory: str, mode: str, latency_scale: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.directory = directory
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.path = os.path.join(directory, CASSETTE_FILE)
+        self._lock = threading.Lock()
+        self._entries: dict[str, deque[dict]] = defaultdict(deque)
+        self._last: dict[str, dict] = {}
+
+        if mode == "record":
+            os.makedirs(directory, exist_ok=True)
+            # 記録は毎回作り直す
+            open(self.path, "w").close()
+        else:
+            with open(self.path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+            logger.info("Loaded %d recorded responses from %s", self.count(), self.path)
+
+    @property
+    def state_path(self) -> str:
+        """記録開始時点の処理状態のスナップショット。再生はこの状態から始める。"""
+        return os.path.join(self.directory, STATE_FILE)
+
+    def count(self) -> int:
+        return sum(len(q) for q in self._entries.values())
+
+    def record(
+        self, method: str, url: str, status: int, headers: dict, body: bytes, elapsed: float,
+    ) -> None:
+        entry = {
+            "key": request_key(method, url),
+            "url": _redact_url(url),
+            "status": status,
+            "headers": {k.lower(): v for k, v in headers.items() if k.lower() in KEPT_HEADERS},
+            "elapsed": round(elapsed, 6),
+        }
+        body = _redact_body(body)
+        try:
+            entry["text"] = body.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["b64"] = base64.b64encode(body).decode("ascii")
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+
+    def play(self, method: str, url: str) -> tuple[int, dict, bytes]:
+        """記録済みのレスポンスを返す。元の応答時間×latency_scaleだけ待機する。"""
+        key = request_key(method, url)
+        with self._lock:
+            queue = self._entries.get(key)
+            if queue:
+                entry = queue.popleft()
+                self._last[key] = entry
+            elif key in self._last:
+                # 記録より多く呼ばれた場合（トークン再取得など）は最後の応答を使い回す
+                entry = self._last[key]
+            else:
+                raise CassetteMiss(key)
+        if self.latency_scale > 0:
+            time.sleep(entry["elapsed"] * self.latency_scale)
+        if "b64" in entry:
+            body = base64.b64decode(entry["b64"])
+        else:
+            body = entry["text"].encode("utf-8")
+        return entry["status"], entry["headers"], body
+
+    def session(self) -> CassetteSession:
+        return CassetteSession(self)
+
+    def http(self, inner=None) -> CassetteHttp:
+        return CassetteHttp(self, inner)
+
+
+class CassetteSession(requests.Session):
+    """ZoomClient・DiscordNotifier用のrequests.Session。"""
+
+    def __init__(self, cassette: Cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def request(self, method, url, params=None, **kwargs):
+        full_url = requests.Request(method, url, params=params).prepare().url
+        if self.cassette.mode == "record":
+            started = time.perf_counter()
+            resp = super().request(method, url, params=params, **kwargs)
+            self.cassette.record(
+                method, full_url, resp.status_code, resp.headers, resp.content,
+                time.perf_counter() - started,
+            )
+            return resp
+
+        status, headers, body = self.cassette.play(method, full_url)
+        resp = requests.Response()
+        resp.status_code = status
+        resp.headers = CaseInsensitiveDict(headers)
+        resp._content = body
+        resp.encoding = "utf-8"
+        resp.url = full_url
+        resp.request = requests.Request(method, full_url).prepare()
+        return resp
+
+
+class CassetteHttp:
+    """GDocsClient用のhttplib2互換オブジェクト。記録時は認証済みの接続をラップする。"""
+
+    def __init__(self, cassette: Cassette, inner=None):
+        self.cassette = cassette
+        self.inner = inner
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        if self.cassette.mode == "record":
+            started = time.perf_counter()
+            resp, content = self.inner.request(uri, method=method, body=body, headers=headers, **kwargs)
+            self.cassette.record(method, uri, resp.status, dict(resp), content, time.perf_counter() - started)
+            return resp, content
+
+        # httplib2はGoogle APIを使う場合にだけ必要なので、ここで読み込む
+        import httplib2
+
+        status, headers, content = self.cassette.play(method, uri)
+        resp = httplib2.Response({**headers, "status": str(status)})
+        return resp, content
@@ -1,6 +1,10 @@
 """設定管理モジュール"""
 
+from __future__ import annotations
+
 import os
+import tomllib
+from dataclasses import dataclass, field
 
 
 def get_zoom_config() -> dict:
@@ -22,9 +26,99 @@ def get_google_config() -> dict:
     }
 
 
-
 def get_discord_config() -> dict:
     """Discord Webhook設定を環境変数から取得する。"""
     return {
         "webhook_url": os.environ["DISCORD_WEBHOOK_URL"],
     }
+
+
+# 複数アカウントの設定ファイルで、アカウントごとに指定しない場合のZoom APIの1分あたりの呼び出し上限。
+# Zoomの上限が最も低いHeavy APIの秒間10回に合わせる
+DEFAULT_ZOOM_REQUESTS_PER_MINUTE = 600
+# 全アカウントで共有するGoogleの書き込みの1分あたりの上限（Docs APIのユーザーごとの割り当て）
+DEFAULT_GOOGLE_WRITES_PER_MINUTE = 60
+
+
+@dataclass
+class AccountConfig:
+    """複数アカウントの設定ファイルに書いた、Zoomアカウント1つ分の設定。"""
+    name: str
+    zoom: dict
+    drive_folder_id: str
+    discord_webhook_url: str | None = None
+    # 処理状態のファイル。省略時は--stateと同じディレクトリの processed-<name>.json
+    state: str | None = None
+    zoom_requests_per_minute: float = DEFAULT_ZOOM_REQUESTS_PER_MINUTE
+
+
+@dataclass
+class AccountsConfig:
+    accounts: list[AccountConfig]
+    # Googleの認証情報（client_id・client_secret・refresh_token）。全アカウントで共有する
+    google: dict = field(default_factory=dict)
+    google_writes_per_minute: float = DEFAULT_GOOGLE_WRITES_PER_MINUTE
+
+
+def _setting(table: dict, key: str, where: str, required: bool = True) -> str | None:
+    """設定値を返す。key_env があればその名前の環境変数から読む（秘密情報をファイルに書かないため）。"""
+    if key in table:
+        return table[key]
+    env_name = table.get(f"{key}_env")
+    if env_name:
+        if env_name not in os.environ:
+            raise ValueError(f"{where}: 環境変数 {env_name} が設定されていません（{key}_env）")
+        return os.environ[env_name]
+    if required:
+        raise ValueError(f"{where}: {key} または {key}_env を指定してください")
+    return None
+
+
+def load_accounts_config(path: str) -> AccountsConfig:
+    """複数アカウントの設定ファイル（TOML）を読み込む。
+
+    Googleの認証情報は[google]テーブル、なければ環境変数（GOOGLE_CLIENT_ID など）から読む。
+    """
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+
+    google_table = data.get("google", {})
+    if {"client_id", "client_id_env"} & google_table.keys():
+        google = {
+            key: _setting(google_table, key, "[google]")
+            for key in ("client_id", "client_secret", "refresh_token")
+        }
+    else:
+        google = {
+            "client_id": os.environ["GOOGLE_CLIENT_ID"],
+            "client_secret": os.environ["GOOGLE_CLIENT_SECRET"],
+            "refresh_token": os.environ["GOOGLE_REFRESH_TOKEN"],
+        }
+
+    accounts: list[AccountConfig] = []
+    for no, table in enumerate(data.get("accounts", []), 1):
+        name = table.get("name")
+        if not name or not isinstance(name, str):
+            raise ValueError(f"[[accounts]] {no}番目: name を指定してください")
+        if any(account.name == name for account in accounts):
+            raise ValueError(f"[[accounts]] {name}: name が重複しています")
+        where = f"[[accounts]] {name}"
+        accounts.append(AccountConfig(
+            name=name,
+            zoom={
+                "account_id": _setting(table, "zoom_account_id", where),
+                "client_id": _setting(table, "zoom_client_id", where),
+                "client_secret": _setting(table, "zoom_client_secret", where),
+            },
+            drive_folder_id=_setting(table, "drive_folder_id", where),
+            discord_webhook_url=_setting(table, "discord_webhook_url", where, required=False),
+            state=table.get("state"),
+            zoom_requests_per_minute=table.get("zoom_requests_per_minute", DEFAULT_ZOOM_REQUESTS_PER_MINUTE),
+        ))
+    if not accounts:
+        raise ValueError(f"{path}: [[accounts]] が1つもありません")
+    return AccountsConfig(
+        accounts=accounts,
+        google=google,
+        google_writes_per_minute=google_table.get("writes_per_minute", DEFAULT_GOOGLE_WRITES_PER_MINUTE),
+    )
@@ -0,0 +1,80 @@
+"""常駐モードのポーリング間隔とシグナル処理"""
+
+from __future__ import annotations
+
+import logging
+import signal
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, tzinfo
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+
+def _meeting_end(meeting: dict) -> datetime | None:
+    """録画情報のstart_time・duration（分）から会議の終了時刻を求める。"""
+    try:
+        start = datetime.fromisoformat(meeting["start_time"].replace("Z", "+00:00"))
+    except (KeyError, ValueError, AttributeError):
+        return None
+    return start + timedelta(minutes=meeting.get("duration") or 0)
+
+
+@dataclass
+class PollSchedule:
+    """次回ポーリングまでの間隔を決める。
+
+    会議の終了直後（文字起こし待ちの会議がある、または新しい録画があった）は短く、
+    勤務時間帯は中程度、夜間・休日は長くする。失敗が続いた場合は間隔を延ばす。
+    """
+    busy_seconds: float = 60
+    work_seconds: float = 300
+    idle_seconds: float = 1800
+    work_start_hour: int = 9
+    work_end_hour: int = 20
+    # 終了からこの時間内の会議は、文字起こしが届くまで短い間隔で確認する
+    recent_window: timedelta = timedelta(hours=2)
+    tz: tzinfo = field(default_factory=lambda: ZoneInfo("Asia/Tokyo"))
+
+    def is_work_time(self, now: datetime) -> bool:
+        local = now.astimezone(self.tz)
+        return local.weekday() < 5 and self.work_start_hour <= local.hour < self.work_end_hour
+
+    def next_interval(
+        self,
+        now: datetime,
+        found: int = 0,
+        awaiting_transcript: list[dict] = (),
+        failures: int = 0,
+    ) -> float:
+        """次回ポーリングまでの秒数を返す。"""
+        if failures:
+            return min(self.idle_seconds, self.work_seconds * 2 ** (failures - 1))
+        if found:
+            return self.busy_seconds
+        for meeting in awaiting_transcript:
+            end = _meeting_end(meeting)
+            if end and now - end <= self.recent_window:
+                return self.busy_seconds
+        if self.is_work_time(now):
+            return self.work_seconds
+        return self.idle_seconds
+
+
+def install_shutdown_handlers() -> threading.Event:
+    """SIGTERM・SIGINTでセットされるイベントを返す。2回目のシグナルでは即座に終了する。"""
+    stop = threading.Event()
+
+    def handle(signum, frame):
+        if stop.is_set():
+            logger.warning("Received %s again, exiting immediately", signal.Signals(signum).name)
+            raise SystemExit(128 + signum)
+        logger.info(
+            "Received %s, finishing in-flight meetings before shutdown", signal.Signals(signum).name,
+        )
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handle)
+    signal.signal(signal.SIGINT, handle)
+    return stop
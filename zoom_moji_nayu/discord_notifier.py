@@ -6,13 +6,30 @@ import logging
 
 import requests
 
+from zoom_moji_nayu.metrics import DISABLED, Metrics
+
 logger = logging.getLogger(__name__)
 DISCORD_MENTION = "<@924890600174661722>"
 
 
 class DiscordNotifier:
-    def __init__(self, webhook_url: str):
+    def __init__(
+        self,
+        webhook_url: str,
+        session: requests.Session | None = None,
+        metrics: Metrics | None = None,
+    ):
         self.webhook_url = webhook_url
+        self._http = session or requests
+        self._metrics = metrics or DISABLED
+
+    def _post(self, payload: dict) -> None:
+        """Webhookにペイロードを送信する。"""
+        resp = self._http.post(self.webhook_url, json=payload)
+        self._metrics.incr("api_calls", api="discord.webhook")
+        if resp.status_code == 429:
+            self._metrics.incr("rate_limited", api="discord.webhook")
+        resp.raise_for_status()
 
     def notify(
         self,
@@ -32,11 +49,7 @@ class DiscordNotifier:
         content = "\n".join(lines)
 
         try:
-            resp = requests.post(
-                self.webhook_url,
-                json={"content": content},
-            )
-            resp.raise_for_status()
+            self._post({"content": content})
             logger.info("Discord notification sent for: %s", meeting_topic)
         except Exception as e:
             logger.error("Failed to send Discord notification: %s", e)
@@ -59,8 +72,7 @@ class DiscordNotifier:
         }
 
         try:
-            resp = requests.post(self.webhook_url, json=payload)
-            resp.raise_for_status()
+            self._post(payload)
             logger.info("Discord error notification sent for: %s", meeting_topic)
         except Exception as e:
             logger.error("Failed to send Discord error notification: %s", e)
@@ -0,0 +1,204 @@
+"""MarkdownからGoogle Docs batchUpdateリクエストを生成するモジュール"""
+
+from __future__ import annotations
+
+import re
+
+
+def parse_markdown_lines(md: str) -> list[tuple[str, str]]:
+    """議事録のMarkdownを行ごとに (改行付きのテキスト, 要素の種類) に分ける。"""
+    elements: list[tuple[str, str]] = []
+    for line in md.split("\n"):
+        if line.startswith("### "):
+            elements.append((line[4:] + "\n", "TIMESTAMP"))
+        elif line.startswith("## "):
+            elements.append((line[3:] + "\n", "HEADING_2"))
+        elif line.startswith("# "):
+            elements.append((line[2:] + "\n", "HEADING_1"))
+        elif line.startswith("---"):
+            elements.append(("\n", "SEPARATOR"))
+        elif line.startswith("- "):
+            elements.append((line[2:] + "\n", "BULLET"))
+        elif re.match(r"^\*\*(.+)\*\*$", line):
+            elements.append((re.match(r"^\*\*(.+)\*\*$", line).group(1) + "\n", "SPEAKER"))
+        elif line.strip() == "":
+            elements.append(("\n", "EMPTY"))
+        else:
+            elements.append((line + "\n", "NORMAL_TEXT"))
+    return elements
+
+
+def markdown_to_docs_requests(md: str, start_index: int = 1) -> list[dict]:
+    """Markdownを解析してGoogle Docs batchUpdateリクエストのリストを生成する。
+
+    start_indexを指定すると、本文のその位置に挿入するリクエストを生成する（既存の本文への追記用）。
+    """
+    elements = parse_markdown_lines(md)
+
+    NAVY = {"red": 0.1, "green": 0.14, "blue": 0.49}
+    BLUE = {"red": 0.08, "green": 0.4, "blue": 0.75}
+    GRAY = {"red": 0.6, "green": 0.6, "blue": 0.6}
+    LIGHT_GRAY = {"red": 0.9, "green": 0.9, "blue": 0.9}
+
+    requests: list[dict] = []
+    index = start_index
+    ranges: list[tuple[int, int, str, str]] = []
+
+    for text, style in elements:
+        requests.append({
+            "insertText": {
+                "location": {"index": index},
+                "text": text,
+            }
+        })
+        end_index = index + len(text)
+        ranges.append((index, end_index, text, style))
+        index = end_index
+
+    for start, end, text, style in ranges:
+        has_content = end - 1 > start
+
+        if style == "HEADING_1":
+            requests.append({"updateParagraphStyle": {
+                "range": {"startIndex": start, "endIndex": end},
+                "paragraphStyle": {
+                    "namedStyleType": "HEADING_1",
+                    "spaceBelow": {"magnitude": 8, "unit": "PT"},
+                    "borderBottom": {
+                        "color": {"color": {"rgbColor": NAVY}},
+                        "width": {"magnitude": 1.5, "unit": "PT"},
+                        "padding": {"magnitude": 6, "unit": "PT"},
+                        "dashStyle": "SOLID",
+                    },
+                },
+                "fields": "namedStyleType,spaceBelow,borderBottom",
+            }})
+            if has_content:
+                requests.append({"updateTextStyle": {
+                    "range": {"startIndex": start, "endIndex": end - 1},
+                    "textStyle": {
+                        "foregroundColor": {"color": {"rgbColor": NAVY}},
+                    },
+                    "fields": "foregroundColor",
+                }})
+
+        elif style == "HEADING_2":
+            requests.append({"updateParagraphStyle": {
+                "range": {"startIndex": start, "endIndex": end},
+                "paragraphStyle": {
+                    "namedStyleType": "HEADING_2",
+                    "spaceAbove": {"magnitude": 18, "unit": "PT"},
+                    "spaceBelow": {"magnitude": 6, "unit": "PT"},
+                    "borderLeft": {
+                        "color": {"color": {"rgbColor": NAVY}},
+                        "width": {"magnitude": 3, "unit": "PT"},
+                        "padding": {"magnitude": 8, "unit": "PT"},
+                        "dashStyle": "SOLID",
+                    },
+                },
+                "fields": "namedStyleType,spaceAbove,spaceBelow,borderLeft",
+            }})
+            if has_content:
+                requests.append({"updateTextStyle": {
+                    "range": {"startIndex": start, "endIndex": end - 1},
+                    "textStyle": {
+                        "foregroundColor": {"color": {"rgbColor": NAVY}},
+                    },
+                    "fields": "foregroundColor",
+                }})
+
+        elif style == "TIMESTAMP":
+            requests.append({"updateParagraphStyle": {
+                "range": {"startIndex": start, "endIndex": end},
+                "paragraphStyle": {
+                    "spaceAbove": {"magnitude": 16, "unit": "PT"},
+                    "spaceBelow": {"magnitude": 2, "unit": "PT"},
+                    "borderTop": {
+                        "color": {"color": {"rgbColor": LIGHT_GRAY}},
+                        "width": {"magnitude": 0.5, "unit": "PT"},
+                        "padding": {"magnitude": 6, "unit": "PT"},
+                        "dashStyle": "SOLID",
+                    },
+                },
+                "fields": "spaceAbove,spaceBelow,borderTop",
+            }})
+            if has_content:
+                requests.append({"updateTextStyle": {
+                    "range": {"startIndex": start, "endIndex": end - 1},
+                    "textStyle": {
+                        "fontSize": {"magnitude": 8, "unit": "PT"},
+                        "foregroundColor": {"color": {"rgbColor": GRAY}},
+                    },
+                    "fields": "fontSize,foregroundColor",
+                }})
+
+        elif style == "SPEAKER":
+            requests.append({"updateParagraphStyle": {
+                "range": {"startIndex": start, "endIndex": end},
+                "paragraphStyle": {
+                    "spaceAbove": {"magnitude": 0, "unit": "PT"},
+                    "spaceBelow": {"magnitude": 2, "unit": "PT"},
+                },
+                "fields": "spaceAbove,spaceBelow",
+            }})
+            if has_content:
+                requests.append({"updateTextStyle": {
+                    "range": {"startIndex": start, "endIndex": end - 1},
+                    "textStyle": {
+                        "bold": True,
+                        "foregroundColor": {"color": {"rgbColor": BLUE}},
+                        "fontSize": {"magnitude": 10, "unit": "PT"},
+                    },
+                    "fields": "bold,foregroundColor,fontSize",
+                }})
+
+        elif style == "SEPARATOR":
+            requests.append({"updateParagraphStyle": {
+                "range": {"startIndex": start, "endIndex": end},
+                "paragraphStyle": {
+                    "borderBottom": {
+                        "color": {"color": {"rgbColor": LIGHT_GRAY}},
+                        "width": {"magnitude": 0.5, "unit": "PT"},
+                        "padding": {"magnitude": 4, "unit": "PT"},
+                        "dashStyle": "SOLID",
+                    },
+                    "spaceAbove": {"magnitude": 8, "unit": "PT"},
+                    "spaceBelow": {"magnitude": 8, "unit": "PT"},
+                },
+                "fields": "borderBottom,spaceAbove,spaceBelow",
+            }})
+
+        elif style == "BULLET":
+            requests.append({"createParagraphBullets": {
+                "range": {"startIndex": start, "endIndex": end},
+                "bulletPreset": "BULLET_DISC_CIRCLE_SQUARE",
+            }})
+            kv_match = re.match(r"^(.+?): ", text)
+            if kv_match:
+                key_end = start + len(kv_match.group(1)) + 1
+                requests.append({"updateTextStyle": {
+                    "range": {"startIndex": start, "endIndex": key_end},
+                    "textStyle": {"bold": True},
+                    "fields": "bold",
+                }})
+            url_match = re.search(r"(https?://\S+)", text)
+            if url_match:
+                requests.append({"updateTextStyle": {
+                    "range": {
+                        "startIndex": start + url_match.start(),
+                        "endIndex": start + url_match.end(),
+                    },
+                    "textStyle": {"link": {"url": url_match.group(1)}},
+                    "fields": "link",
+                }})
+
+    if index > start_index:
+        requests.append({"updateTextStyle": {
+            "range": {"startIndex": start_index, "endIndex": index},
+            "textStyle": {
+                "weightedFontFamily": {"fontFamily": "Noto Sans JP"},
+            },
+            "fields": "weightedFontFamily",
+        }})
+
+    return requests
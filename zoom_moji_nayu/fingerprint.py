@@ -0,0 +1,188 @@
+"""文字起こしの指紋による重複検出
+
+再開した会議や複数のホストが録画した会議は、別のUUIDでほぼ同じ文字起こしになる。
+正規化した本文のSHA-256で完全一致を、文字5-gramのMinHashで表記揺れや前後の欠けを含む
+ほぼ一致を検出し、既存のドキュメントに紐付けられるようにする。定例会議のように言い回しの
+似た別の会議を取り違えないよう、ほぼ一致は開始時刻の近い会議どうしに限る。
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import numpy as np
+
+NUM_PERM = 64
+# LSHのバンド数。1バンドあたり NUM_PERM // BANDS 個の値が一致した会議を候補にする
+BANDS = 16
+SHINGLE_CHARS = 5
+# 推定Jaccard係数がこれ以上なら重複とみなす
+DUPLICATE_THRESHOLD = 0.8
+# これより短い文字起こし（録画テストなど）は重複判定しない
+MIN_CHARS = 200
+# ほぼ一致を重複とみなす、開始時刻の差の上限
+NEAR_DUPLICATE_WINDOW = timedelta(hours=12)
+
+_PRIME = 4294967311  # 2**32より大きい素数
+_coefficients = np.random.default_rng(20260215).integers(1, 2**32 - 1, size=(2, NUM_PERM, 1), dtype=np.uint64)
+_A, _B = _coefficients[0], _coefficients[1]
+_CHUNK = 16384
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_transcript(segments) -> str:
+    """話者名・時刻・空白・記号を除き、全角・半角や大文字・小文字をそろえた本文。"""
+    text = "".join(seg.text for seg in segments)
+    return _NON_WORD.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+@dataclass
+class Fingerprint:
+    content_hash: str
+    # NUM_PERM個のuint32（リトルエンディアン）
+    minhash: bytes
+
+    def to_dict(self) -> dict:
+        return {"content_hash": self.content_hash, "minhash": base64.b64encode(self.minhash).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Fingerprint:
+        return cls(data["content_hash"], base64.b64decode(data.get("minhash", "")))
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    """文字5-gramごとの32bitハッシュ（重複なし）。"""
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    count = len(codes) - SHINGLE_CHARS + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(SHINGLE_CHARS):
+        # uint64の桁あふれは2**64を法とする多項式ハッシュとして扱う
+        hashes = hashes * np.uint64(1_000_003) + codes[offset:offset + count]
+    return np.unique((hashes ^ (hashes >> np.uint64(32))) & np.uint64(0xFFFFFFFF))
+
+
+def minhash(text: str) -> bytes:
+    """本文のMinHash署名。"""
+    signature = np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    shingles = _shingle_hashes(text)
+    # 置換×シングルの行列が大きくなりすぎないよう分けて計算する
+    for start in range(0, len(shingles), _CHUNK):
+        chunk = shingles[start:start + _CHUNK]
+        signature = np.minimum(signature, ((_A * chunk + _B) % np.uint64(_PRIME)).min(axis=1))
+    return signature.astype("<u4").tobytes()
+
+
+def fingerprint(segments) -> Fingerprint | None:
+    """Segmentリストの指紋。短すぎて判定に使えない場合はNone。"""
+    text = normalize_transcript(segments)
+    if len(text) < MIN_CHARS:
+        return None
+    return Fingerprint(hashlib.sha256(text.encode("utf-8")).hexdigest(), minhash(text))
+
+
+def similarity(a: bytes, b: bytes) -> float:
+    """2つのMinHash署名から推定したJaccard係数。"""
+    if len(a) != len(b) or not a:
+        return 0.0
+    return float(np.mean(np.frombuffer(a, dtype="<u4") == np.frombuffer(b, dtype="<u4")))
+
+
+def _parse_start(start_time: str) -> datetime | None:
+    try:
+        return datetime.fromisoformat(start_time.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _bands(signature: bytes) -> list[tuple[int, bytes]]:
+    width = len(signature) // BANDS
+    return [(band, signature[band * width:(band + 1) * width]) for band in range(BANDS)]
+
+
+class DuplicateIndex:
+    """処理済みの会議の指紋から、同じ内容の会議のドキュメントを探す。スレッドセーフ。
+
+    claimした会議のドキュメントIDはresolveされるまで確定しないため、同じ実行内で重複する会議は
+    元の会議のドキュメント作成を待ってから紐付ける。
+    """
+
+    def __init__(self, documents: dict[str, dict] | None = None):
+        self._lock = threading.Lock()
+        self._by_hash: dict[str, str] = {}
+        self._buckets: dict[tuple[int, bytes], list[str]] = defaultdict(list)
+        self._minhashes: dict[str, bytes] = {}
+        self._starts: dict[str, datetime | None] = {}
+        # 会議ID → (元の会議ID, ドキュメントID) のFuture
+        self._documents: dict[str, Future] = {}
+        for meeting_id, entry in (documents or {}).items():
+            if "content_hash" not in entry:
+                continue
+            done: Future = Future()
+            done.set_result((entry.get("duplicate_of", meeting_id), entry["doc_id"]))
+            self._add_locked(meeting_id, Fingerprint.from_dict(entry), entry.get("start_time", ""), done)
+
+    def _add_locked(self, meeting_id: str, fp: Fingerprint, start_time: str, document: Future) -> None:
+        self._by_hash.setdefault(fp.content_hash, meeting_id)
+        self._starts[meeting_id] = _parse_start(start_time)
+        if len(fp.minhash) == NUM_PERM * 4:
+            self._minhashes[meeting_id] = fp.minhash
+            for key in _bands(fp.minhash):
+                self._buckets[key].append(meeting_id)
+        self._documents[meeting_id] = document
+
+    def _match_locked(self, fp: Fingerprint, start_time: str) -> str | None:
+        original = self._by_hash.get(fp.content_hash)
+        if original is not None:
+            return original
+        start = _parse_start(start_time)
+        if start is None:
+            return None
+        best, best_score = None, DUPLICATE_THRESHOLD
+        candidates = {mid for key in _bands(fp.minhash) for mid in self._buckets.get(key, ())}
+        for candidate in candidates:
+            other = self._starts.get(candidate)
+            if other is None or abs(other - start) > NEAR_DUPLICATE_WINDOW:
+                continue
+            score = similarity(fp.minhash, self._minhashes[candidate])
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def claim(self, meeting_id: str, fp: Fingerprint, start_time: str = "") -> Future | None:
+        """重複する会議があれば (元の会議ID, ドキュメントID) を返すFutureを返す。
+
+        なければNoneを返して、この会議を元の会議として登録する。呼び出し側はドキュメントを
+        作成したらresolveを、失敗したらabandonを呼ぶこと。
+        """
+        with self._lock:
+            original = self._match_locked(fp, start_time)
+            if original is not None and original != meeting_id:
+                return self._documents[original]
+            self._add_locked(meeting_id, fp, start_time, Future())
+            return None
+
+    def resolve(self, meeting_id: str, doc_id: str) -> None:
+        with self._lock:
+            document = self._documents[meeting_id]
+        document.set_result((meeting_id, doc_id))
+
+    def abandon(self, meeting_id: str) -> None:
+        """ドキュメントを作成できなかった会議を取り除く。待っている重複はNoneを受け取る。"""
+        with self._lock:
+            document = self._documents.pop(meeting_id, None)
+            self._minhashes.pop(meeting_id, None)
+            self._starts.pop(meeting_id, None)
+            for key, members in list(self._buckets.items()):
+                if meeting_id in members:
+                    members.remove(meeting_id)
+            self._by_hash = {h: mid for h, mid in self._by_hash.items() if mid != meeting_id}
+        if document is not None and not document.done():
+            document.set_result(None)
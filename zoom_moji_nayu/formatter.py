@@ -3,7 +3,11 @@
 from __future__ import annotations
 
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from zoom_moji_nayu.analytics import SpeakerStats
 
 
 @dataclass
@@ -12,6 +16,7 @@ class MeetingMetadata:
     topic: str
     participants: list[str]
     recording_url: str = ""
+    speaker_stats: list[SpeakerStats] = field(default_factory=list)
 
 
 @dataclass
@@ -26,17 +31,53 @@ class Segment:
     text: str
     start: str
     end: str
+    # キューの時刻（ミリ秒）。talk_msはマージしたキューの長さの合計
+    start_ms: int = 0
+    end_ms: int = 0
+    talk_ms: int = 0
+
+
+_CUE_NUMBER = re.compile(r"^\d+$")
+_CUE_TIMING = re.compile(r"([\d:.]+)\s*-->\s*([\d:.]+)")
+_SECONDS = re.compile(r"(\d{2}:\d{2}:\d{2})")
+_SPEAKER_TEXT = re.compile(r"^(.+?):\s+(.+)$")
+_TIMESTAMP = re.compile(r"(?:(\d+):)?(\d{2}):(\d{2})(?:\.(\d{1,3}))?")
+# 文字起こしのセクションの見出し。早期公開ではこの行までを先に作成する
+TRANSCRIPT_HEADING = "## 文字起こし"
+
+
+def _timestamp_ms(ts: str) -> int:
+    """00:01:05.500 や 01:05.500 をミリ秒に変換する。"""
+    match = _TIMESTAMP.match(ts)
+    if not match:
+        return 0
+    hours, minutes, seconds, millis = match.groups()
+    return (
+        (int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)) * 1000
+        + int((millis or "0").ljust(3, "0"))
+    )
 
 
 def _truncate_timestamp(ts: str) -> str:
     """00:00:05.500 → 00:00:05 のように秒単位に丸める。"""
-    match = re.match(r"(\d{2}:\d{2}:\d{2})", ts)
+    match = _SECONDS.match(ts)
     return match.group(1) if match else ts
 
 
+def _parse_timestamp(ts: str) -> tuple[str, int]:
+    """VTTの時刻を (秒単位に丸めた文字列, ミリ秒) にする。"""
+    if len(ts) == 12 and ts[2] == ":" and ts[5] == ":" and ts[8] == ".":
+        # Zoomが出力する HH:MM:SS.mmm は正規表現を使わずに変換する
+        try:
+            return ts[:8], (int(ts[:2]) * 3600 + int(ts[3:5]) * 60 + int(ts[6:8])) * 1000 + int(ts[9:])
+        except ValueError:
+            pass
+    return _truncate_timestamp(ts), _timestamp_ms(ts)
+
+
 def _parse_speaker_text(line: str) -> tuple[str, str]:
     """'田中太郎: テキスト' → ('田中太郎', 'テキスト') にパースする。"""
-    match = re.match(r"^(.+?):\s+(.+)$", line)
+    match = _SPEAKER_TEXT.match(line)
     if match:
         return match.group(1).strip(), match.group(2).strip()
     return "", line.strip()
@@ -48,13 +89,13 @@ def parse_vtt(vtt_text: str) -> list[Segment]:
     lines = vtt_text.strip().split("\n")
 
     i = 0
-    while i < len(lines) and not re.match(r"^\d+$", lines[i].strip()):
+    while i < len(lines) and not _CUE_NUMBER.match(lines[i].strip()):
         i += 1
 
     while i < len(lines):
         line = lines[i].strip()
 
-        if not re.match(r"^\d+$", line):
+        if not _CUE_NUMBER.match(line):
             i += 1
             continue
         i += 1
@@ -62,12 +103,13 @@ def parse_vtt(vtt_text: str) -> list[Segment]:
         if i >= len(lines):
             break
         ts_line = lines[i].strip()
-        ts_match = re.match(r"([\d:.]+)\s*-->\s*([\d:.]+)", ts_line)
+        ts_match = _CUE_TIMING.match(ts_line)
         if not ts_match:
             i += 1
             continue
-        start = _truncate_timestamp(ts_match.group(1))
-        end = _truncate_timestamp(ts_match.group(2))
+        start, start_ms = _parse_timestamp(ts_match.group(1))
+        end, end_ms = _parse_timestamp(ts_match.group(2))
+        talk_ms = max(end_ms - start_ms, 0)
         i += 1
 
         text_lines = []
@@ -80,14 +122,47 @@ def parse_vtt(vtt_text: str) -> list[Segment]:
         if segments and segments[-1].speaker == speaker:
             segments[-1].text += "\n" + text
             segments[-1].end = end
+            segments[-1].end_ms = end_ms
+            segments[-1].talk_ms += talk_ms
         else:
-            segments.append(Segment(speaker=speaker, text=text, start=start, end=end))
+            segments.append(Segment(
+                speaker=speaker, text=text, start=start, end=end,
+                start_ms=start_ms, end_ms=end_ms, talk_ms=talk_ms,
+            ))
 
         i += 1
 
     return segments
 
 
+def compact_segments(segments: list[Segment], window_ms: int) -> list[Segment]:
+    """発言を開始時刻でwindow_msごとの時間枠にまとめ、話者名を行頭に付けた1つのブロックにする。
+
+    話者が頻繁に入れ替わる会話でも見出し・話者の行が時間枠ごとに1つで済み、
+    ドキュメントの文字数とbatchUpdateのリクエスト数が減る。発言は時間枠をまたいでも分けず、
+    開始した時間枠に入れる。
+    """
+    blocks: list[Segment] = []
+    current_window = None
+    for seg in segments:
+        line = seg.text.replace("\n", " ")
+        if seg.speaker:
+            line = f"{seg.speaker}: {line}"
+        window = seg.start_ms // window_ms
+        if blocks and window == current_window:
+            block = blocks[-1]
+            block.text += "\n" + line
+            block.end, block.end_ms = seg.end, seg.end_ms
+            block.talk_ms += seg.talk_ms
+        else:
+            blocks.append(Segment(
+                speaker="", text=line, start=seg.start, end=seg.end,
+                start_ms=seg.start_ms, end_ms=seg.end_ms, talk_ms=seg.talk_ms,
+            ))
+            current_window = window
+    return blocks
+
+
 def segments_to_plain_text(segments: list[Segment]) -> str:
     """SegmentリストからAI要約用のプレーンテキストを生成する。"""
     lines = []
@@ -112,12 +187,32 @@ def format_transcript_markdown(segments: list[Segment]) -> str:
     return "\n".join(lines)
 
 
-def format_full_document(
-    segments: list[Segment],
-    metadata: MeetingMetadata,
-    summary: SummaryData | None,
-) -> str:
-    """全体のMarkdownドキュメントを生成する。"""
+def format_duration(ms: int) -> str:
+    """ミリ秒を「1時間5分」「12分30秒」「45秒」の形にする。"""
+    seconds = round(ms / 1000)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}時間{minutes}分"
+    if minutes:
+        return f"{minutes}分{seconds}秒"
+    return f"{seconds}秒"
+
+
+def format_speaker_stats(stats: list[SpeakerStats]) -> str:
+    """話者ごとの発言時間・割合・回数・最長の発言・割り込み回数のMarkdownを生成する。"""
+    total = sum(s.talk_ms for s in stats) or 1
+    lines = []
+    for s in stats:
+        lines.append(
+            f"- {s.speaker}: {format_duration(s.talk_ms)}（{s.talk_ms * 100 / total:.0f}%）、"
+            f"発言{s.turns}回、最長{format_duration(s.longest_ms)}、割り込み{s.interruptions}回"
+        )
+    return "\n".join(lines)
+
+
+def _format_header(metadata: MeetingMetadata, summary: SummaryData | None) -> list[str]:
+    """会議情報・発言の統計・要約・トピックの行。"""
     lines = [
         "# 会議議事録",
         "",
@@ -128,6 +223,14 @@ def format_full_document(
     if metadata.recording_url:
         lines.append(f"- 録画URL: {metadata.recording_url}")
 
+    if metadata.speaker_stats:
+        lines.extend([
+            "",
+            "## 発言の統計",
+            "",
+            format_speaker_stats(metadata.speaker_stats),
+        ])
+
     lines.extend(["", "---", ""])
 
     if summary:
@@ -145,11 +248,62 @@ def format_full_document(
                 "",
             ])
         lines.extend(["---", ""])
+    return lines
+
 
+def format_full_document(
+    segments: list[Segment],
+    metadata: MeetingMetadata,
+    summary: SummaryData | None,
+) -> str:
+    """全体のMarkdownドキュメントを生成する。"""
+    lines = _format_header(metadata, summary)
     lines.extend([
-        "## 文字起こし",
+        TRANSCRIPT_HEADING,
         "",
         format_transcript_markdown(segments),
     ])
 
     return "\n".join(lines)
+
+
+def format_part_document(
+    segments: list[Segment],
+    metadata: MeetingMetadata,
+    part_no: int,
+    part_count: int,
+) -> str:
+    """長い会議を分割した、文字起こしの一部分のMarkdownドキュメントを生成する。"""
+    lines = [
+        f"# 会議議事録（{part_no}/{part_count}）",
+        "",
+        f"- 日時: {metadata.date}",
+        f"- 会議名: {metadata.topic}",
+        f"- 範囲: {segments[0].start} - {segments[-1].end}",
+        "",
+        "---",
+        "",
+        TRANSCRIPT_HEADING,
+        "",
+        format_transcript_markdown(segments),
+    ]
+    return "\n".join(lines)
+
+
+def format_index_document(
+    metadata: MeetingMetadata,
+    summary: SummaryData | None,
+    parts: list[tuple[str, str, str]],
+) -> str:
+    """分割した会議の目次ドキュメントを生成する。partsは (開始時刻, 終了時刻, URL) のリスト。"""
+    lines = _format_header(metadata, summary)
+    lines.extend([
+        TRANSCRIPT_HEADING,
+        "",
+        f"文字起こしは長いため{len(parts)}つのドキュメントに分けています。",
+        "",
+    ])
+    for part_no, (start, end, url) in enumerate(parts, 1):
+        lines.append(f"- 第{part_no}部（{start} - {end}）: {url}")
+    lines.append("")
+    return "\n".join(lines)
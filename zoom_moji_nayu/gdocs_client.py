@@ -2,12 +2,21 @@
 
 from __future__ import annotations
 
+import copy
 import logging
-import re
+import queue
 import time
+from typing import Any, Callable
 
+import httplib2
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from zoom_moji_nayu.docs_requests import markdown_to_docs_requests
+from zoom_moji_nayu.metrics import DISABLED, Metrics
+from zoom_moji_nayu.ratelimit import RateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -16,10 +25,43 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive",
 ]
 MAX_RETRIES = 3
+# 作り直す前の本文に残る最後の段落の書式を、挿入するテキストが引き継がないよう標準に戻す
+_RESET_REQUESTS = [
+    {"deleteParagraphBullets": {"range": {"startIndex": 1, "endIndex": 2}}},
+    {"updateParagraphStyle": {
+        "range": {"startIndex": 1, "endIndex": 2},
+        "paragraphStyle": {"namedStyleType": "NORMAL_TEXT"},
+        "fields": "namedStyleType,spaceAbove,spaceBelow,borderTop,borderBottom,borderLeft",
+    }},
+    {"updateTextStyle": {
+        "range": {"startIndex": 1, "endIndex": 2},
+        "textStyle": {},
+        "fields": "bold,foregroundColor,fontSize,link",
+    }},
+]
+
+
+def authorized_http(creds: Credentials) -> AuthorizedHttp:
+    """認証済みのhttplib2接続を生成する。"""
+    return AuthorizedHttp(creds, http=httplib2.Http())
 
 
 class GDocsClient:
-    def __init__(self, client_id: str, client_secret: str, refresh_token: str, folder_id: str):
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        refresh_token: str,
+        folder_id: str,
+        http_factory: Callable[[Credentials], Any] | None = None,
+        metrics: Metrics | None = None,
+        write_limiter: RateLimiter | None = None,
+        read_limiter: RateLimiter | None = None,
+    ):
+        """http_factoryを渡すと、スレッドごとのHTTP接続を認証情報からその関数で生成する（記録・再生用）。
+
+        write_limiter・read_limiterを渡すと、書き込み・読み取りのAPI呼び出しをその回数に制限する。
+        """
         creds = Credentials(
             token=None,
             refresh_token=refresh_token,
@@ -28,240 +70,145 @@ class GDocsClient:
             token_uri="https://oauth2.googleapis.com/token",
             scopes=SCOPES,
         )
-        self.docs_service = build("docs", "v1", credentials=creds)
-        self.drive_service = build("drive", "v3", credentials=creds)
+        if http_factory is None:
+            self.docs_service = build("docs", "v1", credentials=creds)
+            self.drive_service = build("drive", "v3", credentials=creds)
+            http_factory = authorized_http
+        else:
+            self.docs_service = build("docs", "v1", http=http_factory(creds))
+            self.drive_service = build("drive", "v3", http=http_factory(creds))
+        # リソースの生成はdiscovery文書の解析を伴い重い（documents()は数十ms）ため、一度だけ行う
+        self._files = self.drive_service.files()
+        self._permissions = self.drive_service.permissions()
+        self._documents = self.docs_service.documents()
         self.folder_id = folder_id
-
-    def create_document(self, title: str, markdown_content: str) -> str:
-        """MarkdownコンテンツからGoogle Docsドキュメントを作成し、指定フォルダに配置する。"""
+        self._creds = creds
+        self._http_factory = http_factory
+        # 使われていないHTTP接続。スレッドをまたいで再利用し、常駐時も接続を保つ
+        self._idle_http: queue.SimpleQueue = queue.SimpleQueue()
+        self._metrics = metrics or DISABLED
+        self._write_limiter = write_limiter
+        self._read_limiter = read_limiter
+
+    def with_folder(self, folder_id: str) -> GDocsClient:
+        """作成先のフォルダだけを変えたクライアントを返す。
+
+        認証情報・APIリソース・HTTP接続・レート制限は共有するため、複数のアカウントの議事録を
+        それぞれのフォルダに作成しても、discoveryの読み込みやトークンの取得は1回で済む。
+        """
+        client = copy.copy(self)
+        client.folder_id = folder_id
+        return client
+
+    def _execute(self, request, api: str = "google.api", read: bool = False):
+        """他のスレッドと共有しないHTTP接続でAPIリクエストを実行する（httplib2はスレッドセーフでないため）。"""
+        limiter = self._read_limiter if read else self._write_limiter
+        if limiter:
+            limiter.acquire()
+        metrics = self._metrics
+        if metrics.enabled:
+            metrics.incr("api_calls", api=api)
+            body = getattr(request, "body", None)
+            if isinstance(body, (str, bytes)):
+                metrics.incr("bytes_sent", len(body), api=api)
+        try:
+            http = self._idle_http.get_nowait()
+        except queue.Empty:
+            http = self._http_factory(self._creds)
+        try:
+            return request.execute(http=http)
+        except HttpError as e:
+            if e.resp.status == 429:
+                metrics.incr("rate_limited", api=api)
+            raise
+        finally:
+            self._idle_http.put(http)
+
+    def create_document(
+        self,
+        title: str,
+        markdown_content: str,
+        docs_requests: list[dict] | None = None,
+        metadata: dict | None = None,
+    ) -> str:
+        """MarkdownコンテンツからGoogle Docsドキュメントを作成し、指定フォルダに配置する。
+
+        docs_requestsを渡した場合は、Markdownの変換を省いてそのままbatchUpdateに使う。
+        metadataは本文に含まれているため使わない（OutputBackendとしての引数）。
+        """
         file_metadata = {
             "name": title,
             "mimeType": "application/vnd.google-apps.document",
             "parents": [self.folder_id],
         }
-        file = (
-            self.drive_service.files()
-            .create(body=file_metadata, fields="id", supportsAllDrives=True)
-            .execute()
+        file = self._execute(
+            self._files
+            .create(body=file_metadata, fields="id", supportsAllDrives=True),
+            api="drive.files.create",
         )
         doc_id = file["id"]
 
-        requests = self._markdown_to_docs_requests(markdown_content)
+        requests = docs_requests
+        if requests is None:
+            requests = self._markdown_to_docs_requests(markdown_content)
         if requests:
-            for attempt in range(MAX_RETRIES):
-                try:
-                    self.docs_service.documents().batchUpdate(
-                        documentId=doc_id, body={"requests": requests}
-                    ).execute()
-                    break
-                except Exception as e:
-                    if attempt < MAX_RETRIES - 1:
-                        wait = 2 ** attempt
-                        logger.warning("Google Docs API error, retrying in %ds: %s", wait, e)
-                        time.sleep(wait)
-                    else:
-                        raise
+            self._batch_update(doc_id, requests)
 
-        self.drive_service.permissions().create(
+        self._execute(self._permissions.create(
             fileId=doc_id,
             body={"type": "anyone", "role": "reader"},
             supportsAllDrives=True,
-        ).execute()
+        ), api="drive.permissions.create")
 
         logger.info("Created document: %s (ID: %s)", title, doc_id)
         return doc_id
 
+    def append_document(self, doc_id: str, docs_requests: list[dict]) -> None:
+        """作成済みのドキュメントの本文の末尾に、その位置から生成したdocs_requestsで追記する。"""
+        self._batch_update(doc_id, docs_requests)
+
+    def _batch_update(self, doc_id: str, requests: list[dict]) -> None:
+        for attempt in range(MAX_RETRIES):
+            try:
+                self._execute(self._documents.batchUpdate(
+                    documentId=doc_id, body={"requests": requests}
+                ), api="docs.batchUpdate")
+                return
+            except Exception as e:
+                if attempt < MAX_RETRIES - 1:
+                    self._metrics.incr("retries", api="docs.batchUpdate")
+                    wait = 2 ** attempt
+                    logger.warning("Google Docs API error, retrying in %ds: %s", wait, e)
+                    time.sleep(wait)
+                else:
+                    raise
+
+    def replace_document(self, doc_id: str, title: str, docs_requests: list[dict]) -> None:
+        """既存のドキュメントの本文を消去し、docs_requestsで作り直す（1回のbatchUpdateで行う）。
+
+        タイトルが変わっていればファイル名も更新する。
+        """
+        document = self._execute(
+            self._documents.get(documentId=doc_id, fields="title,body(content(endIndex))"),
+            api="docs.get", read=True,
+        )
+        end = document["body"]["content"][-1]["endIndex"]
+        requests = []
+        if end > 2:
+            # 本文末尾の改行は消せないため残す
+            requests.append({"deleteContentRange": {"range": {"startIndex": 1, "endIndex": end - 1}}})
+        self._batch_update(doc_id, requests + _RESET_REQUESTS + docs_requests)
+        if document.get("title") != title:
+            self._execute(
+                self._files.update(fileId=doc_id, body={"name": title}, supportsAllDrives=True),
+                api="drive.files.update",
+            )
+        logger.info("Re-rendered document: %s (ID: %s)", title, doc_id)
+
     def get_document_url(self, doc_id: str) -> str:
         """ドキュメントIDからURLを生成する。"""
         return f"https://docs.google.com/document/d/{doc_id}/edit"
 
     def _markdown_to_docs_requests(self, md: str) -> list[dict]:
         """Markdownを解析してGoogle Docs batchUpdateリクエストのリストを生成する。"""
-        lines = md.split("\n")
-        elements: list[tuple[str, str]] = []
-
-        for line in lines:
-            if line.startswith("### "):
-                elements.append((line[4:] + "\n", "TIMESTAMP"))
-            elif line.startswith("## "):
-                elements.append((line[3:] + "\n", "HEADING_2"))
-            elif line.startswith("# "):
-                elements.append((line[2:] + "\n", "HEADING_1"))
-            elif line.startswith("---"):
-                elements.append(("\n", "SEPARATOR"))
-            elif line.startswith("- "):
-                elements.append((line[2:] + "\n", "BULLET"))
-            elif re.match(r"^\*\*(.+)\*\*$", line):
-                elements.append((re.match(r"^\*\*(.+)\*\*$", line).group(1) + "\n", "SPEAKER"))
-            elif line.strip() == "":
-                elements.append(("\n", "EMPTY"))
-            else:
-                elements.append((line + "\n", "NORMAL_TEXT"))
-
-        NAVY = {"red": 0.1, "green": 0.14, "blue": 0.49}
-        BLUE = {"red": 0.08, "green": 0.4, "blue": 0.75}
-        GRAY = {"red": 0.6, "green": 0.6, "blue": 0.6}
-        LIGHT_GRAY = {"red": 0.9, "green": 0.9, "blue": 0.9}
-
-        requests: list[dict] = []
-        index = 1
-        ranges: list[tuple[int, int, str, str]] = []
-
-        for text, style in elements:
-            requests.append({
-                "insertText": {
-                    "location": {"index": index},
-                    "text": text,
-                }
-            })
-            end_index = index + len(text)
-            ranges.append((index, end_index, text, style))
-            index = end_index
-
-        for start, end, text, style in ranges:
-            has_content = end - 1 > start
-
-            if style == "HEADING_1":
-                requests.append({"updateParagraphStyle": {
-                    "range": {"startIndex": start, "endIndex": end},
-                    "paragraphStyle": {
-                        "namedStyleType": "HEADING_1",
-                        "spaceBelow": {"magnitude": 8, "unit": "PT"},
-                        "borderBottom": {
-                            "color": {"color": {"rgbColor": NAVY}},
-                            "width": {"magnitude": 1.5, "unit": "PT"},
-                            "padding": {"magnitude": 6, "unit": "PT"},
-                            "dashStyle": "SOLID",
-                        },
-                    },
-                    "fields": "namedStyleType,spaceBelow,borderBottom",
-                }})
-                if has_content:
-                    requests.append({"updateTextStyle": {
-                        "range": {"startIndex": start, "endIndex": end - 1},
-                        "textStyle": {
-                            "foregroundColor": {"color": {"rgbColor": NAVY}},
-                        },
-                        "fields": "foregroundColor",
-                    }})
-
-            elif style == "HEADING_2":
-                requests.append({"updateParagraphStyle": {
-                    "range": {"startIndex": start, "endIndex": end},
-                    "paragraphStyle": {
-                        "namedStyleType": "HEADING_2",
-                        "spaceAbove": {"magnitude": 18, "unit": "PT"},
-                        "spaceBelow": {"magnitude": 6, "unit": "PT"},
-                        "borderLeft": {
-                            "color": {"color": {"rgbColor": NAVY}},
-                            "width": {"magnitude": 3, "unit": "PT"},
-                            "padding": {"magnitude": 8, "unit": "PT"},
-                            "dashStyle": "SOLID",
-                        },
-                    },
-                    "fields": "namedStyleType,spaceAbove,spaceBelow,borderLeft",
-                }})
-                if has_content:
-                    requests.append({"updateTextStyle": {
-                        "range": {"startIndex": start, "endIndex": end - 1},
-                        "textStyle": {
-                            "foregroundColor": {"color": {"rgbColor": NAVY}},
-                        },
-                        "fields": "foregroundColor",
-                    }})
-
-            elif style == "TIMESTAMP":
-                requests.append({"updateParagraphStyle": {
-                    "range": {"startIndex": start, "endIndex": end},
-                    "paragraphStyle": {
-                        "spaceAbove": {"magnitude": 16, "unit": "PT"},
-                        "spaceBelow": {"magnitude": 2, "unit": "PT"},
-                        "borderTop": {
-                            "color": {"color": {"rgbColor": LIGHT_GRAY}},
-                            "width": {"magnitude": 0.5, "unit": "PT"},
-                            "padding": {"magnitude": 6, "unit": "PT"},
-                            "dashStyle": "SOLID",
-                        },
-                    },
-                    "fields": "spaceAbove,spaceBelow,borderTop",
-                }})
-                if has_content:
-                    requests.append({"updateTextStyle": {
-                        "range": {"startIndex": start, "endIndex": end - 1},
-                        "textStyle": {
-                            "fontSize": {"magnitude": 8, "unit": "PT"},
-                            "foregroundColor": {"color": {"rgbColor": GRAY}},
-                        },
-                        "fields": "fontSize,foregroundColor",
-                    }})
-
-            elif style == "SPEAKER":
-                requests.append({"updateParagraphStyle": {
-                    "range": {"startIndex": start, "endIndex": end},
-                    "paragraphStyle": {
-                        "spaceAbove": {"magnitude": 0, "unit": "PT"},
-                        "spaceBelow": {"magnitude": 2, "unit": "PT"},
-                    },
-                    "fields": "spaceAbove,spaceBelow",
-                }})
-                if has_content:
-                    requests.append({"updateTextStyle": {
-                        "range": {"startIndex": start, "endIndex": end - 1},
-                        "textStyle": {
-                            "bold": True,
-                            "foregroundColor": {"color": {"rgbColor": BLUE}},
-                            "fontSize": {"magnitude": 10, "unit": "PT"},
-                        },
-                        "fields": "bold,foregroundColor,fontSize",
-                    }})
-
-            elif style == "SEPARATOR":
-                requests.append({"updateParagraphStyle": {
-                    "range": {"startIndex": start, "endIndex": end},
-                    "paragraphStyle": {
-                        "borderBottom": {
-                            "color": {"color": {"rgbColor": LIGHT_GRAY}},
-                            "width": {"magnitude": 0.5, "unit": "PT"},
-                            "padding": {"magnitude": 4, "unit": "PT"},
-                            "dashStyle": "SOLID",
-                        },
-                        "spaceAbove": {"magnitude": 8, "unit": "PT"},
-                        "spaceBelow": {"magnitude": 8, "unit": "PT"},
-                    },
-                    "fields": "borderBottom,spaceAbove,spaceBelow",
-                }})
-
-            elif style == "BULLET":
-                requests.append({"createParagraphBullets": {
-                    "range": {"startIndex": start, "endIndex": end},
-                    "bulletPreset": "BULLET_DISC_CIRCLE_SQUARE",
-                }})
-                kv_match = re.match(r"^(.+?): ", text)
-                if kv_match:
-                    key_end = start + len(kv_match.group(1)) + 1
-                    requests.append({"updateTextStyle": {
-                        "range": {"startIndex": start, "endIndex": key_end},
-                        "textStyle": {"bold": True},
-                        "fields": "bold",
-                    }})
-                url_match = re.search(r"(https?://\S+)", text)
-                if url_match:
-                    requests.append({"updateTextStyle": {
-                        "range": {
-                            "startIndex": start + url_match.start(),
-                            "endIndex": start + url_match.end(),
-                        },
-                        "textStyle": {"link": {"url": url_match.group(1)}},
-                        "fields": "link",
-                    }})
-
-        if index > 1:
-            requests.append({"updateTextStyle": {
-                "range": {"startIndex": 1, "endIndex": index},
-                "textStyle": {
-                    "weightedFontFamily": {"fontFamily": "Noto Sans JP"},
-                },
-                "fields": "weightedFontFamily",
-            }})
-
-        return requests
+        return markdown_to_docs_requests(md)
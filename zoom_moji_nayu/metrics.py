@@ -0,0 +1,179 @@
+"""実行メトリクスの計測モジュール
+
+会議ごと・ステージごとの処理時間（スパン）と、API呼び出し回数・転送量・リトライ・429のカウンターを集計し、
+JSONの実行レポートとPrometheusのtextfile形式で出力する。無効時はほぼ何もしない。
+"""
+
+from __future__ import annotations
+
+import statistics
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import Callable, ContextManager, Iterable
+
+PROMETHEUS_PREFIX = "zoom_moji_nayu"
+
+# 無効時にspan()が返す使い回しのコンテキスト
+_NULL_SPAN = nullcontext()
+
+COUNTER_HELP = {
+    "api_calls": "API requests sent, by endpoint.",
+    "bytes_received": "Response bytes received, by endpoint.",
+    "bytes_sent": "Request body bytes sent, by endpoint.",
+    "retries": "Requests retried after an error, by endpoint.",
+    "rate_limited": "HTTP 429 responses, by endpoint.",
+    "meetings": "Meetings handled in this run, by result.",
+    "documents": "Existing documents handled by rerender, by result.",
+    "compaction_saved_chars": "Transcript characters removed by time-window compaction.",
+    "compaction_saved_requests": "Docs batchUpdate requests removed by time-window compaction.",
+}
+
+
+class Metrics:
+    """スパンとカウンターを集計する。スレッドセーフ。
+
+    hooksには (stage, meeting_id) を受け取ってコンテキストマネージャーを返す関数を渡せる。
+    各スパンはフックのコンテキスト内で実行される（プロファイラー用）。
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        hooks: Iterable[Callable[[str, str | None], ContextManager]] = (),
+    ):
+        self.enabled = enabled
+        self._hooks = list(hooks)
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = defaultdict(float)
+        self._stage_seconds: dict[str, list[float]] = defaultdict(list)
+        self._meeting_seconds: dict[str, dict[str, float]] = defaultdict(dict)
+
+    def incr(self, name: str, value: float = 1, **labels: str) -> None:
+        """カウンターを加算する。"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def span(self, stage: str, meeting_id: str | None = None):
+        """withブロックの処理時間をステージ（と会議）ごとに記録する。"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(stage, meeting_id)
+
+    @contextmanager
+    def _span(self, stage: str, meeting_id: str | None):
+        with ExitStack() as stack:
+            for hook in self._hooks:
+                stack.enter_context(hook(stage, meeting_id))
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.observe(stage, time.perf_counter() - started, meeting_id)
+
+    def observe(self, stage: str, seconds: float, meeting_id: str | None = None) -> None:
+        """計測済みの処理時間を記録する。"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._stage_seconds[stage].append(seconds)
+            if meeting_id is not None:
+                meetings = self._meeting_seconds[meeting_id]
+                meetings[stage] = meetings.get(stage, 0.0) + seconds
+
+    def counter(self, name: str, **labels: str) -> float:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            return self._counters.get(key, 0.0)
+
+    def report(self) -> dict:
+        """JSONの実行レポートを生成する。"""
+        with self._lock:
+            stage_seconds = {stage: list(values) for stage, values in self._stage_seconds.items()}
+            meetings = {mid: dict(stages) for mid, stages in self._meeting_seconds.items()}
+            counters = dict(self._counters)
+
+        stages = {}
+        for stage, values in stage_seconds.items():
+            ordered = sorted(values)
+            stages[stage] = {
+                "count": len(values),
+                "total_seconds": round(sum(values), 6),
+                "p50_seconds": round(statistics.median(ordered), 6),
+                "p95_seconds": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 6),
+                "max_seconds": round(ordered[-1], 6),
+            }
+        return {
+            "started_at": self.started_at.isoformat(),
+            "duration_seconds": round(time.perf_counter() - self._started, 6),
+            "stages": stages,
+            "meetings": {
+                mid: {stage: round(seconds, 6) for stage, seconds in values.items()}
+                for mid, values in meetings.items()
+            },
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus node_exporterのtextfileコレクター形式で出力する。"""
+        report = self.report()
+        lines = []
+
+        by_name: dict[str, list[dict]] = defaultdict(list)
+        for item in report["counters"]:
+            by_name[item["name"]].append(item)
+        for name, items in by_name.items():
+            metric = f"{PROMETHEUS_PREFIX}_{name}_total"
+            lines.append(f"# HELP {metric} {COUNTER_HELP.get(name, name)}")
+            lines.append(f"# TYPE {metric} counter")
+            for item in items:
+                lines.append(f"{metric}{_labels(item['labels'])} {_number(item['value'])}")
+
+        if report["stages"]:
+            metric = f"{PROMETHEUS_PREFIX}_stage_seconds"
+            lines.append(f"# HELP {metric} Time spent in each pipeline stage.")
+            lines.append(f"# TYPE {metric} summary")
+            for stage, values in report["stages"].items():
+                labels = {"stage": stage}
+                for quantile, key in (("0.5", "p50_seconds"), ("0.95", "p95_seconds")):
+                    lines.append(f"{metric}{_labels({**labels, 'quantile': quantile})} {values[key]}")
+                lines.append(f"{metric}_sum{_labels(labels)} {values['total_seconds']}")
+                lines.append(f"{metric}_count{_labels(labels)} {values['count']}")
+
+        for name, help_text, value in (
+            ("run_duration_seconds", "Wall-clock duration of the last run.", report["duration_seconds"]),
+            ("last_run_timestamp_seconds", "Start time of the last run.", self.started_at.timestamp()),
+        ):
+            metric = f"{PROMETHEUS_PREFIX}_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels.items()
+    )
+    return "{" + body + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# 計測しない場合に各クライアントが使う共有インスタンス
+DISABLED = Metrics(enabled=False)
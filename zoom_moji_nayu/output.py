@@ -0,0 +1,164 @@
+"""議事録の出力先
+
+process_recordingsは議事録をOutputBackendを通して書き出す。Google Docsに作成するGDocsClientのほか、
+ローカルのディレクトリにMarkdown・HTMLとメタデータのJSONを書き出すLocalExportBackendがあり、
+Google APIなしでのオフラインの保存・一括エクスポート・スループット計測に使える。
+"""
+
+from __future__ import annotations
+
+import html
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Protocol
+
+from zoom_moji_nayu.docs_requests import parse_markdown_lines
+from zoom_moji_nayu.state import atomic_write_json, atomic_write_text
+
+logger = logging.getLogger(__name__)
+
+# ファイル名に使えない文字。Windowsと共有するディレクトリでも扱えるようにする
+_UNSAFE_FILENAME = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+# 日本語のタイトルでもファイル名が255バイトに収まる長さ
+_MAX_STEM_CHARS = 80
+_URL = re.compile(r"(https?://\S+|file://\S+)")
+_HTML_STYLE = """body { font-family: "Noto Sans JP", sans-serif; max-width: 48em; margin: 2em auto; line-height: 1.6; }
+h1 { color: #1a237e; border-bottom: 2px solid #1a237e; padding-bottom: 6px; }
+h2 { color: #1a237e; border-left: 4px solid #1a237e; padding-left: 8px; margin-top: 1.5em; }
+h3.timestamp { color: #999; font-size: 0.75em; font-weight: normal; border-top: 1px solid #e6e6e6; padding-top: 6px; }
+p.speaker { color: #1466bf; font-weight: bold; font-size: 0.85em; margin: 0 0 2px; }
+p { margin: 0 0 0.5em; }
+hr { border: none; border-bottom: 1px solid #e6e6e6; }"""
+
+
+class OutputBackend(Protocol):
+    """議事録の出力先。create_documentが返すIDからget_document_urlでリンクを作る。"""
+
+    def create_document(
+        self,
+        title: str,
+        markdown_content: str,
+        docs_requests: list[dict] | None = None,
+        metadata: dict | None = None,
+    ) -> str:
+        """ドキュメントを作成してIDを返す。metadataは会議情報・話者など、出力先が本文とは別に保存できる情報。"""
+        ...
+
+    def get_document_url(self, doc_id: str) -> str:
+        ...
+
+
+def _linkify(text: str) -> str:
+    return _URL.sub(lambda m: f'<a href="{m.group(1)}">{m.group(1)}</a>', html.escape(text, quote=False))
+
+
+def markdown_to_html(md: str, title: str) -> str:
+    """議事録のMarkdownを、Google Docsと同じ見た目のHTML文書に変換する。"""
+    body: list[str] = []
+    in_list = False
+    for text, style in parse_markdown_lines(md):
+        text = text.rstrip("\n")
+        if style == "BULLET":
+            if not in_list:
+                body.append("<ul>")
+                in_list = True
+            key, sep, value = text.partition(": ")
+            if sep:
+                body.append(f"<li><strong>{html.escape(key)}:</strong> {_linkify(value)}</li>")
+            else:
+                body.append(f"<li>{_linkify(text)}</li>")
+            continue
+        if in_list:
+            body.append("</ul>")
+            in_list = False
+        if style == "HEADING_1":
+            body.append(f"<h1>{html.escape(text)}</h1>")
+        elif style == "HEADING_2":
+            body.append(f"<h2>{html.escape(text)}</h2>")
+        elif style == "TIMESTAMP":
+            body.append(f'<h3 class="timestamp">{html.escape(text)}</h3>')
+        elif style == "SPEAKER":
+            body.append(f'<p class="speaker">{html.escape(text)}</p>')
+        elif style == "SEPARATOR":
+            body.append("<hr>")
+        elif style == "NORMAL_TEXT":
+            body.append(f"<p>{_linkify(text)}</p>")
+    if in_list:
+        body.append("</ul>")
+    return (
+        '<!DOCTYPE html>\n<html lang="ja">\n<head>\n<meta charset="utf-8">\n'
+        f"<title>{html.escape(title)}</title>\n<style>\n{_HTML_STYLE}\n</style>\n</head>\n<body>\n"
+        + "\n".join(body)
+        + "\n</body>\n</html>\n"
+    )
+
+
+class LocalExportBackend:
+    """ディレクトリに <タイトル>.md・.html・.json を書き出す出力先。
+
+    各ファイルは一時ファイルからのリネームでアトミックに書き出し、MarkdownとHTMLはスレッドプールで
+    並行して書く。メタデータのJSONは最後に書くため、JSONがあるドキュメントは書き出しが完了している。
+    """
+
+    def __init__(self, directory: str, workers: int = 4):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export")
+        self._lock = threading.Lock()
+        # この実行で割り当てたが、まだ書き出していない名前
+        self._reserved: set[str] = set()
+
+    def _reserve_stem(self, title: str) -> str:
+        """タイトルから、既存のファイルと重ならないファイル名（拡張子なし）を決める。"""
+        base = _UNSAFE_FILENAME.sub("_", title).strip(" .")[:_MAX_STEM_CHARS] or "untitled"
+        with self._lock:
+            stem, no = base, 1
+            while stem in self._reserved or (self.directory / f"{stem}.json").exists():
+                no += 1
+                stem = f"{base}_{no}"
+            self._reserved.add(stem)
+        return stem
+
+    def create_document(
+        self,
+        title: str,
+        markdown_content: str,
+        docs_requests: list[dict] | None = None,
+        metadata: dict | None = None,
+    ) -> str:
+        """Markdown・HTML・メタデータのJSONを書き出し、ファイル名（拡張子なし）をIDとして返す。
+
+        docs_requestsはGoogle Docs用のため使わない。
+        """
+        stem = self._reserve_stem(title)
+        base = self.directory / stem
+        try:
+            writes = [
+                self._pool.submit(atomic_write_text, f"{base}.md", markdown_content),
+                self._pool.submit(lambda: atomic_write_text(f"{base}.html", markdown_to_html(markdown_content, title))),
+            ]
+            for future in writes:
+                future.result()
+            atomic_write_json(f"{base}.json", {
+                "title": title,
+                "markdown": f"{stem}.md",
+                "html": f"{stem}.html",
+                "exported_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                **(metadata or {}),
+            })
+        finally:
+            with self._lock:
+                self._reserved.discard(stem)
+        logger.info("Exported document: %s (%s)", title, base)
+        return stem
+
+    def get_document_url(self, doc_id: str) -> str:
+        """書き出したHTMLのfile:// URL。"""
+        return (self.directory / f"{doc_id}.html").resolve().as_uri()
+
+    def close(self) -> None:
+        self._pool.shutdown()
@@ -0,0 +1,108 @@
+"""有界キューでステージをつなぐパイプライン実行モジュール"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+
+
+@dataclass
+class Job:
+    seq: int
+    value: Any
+    error: Exception | None = None
+    failed_stage: str | None = None
+
+
+def run_pipeline(
+    items: Iterable[Any],
+    stages: list[Stage],
+    on_result: Callable[[Job], None],
+    queue_size: int = 4,
+) -> None:
+    """itemsを各ステージに順に流し、入力順でon_resultを呼び出す。
+
+    ステージ間は容量queue_sizeのキューでつながり、下流が詰まると上流が待機する。
+    ステージで例外が発生したジョブは以降のステージを飛ばし、errorを設定したまま結果として届く。
+    on_resultが例外を送出した場合は残りのジョブを処理せずに流し切り、スレッドを終了させてから送出する。
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    counts = [max(1, stage.workers) for stage in stages]
+    cancelled = threading.Event()
+
+    def feed() -> None:
+        for seq, item in enumerate(items):
+            if cancelled.is_set():
+                break
+            queues[0].put(Job(seq=seq, value=item))
+        for _ in range(counts[0]):
+            queues[0].put(_DONE)
+
+    def work(index: int) -> None:
+        stage = stages[index]
+        inbox, outbox = queues[index], queues[index + 1]
+        while True:
+            job = inbox.get()
+            if job is _DONE:
+                return
+            if job.error is None and not cancelled.is_set():
+                try:
+                    job.value = stage.func(job.value)
+                except Exception as e:
+                    logger.debug("Stage %s failed for job %d: %s", stage.name, job.seq, e)
+                    job.error = e
+                    job.failed_stage = stage.name
+            outbox.put(job)
+
+    def close(index: int, workers: list[threading.Thread]) -> None:
+        for t in workers:
+            t.join()
+        downstream = counts[index + 1] if index + 1 < len(stages) else 1
+        for _ in range(downstream):
+            queues[index + 1].put(_DONE)
+
+    threads = [threading.Thread(target=feed, name="pipeline-feed", daemon=True)]
+    for index, stage in enumerate(stages):
+        workers = [
+            threading.Thread(target=work, args=(index,), name=f"pipeline-{stage.name}-{n}", daemon=True)
+            for n in range(counts[index])
+        ]
+        threads.extend(workers)
+        threads.append(threading.Thread(
+            target=close, args=(index, workers), name=f"pipeline-{stage.name}-close", daemon=True,
+        ))
+    for t in threads:
+        t.start()
+
+    # 完了順ではなく入力順に結果を確定させる
+    pending: dict[int, Job] = {}
+    next_seq = 0
+    try:
+        while True:
+            job = queues[-1].get()
+            if job is _DONE:
+                break
+            pending[job.seq] = job
+            while next_seq in pending:
+                on_result(pending.pop(next_seq))
+                next_seq += 1
+    except BaseException:
+        # 上流のスレッドがキューへの投入で止まったままにならないよう、最後まで受け取って捨てる
+        cancelled.set()
+        while queues[-1].get() is not _DONE:
+            pass
+        raise
@@ -0,0 +1,198 @@
+"""プロファイリングモジュール
+
+Metricsのスパンにフックし、cProfileによるCPUプロファイルとtracemallocによるメモリ計測を
+ステージ・会議ごとに集計してディレクトリに書き出す。
+"""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from zoom_moji_nayu.state import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+TOP_SITES = 10
+TOP_FUNCTIONS = 40
+# 確保箇所の集計から除く、計測処理自体のファイル
+_IGNORED_FILES = (
+    tracemalloc.__file__, cProfile.__file__, pstats.__file__,
+    "<frozen importlib._bootstrap>", "<unknown>",
+)
+
+
+def safe_filename(meeting_id: str) -> str:
+    """会議UUID（Base64）をファイル名に使える形にする。URLセーフBase64と同じ置換なので衝突しない。"""
+    return re.sub(r"[^A-Za-z0-9_.=-]", "_", meeting_id.translate(str.maketrans("+/", "-_")))
+
+
+class Profiler:
+    """スパンごとにcProfile・tracemallocを動かし、実行全体・会議ごとの結果を保存する。
+
+    cProfileはスレッドごとにしか動かないため、スパンごとにプロファイラーを作ってから統合する。
+    Python 3.12以降は同時に1つのプロファイラーしか有効にできないため、CPUプロファイル時もスパンを直列に実行する。
+    tracemallocはプロセス全体で共有されるため、メモリ計測時はスパンを1つずつ直列に実行する。
+    ワーカープロセス（--cpu-workers）内の処理は計測されない。
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        profile: str | None = None,
+        trace_memory: bool = False,
+    ):
+        if profile not in (None, "run", "meeting"):
+            raise ValueError(f"Unknown profile mode: {profile}")
+        self.directory = directory
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self._lock = threading.Lock()
+        self._memory_lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+        # スパンの中で開いたスパンは、外側のプロファイラーがまとめて計測する
+        self._profiling = threading.local()
+        self._run_stats: pstats.Stats | None = None
+        self._meeting_stats: dict[str, pstats.Stats] = {}
+        self._memory: dict[str, dict] = defaultdict(lambda: {
+            "spans": 0, "peak_kib": 0.0, "retained_kib": 0.0, "sites": Counter(), "meetings": {},
+        })
+
+    def __enter__(self) -> Profiler:
+        if self.trace_memory:
+            # 確保箇所は直近のフレームだけで集計するので、トレースバックは1フレームで足りる
+            tracemalloc.start(1)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.trace_memory:
+            tracemalloc.stop()
+
+    def hook(self, stage: str, meeting_id: str | None):
+        """Metricsのhooksに渡すフック。"""
+        return self._span(stage, meeting_id)
+
+    @contextmanager
+    def _span(self, stage: str, meeting_id: str | None):
+        with self._traced(stage, meeting_id), self._profiled(meeting_id):
+            yield
+
+    @contextmanager
+    def _profiled(self, meeting_id: str | None):
+        if not self.profile or getattr(self._profiling, "active", False):
+            yield
+            return
+        with self._profile_lock:
+            self._profiling.active = True
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                self._profiling.active = False
+                self._add_profile(profile, meeting_id)
+
+    def _add_profile(self, profile: cProfile.Profile, meeting_id: str | None) -> None:
+        with self._lock:
+            if self._run_stats is None:
+                self._run_stats = pstats.Stats(profile)
+            else:
+                self._run_stats.add(profile)
+            if self.profile == "meeting" and meeting_id is not None:
+                stats = self._meeting_stats.get(meeting_id)
+                if stats is None:
+                    self._meeting_stats[meeting_id] = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+
+    @contextmanager
+    def _traced(self, stage: str, meeting_id: str | None):
+        if not self.trace_memory:
+            yield
+            return
+        with self._memory_lock:
+            before = tracemalloc.take_snapshot()
+            start, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            try:
+                yield
+            finally:
+                current, peak = tracemalloc.get_traced_memory()
+                after = tracemalloc.take_snapshot()
+                self._add_memory(stage, meeting_id, before, after, start, current, peak)
+
+    def _add_memory(
+        self, stage: str, meeting_id: str | None,
+        before: tracemalloc.Snapshot, after: tracemalloc.Snapshot,
+        start: int, current: int, peak: int,
+    ) -> None:
+        filters = [tracemalloc.Filter(False, name) for name in _IGNORED_FILES]
+        diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+        entry = self._memory[stage]
+        entry["spans"] += 1
+        peak_kib = (peak - start) / 1024
+        entry["peak_kib"] = max(entry["peak_kib"], peak_kib)
+        entry["retained_kib"] += (current - start) / 1024
+        for stat in diff[:TOP_SITES]:
+            if stat.size_diff > 0:
+                frame = stat.traceback[0]
+                entry["sites"][f"{frame.filename}:{frame.lineno}"] += stat.size_diff
+        if meeting_id is not None:
+            entry["meetings"][meeting_id] = round(peak_kib, 1)
+
+    def write(self) -> list[str]:
+        """結果をディレクトリに書き出し、書き出したファイルのパスを返す。"""
+        os.makedirs(self.directory, exist_ok=True)
+        written = []
+        with self._lock:
+            run_stats = self._run_stats
+            meeting_stats = dict(self._meeting_stats)
+        if run_stats is not None:
+            written.extend(self._write_stats(run_stats, f"run-{self.run_id}"))
+        for meeting_id, stats in meeting_stats.items():
+            written.extend(self._write_stats(stats, f"meeting-{self.run_id}-{safe_filename(meeting_id)}"))
+        if self.trace_memory:
+            path = os.path.join(self.directory, f"memory-{self.run_id}.json")
+            atomic_write_json(path, self.memory_report())
+            written.append(path)
+        for path in written:
+            logger.info("Wrote profile: %s", path)
+        return written
+
+    def _write_stats(self, stats: pstats.Stats, name: str) -> list[str]:
+        """pstats形式（snakeviz等で開ける）と、累積時間順の上位関数のテキストを書き出す。"""
+        prof_path = os.path.join(self.directory, name + ".pstats")
+        stats.dump_stats(prof_path)
+        text = io.StringIO()
+        pstats.Stats(prof_path, stream=text).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        text_path = os.path.join(self.directory, name + ".txt")
+        with open(text_path, "w") as f:
+            f.write(text.getvalue())
+        return [prof_path, text_path]
+
+    def memory_report(self) -> dict:
+        """ステージごとのピークメモリ・残存メモリ・確保量の多い箇所をまとめる。"""
+        stages = {}
+        for stage, entry in self._memory.items():
+            stages[stage] = {
+                "spans": entry["spans"],
+                "peak_kib": round(entry["peak_kib"], 1),
+                "retained_kib": round(entry["retained_kib"], 1),
+                "top_sites": [
+                    {"site": site, "size_kib": round(size / 1024, 1)}
+                    for site, size in entry["sites"].most_common(TOP_SITES)
+                ],
+                "peak_kib_by_meeting": entry["meetings"],
+            }
+        return {"run_id": self.run_id, "stages": stages}
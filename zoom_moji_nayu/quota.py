@@ -0,0 +1,173 @@
+"""API割り当てを見積もって実行を計画する
+
+大量のバックフィルはGoogle Docs/Driveの書き込みやZoomの1日の割り当てを途中で使い切り、
+残りの会議が割り当て超過のエラーで失敗する。録画一覧の文字起こしのファイルサイズから会議ごとの
+API呼び出し回数を見積もり、1日の残りの割り当てに収まる会議だけを今回の実行に回し、
+残りは次回の実行に繰り越す。
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Callable, TypeVar
+from zoneinfo import ZoneInfo
+
+from zoom_moji_nayu.renderer import FILL_BATCH_CHARS, PART_MAX_CHARS, PART_MAX_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Google APIの1日の割り当ては太平洋時間の0時、Zoomは協定世界時の0時にリセットされる
+GOOGLE_QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+ZOOM_QUOTA_TZ = timezone.utc
+# VTTの1バイトあたりの議事録の文字数・batchUpdateリクエスト数。話者の入れ替わりが多い会議での実測値の上限
+MARKDOWN_CHARS_PER_VTT_BYTE = 0.4
+DOCS_REQUESTS_PER_VTT_BYTE = 0.047
+# 録画一覧にファイルサイズがない場合に仮定する大きさ（1時間の会議程度）
+DEFAULT_TRANSCRIPT_BYTES = 120_000
+# ドキュメント1つあたりの書き込み（ファイル作成・batchUpdate・共有設定）
+WRITES_PER_DOCUMENT = 3
+
+
+@dataclass
+class QuotaBudget:
+    """API呼び出しの予算。Noneの項目は制限しない。"""
+    google_writes_per_minute: float | None = None
+    google_writes_per_day: int | None = None
+    zoom_requests_per_minute: float | None = None
+    zoom_requests_per_day: int | None = None
+
+    @property
+    def has_daily_limit(self) -> bool:
+        return self.google_writes_per_day is not None or self.zoom_requests_per_day is not None
+
+    def shard_share(self, used: dict[str, int], shards: int) -> QuotaBudget:
+        """1日の残りの予算をshards個のシャードで等分した、1シャード分の予算。
+
+        usedはシャードを始める前にすでに使った回数（google_writes・zoom_requests）。
+        """
+        def share(per_day: int | None, name: str) -> int | None:
+            if per_day is None:
+                return None
+            return max(0, per_day - used.get(name, 0)) // shards
+
+        return replace(
+            self,
+            google_writes_per_day=share(self.google_writes_per_day, "google_writes"),
+            zoom_requests_per_day=share(self.zoom_requests_per_day, "zoom_requests"),
+        )
+
+
+@dataclass
+class MeetingCost:
+    """会議1件の処理で見込むAPI呼び出しの回数。"""
+    google_writes: int
+    zoom_requests: int
+
+
+def quota_days(now: datetime) -> dict[str, str]:
+    """割り当てごとの、リセットの基準になる現在の日付。"""
+    return {
+        "google_writes": now.astimezone(GOOGLE_QUOTA_TZ).date().isoformat(),
+        "zoom_requests": now.astimezone(ZOOM_QUOTA_TZ).date().isoformat(),
+    }
+
+
+def transcript_bytes(meeting: dict) -> int:
+    """録画一覧にある文字起こしのファイルサイズ。ない場合はDEFAULT_TRANSCRIPT_BYTES。"""
+    for f in meeting.get("recording_files", []):
+        if f.get("recording_type") == "audio_transcript" and f.get("file_size"):
+            return int(f["file_size"])
+    return DEFAULT_TRANSCRIPT_BYTES
+
+
+def estimate_cost(
+    meeting: dict,
+    part_max_chars: int = PART_MAX_CHARS,
+    part_max_requests: int = PART_MAX_REQUESTS,
+    early_publish: bool = False,
+) -> MeetingCost:
+    """録画一覧の情報から、会議1件のAPI呼び出し回数を多めに見積もる。
+
+    文字起こしの大きさから議事録が分割されるかを判定し、パートと目次の分のドキュメントを数える。
+    early_publishがTrueの場合は、本文を追記するbatchUpdateの回数を加える。
+    """
+    size = transcript_bytes(meeting)
+    chars = size * MARKDOWN_CHARS_PER_VTT_BYTE
+    parts = max(
+        math.ceil(chars / part_max_chars),
+        math.ceil(size * DOCS_REQUESTS_PER_VTT_BYTE / part_max_requests),
+    )
+    documents = parts + 1 if parts > 1 else 1
+    google_writes = documents * WRITES_PER_DOCUMENT
+    if early_publish:
+        # 分割した会議の目次には、パートへのリンクを1回で追記する
+        google_writes += math.ceil(chars / FILL_BATCH_CHARS) if parts == 1 else 1
+    has_summary = any(f.get("recording_type") == "summary" for f in meeting.get("recording_files", []))
+    return MeetingCost(
+        google_writes=google_writes,
+        zoom_requests=1 + has_summary,
+    )
+
+
+@dataclass
+class RunPlan:
+    """今回の実行で処理する会議と、次回に繰り越す会議。"""
+    scheduled: list = field(default_factory=list)
+    deferred: list = field(default_factory=list)
+    google_writes: int = 0
+    zoom_requests: int = 0
+    # 予算の1分あたりの上限で処理した場合の見込み時間（分）
+    minutes: float = 0.0
+
+    def describe(self) -> str:
+        text = (
+            f"{len(self.scheduled)} meetings scheduled, {len(self.deferred)} deferred; "
+            f"estimated {self.google_writes} Google writes, {self.zoom_requests} Zoom requests"
+        )
+        if self.minutes:
+            text += f", about {self.minutes:.0f} min at the per-minute budget"
+        return text
+
+
+def plan_run(
+    jobs: list[T],
+    budget: QuotaBudget,
+    used: dict[str, int],
+    cost_of: Callable[[T], MeetingCost],
+) -> RunPlan:
+    """1日の残りの割り当てに収まる会議を、渡された順に選ぶ。
+
+    usedは今日すでに使った回数（google_writes・zoom_requests）。収まらない会議は飛ばして次の会議を試し、
+    飛ばした会議はdeferredに入れる。
+    """
+    google_left = math.inf
+    if budget.google_writes_per_day is not None:
+        google_left = budget.google_writes_per_day - used.get("google_writes", 0)
+    zoom_left = math.inf
+    if budget.zoom_requests_per_day is not None:
+        zoom_left = budget.zoom_requests_per_day - used.get("zoom_requests", 0)
+
+    plan = RunPlan()
+    for job in jobs:
+        cost = cost_of(job)
+        if cost.google_writes > google_left or cost.zoom_requests > zoom_left:
+            plan.deferred.append(job)
+            continue
+        plan.scheduled.append(job)
+        google_left -= cost.google_writes
+        zoom_left -= cost.zoom_requests
+        plan.google_writes += cost.google_writes
+        plan.zoom_requests += cost.zoom_requests
+
+    for total, per_minute in (
+        (plan.google_writes, budget.google_writes_per_minute),
+        (plan.zoom_requests, budget.zoom_requests_per_minute),
+    ):
+        if per_minute:
+            plan.minutes = max(plan.minutes, total / per_minute)
+    return plan
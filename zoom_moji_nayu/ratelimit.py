@@ -0,0 +1,42 @@
+"""クライアント側のレート制限"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable
+
+
+class RateLimiter:
+    """トークンバケット方式で、1分あたりの呼び出し回数を制限する。スレッドセーフ。
+
+    待つ必要がある呼び出しは、到着順に次の空き時刻を予約してから眠るため、ロックを握ったまま待たない。
+    """
+
+    def __init__(
+        self,
+        per_minute: float,
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.per_minute = per_minute
+        self._interval = 60 / per_minute
+        self._burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def acquire(self) -> float:
+        """1回分の枠を取得する。待った秒数を返す。"""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) / self._interval)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens * self._interval if self._tokens < 0 else 0.0
+        if wait:
+            self._sleep(wait)
+        return wait
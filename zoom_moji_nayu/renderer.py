@@ -0,0 +1,335 @@
+"""会議1件分の議事録生成モジュール
+
+ネットワークに依存しない純粋関数のみを置き、プロセスプールのワーカーからも呼び出せるようにする。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from zoom_moji_nayu.docs_requests import markdown_to_docs_requests
+from zoom_moji_nayu.formatter import (
+    TRANSCRIPT_HEADING, compact_segments, parse_vtt, format_full_document, format_index_document, format_part_document,
+    format_transcript_markdown, MeetingMetadata, Segment, SummaryData,
+)
+
+if TYPE_CHECKING:
+    from zoom_moji_nayu.fingerprint import Fingerprint
+
+logger = logging.getLogger(__name__)
+
+# 1つのドキュメントに収める文字数・batchUpdateリクエスト数の上限。3時間程度の会議までは分割しない
+PART_MAX_CHARS = 150_000
+PART_MAX_REQUESTS = 12_000
+# 分割したパートのドキュメントを並行して作成・更新する数
+PART_WORKERS = 4
+# 早期公開で本文に追記する1回のbatchUpdateに収める議事録の文字数（1,000リクエスト程度）
+FILL_BATCH_CHARS = 20_000
+# 書式の変更を検出するための、全種類の要素を含むMarkdown
+_STYLE_SAMPLE = (
+    "# 見出し\n\n- 項目: https://example.com\n\n## 小見出し\n\n本文\n\n---\n\n"
+    "### 00:00:00 - 00:00:05\n\n**話者**\n発言\n"
+)
+
+
+@dataclass
+class DocumentPart:
+    """長い会議の文字起こしを分割した1つのドキュメント。"""
+    title: str
+    markdown: str
+    docs_requests: list[dict]
+    start: str
+    end: str
+
+
+@dataclass
+class CompactionStats:
+    """文字起こしを時間枠でまとめる前後の、文字起こし部分の文字数とbatchUpdateリクエスト数。"""
+    chars_before: int
+    chars_after: int
+    requests_before: int
+    requests_after: int
+
+    def describe(self) -> str:
+        def change(before: int, after: int) -> str:
+            return f"{before} -> {after} ({(after - before) * 100 / (before or 1):+.0f}%)"
+
+        return (
+            f"{change(self.chars_before, self.chars_after)} chars, "
+            f"{change(self.requests_before, self.requests_after)} requests"
+        )
+
+
+@dataclass
+class RenderedMeeting:
+    metadata: MeetingMetadata
+    doc_title: str
+    markdown: str
+    docs_requests: list[dict]
+    # 検索インデックス用の発言
+    segments: list[Segment] = field(default_factory=list)
+    # 重複検出用の指紋（文字起こしが短すぎる場合はNone）
+    fingerprint: Fingerprint | None = None
+    # 分割した文字起こし。空でなければmarkdown・docs_requestsは使わず、index_documentで目次を作る
+    parts: list[DocumentPart] = field(default_factory=list)
+    summary: SummaryData | None = None
+    # 文字起こしを時間枠でまとめた場合の削減量
+    compaction: CompactionStats | None = None
+
+    def render_hash(self) -> str:
+        """タイトル・本文・書式から求めたハッシュ。レイアウトや書式を変えると値が変わる。"""
+        digest = hashlib.sha256(_style_fingerprint().encode())
+        markdown = self.index_document([""] * len(self.parts))[0] if self.parts else self.markdown
+        digest.update(f"\0{self.doc_title}\0{markdown}".encode())
+        for part in self.parts:
+            digest.update(f"\0{part.title}\0{part.markdown}".encode())
+        return digest.hexdigest()
+
+    def export_metadata(self) -> dict:
+        """出力先が本文とは別に保存する会議情報と話者ごとの統計。"""
+        return {
+            "topic": self.metadata.topic,
+            "date": self.metadata.date,
+            "recording_url": self.metadata.recording_url,
+            "participants": self.metadata.participants,
+            "speakers": [asdict(stats) for stats in self.metadata.speaker_stats],
+            "has_summary": self.summary is not None,
+        }
+
+    def index_document(self, part_urls: list[str]) -> tuple[str, list[dict]]:
+        """作成した各パートのURLから、目次ドキュメントのMarkdownとbatchUpdateリクエストを生成する。"""
+        markdown = format_index_document(
+            self.metadata, self.summary,
+            [(part.start, part.end, url) for part, url in zip(self.parts, part_urls)],
+        )
+        return markdown, markdown_to_docs_requests(markdown)
+
+
+@lru_cache(maxsize=1)
+def _style_fingerprint() -> str:
+    return hashlib.sha256(json.dumps(markdown_to_docs_requests(_STYLE_SAMPLE)).encode()).hexdigest()
+
+
+def _extract_participants(segments) -> list[str]:
+    """Segmentリストからユニークな話者名を抽出する。"""
+    seen = set()
+    participants = []
+    for seg in segments:
+        if seg.speaker and seg.speaker not in seen:
+            seen.add(seg.speaker)
+            participants.append(seg.speaker)
+    return participants
+
+
+def _parse_zoom_summary(summary_data: dict) -> SummaryData | None:
+    """Zoom AI Companionの要約JSONをSummaryDataに変換する。"""
+    overall = summary_data.get("overall_summary", "")
+    items = summary_data.get("items", [])
+
+    chapter_lines = []
+    for item in items:
+        label = item.get("label", "")
+        summary = item.get("summary", "")
+        if label and summary:
+            chapter_lines.append(f"- {label}: {summary}")
+        elif label:
+            chapter_lines.append(f"- {label}")
+        elif summary:
+            chapter_lines.append(f"- {summary}")
+
+    if not overall and not chapter_lines:
+        return None
+
+    return SummaryData(
+        summary=overall,
+        chapters="\n".join(chapter_lines),
+    )
+
+
+def staged_requests(markdown: str, batch_chars: int = FILL_BATCH_CHARS) -> list[list[dict]]:
+    """議事録を、文字起こしの見出しまでと、それ以降のbatch_chars文字程度の塊に分けたbatchUpdateリクエストにする。
+
+    1つ目は会議情報・要約だけのドキュメントの作成に、2つ目以降は順に本文の末尾への追記に使う。
+    塊は発言の区切りで分け、すべて適用するとmarkdown_to_docs_requests(markdown)と同じ本文になる。
+    """
+    lines = markdown.split("\n")
+    head = lines.index(TRANSCRIPT_HEADING) + 1 if TRANSCRIPT_HEADING in lines else len(lines)
+    chunks = [lines[:head]]
+    size = batch_chars
+    for line in lines[head:]:
+        if size >= batch_chars and (line.startswith("### ") or len(chunks) == 1):
+            chunks.append([])
+            size = 0
+        chunks[-1].append(line)
+        size += len(line) + 1
+
+    batches = []
+    index = 1
+    for chunk in chunks:
+        # 塊の最後の行にも改行が付くため、塊をつなぐと元の行の並びになる
+        requests = markdown_to_docs_requests("\n".join(chunk), start_index=index)
+        batches.append(requests)
+        # 見出し・箇条書きなどの記号は挿入しないため、次の位置は挿入したテキストから求める
+        last = next(r["insertText"] for r in reversed(requests) if "insertText" in r)
+        index = last["location"]["index"] + len(last["text"])
+    return batches
+
+
+def _measure_compaction(segments: list[Segment], transcript: list[Segment]) -> CompactionStats:
+    before = format_transcript_markdown(segments)
+    after = format_transcript_markdown(transcript)
+    return CompactionStats(
+        chars_before=len(before),
+        chars_after=len(after),
+        requests_before=len(markdown_to_docs_requests(before)),
+        requests_after=len(markdown_to_docs_requests(after)),
+    )
+
+
+def split_segments(segments: list[Segment], max_chars: int, max_requests: int) -> list[list[Segment]]:
+    """各パートの文字起こしが上限に収まるよう、発言の区切りでSegmentリストを分ける。
+
+    必要最小限のパート数で、なるべく均等な大きさにする。1つの発言だけで上限を超える場合は、
+    その発言だけのパートにする。
+    """
+    if not segments:
+        return []
+    chars: list[int] = []
+    requests: list[int] = []
+    for seg in segments:
+        chunk = format_transcript_markdown([seg])
+        # 発言どうしをつなぐ改行の分を含める
+        chars.append(len(chunk) + 1)
+        # 末尾のフォント指定はドキュメントに1つだけなので除く
+        requests.append(len(markdown_to_docs_requests(chunk)) - 1)
+    # 上限いっぱいに詰めたときのパート数を保ったまま、上限を縮めて大きさをそろえる
+    parts = _greedy_split(segments, chars, requests, max_chars, max_requests)
+    low, high = 1, 1000
+    while low < high:
+        scale = (low + high) // 2
+        trial = _greedy_split(
+            segments, chars, requests, max_chars * scale // 1000, max_requests * scale // 1000,
+        )
+        if len(trial) <= len(parts):
+            high = scale
+        else:
+            low = scale + 1
+    return _greedy_split(segments, chars, requests, max_chars * low // 1000, max_requests * low // 1000)
+
+
+def _greedy_split(
+    segments: list[Segment], chars: list[int], requests: list[int], char_limit: int, request_limit: int,
+) -> list[list[Segment]]:
+    parts: list[list[Segment]] = [[]]
+    part_chars = part_requests = 0
+    for seg, seg_chars, seg_requests in zip(segments, chars, requests):
+        if parts[-1] and (part_chars + seg_chars > char_limit or part_requests + seg_requests > request_limit):
+            parts.append([])
+            part_chars = part_requests = 0
+        parts[-1].append(seg)
+        part_chars += seg_chars
+        part_requests += seg_requests
+    return parts
+
+
+def _render_parts(
+    segments: list[Segment], metadata: MeetingMetadata, doc_title: str, max_chars: int, max_requests: int,
+) -> list[DocumentPart]:
+    # 各パートの見出し・会議情報の分を上限から差し引く
+    header = format_part_document(segments[:1], metadata, 1, 1)
+    body = format_transcript_markdown(segments[:1])
+    header_chars = len(header) - len(body)
+    header_requests = len(markdown_to_docs_requests(header)) - len(markdown_to_docs_requests(body))
+    chunks = split_segments(segments, max(max_chars - header_chars, 1), max(max_requests - header_requests, 1))
+
+    parts = []
+    for part_no, chunk in enumerate(chunks, 1):
+        markdown = format_part_document(chunk, metadata, part_no, len(chunks))
+        parts.append(DocumentPart(
+            title=f"{doc_title}（{part_no}/{len(chunks)}）",
+            markdown=markdown,
+            docs_requests=markdown_to_docs_requests(markdown),
+            start=chunk[0].start,
+            end=chunk[-1].end,
+        ))
+    return parts
+
+
+def render_meeting(
+    meeting: dict,
+    vtt_text: str,
+    summary_json: dict | None,
+    max_chars: int = PART_MAX_CHARS,
+    max_requests: int = PART_MAX_REQUESTS,
+    compact_seconds: int = 0,
+) -> RenderedMeeting:
+    """VTTと要約JSONから議事録Markdown・タイトル・batchUpdateリクエストを生成する。
+
+    議事録がmax_chars文字またはmax_requests件のリクエストを超える場合は、文字起こしを
+    上限に収まるパートに分け、partsに入れる。
+    compact_secondsを1以上にすると、文字起こしをその秒数の時間枠ごとに話者名付きの行でまとめる。
+    検索インデックス・発言の統計・指紋には、まとめる前の発言を使う。
+    """
+    # NumPyの読み込みは録画がある実行だけで済ませる
+    from zoom_moji_nayu.analytics import speaker_stats
+    from zoom_moji_nayu.fingerprint import fingerprint
+
+    segments = parse_vtt(vtt_text)
+    participants = _extract_participants(segments)
+
+    start_time = meeting.get("start_time", "")
+    date_str = start_time[:10] + " " + start_time[11:16] if start_time else ""
+
+    metadata = MeetingMetadata(
+        date=date_str,
+        topic=meeting.get("topic", "無題の会議"),
+        participants=participants,
+        recording_url=meeting.get("share_url", ""),
+        speaker_stats=speaker_stats(segments),
+    )
+
+    summary = None
+    if summary_json is not None:
+        summary = _parse_zoom_summary(summary_json)
+    else:
+        logger.info("No summary available for: %s", metadata.topic)
+
+    transcript, compaction = segments, None
+    if compact_seconds > 0 and segments:
+        transcript = compact_segments(segments, compact_seconds * 1000)
+        compaction = _measure_compaction(segments, transcript)
+
+    markdown = format_full_document(transcript, metadata, summary)
+    # 文字数で分割が決まる場合は、全体のリクエストを生成しない
+    docs_requests = markdown_to_docs_requests(markdown) if len(markdown) <= max_chars else []
+
+    # トピック名に含まれる話者(ホスト)を参加者リストから除外
+    filtered = [p for p in participants[:5] if p not in metadata.topic]
+    participants_str = "、".join(filtered) if filtered else ""
+    if participants_str:
+        doc_title = f"{date_str[:10]}_{participants_str}【{metadata.topic}】"
+    else:
+        doc_title = f"{date_str[:10]}【{metadata.topic}】"
+
+    parts = []
+    if segments and (len(markdown) > max_chars or len(docs_requests) > max_requests):
+        parts = _render_parts(transcript, metadata, doc_title, max_chars, max_requests)
+        logger.info("Splitting transcript of %s into %d documents", metadata.topic, len(parts))
+        markdown, docs_requests = "", []
+
+    return RenderedMeeting(
+        metadata=metadata,
+        doc_title=doc_title,
+        markdown=markdown,
+        docs_requests=docs_requests,
+        segments=segments,
+        fingerprint=fingerprint(segments),
+        parts=parts,
+        summary=summary,
+        compaction=compaction,
+    )
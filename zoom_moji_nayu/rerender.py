@@ -0,0 +1,162 @@
+"""保存した文字起こしから既存のドキュメントを作り直す
+
+議事録のレイアウトや書式を変えても、反映されるのはその後に処理した会議だけになる。
+アーカイブのVTT・要約と、stateのdocumentsに記録したドキュメントIDから各会議を生成し直し、
+既存のドキュメントの本文を1回のbatchUpdateで消去・挿入する。ドキュメントIDは変わらないため、
+Discordの通知や検索インデックスのリンクはそのまま使える。
+
+生成内容のハッシュ（render_hash）が記録と同じ会議は飛ばし、作り直すたびに記録を更新するため、
+途中で止めても次の実行で残りから再開できる。
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import TYPE_CHECKING
+
+from zoom_moji_nayu.metrics import DISABLED, Metrics
+from zoom_moji_nayu.pipeline import Job, Stage, run_pipeline
+from zoom_moji_nayu.renderer import PART_MAX_CHARS, PART_MAX_REQUESTS, PART_WORKERS, RenderedMeeting, render_meeting
+
+if TYPE_CHECKING:
+    from zoom_moji_nayu.archive import RawArchive
+    from zoom_moji_nayu.gdocs_client import GDocsClient
+    from zoom_moji_nayu.state import ProcessedStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _RerenderJob:
+    meeting_id: str
+    entry: dict
+    rendered: RenderedMeeting | None = None
+    render_hash: str = ""
+    # 作り直さなかった理由（unchanged・not_archived）
+    skipped: str | None = None
+    part_doc_ids: list[str] = field(default_factory=list)
+
+
+def _render_stage(
+    archive: RawArchive, render_options: tuple[int, int, int], force: bool, metrics: Metrics, job: _RerenderJob,
+) -> _RerenderJob:
+    """アーカイブから会議を生成し直し、記録と同じ内容なら飛ばす。"""
+    archived = archive.get(job.meeting_id)
+    if archived is None:
+        job.skipped = "not_archived"
+        return job
+    with metrics.span("render", job.meeting_id):
+        job.rendered = render_meeting(archived.meeting, archived.vtt_text, archived.summary_json, *render_options)
+        job.render_hash = job.rendered.render_hash()
+    if not force and job.render_hash == job.entry.get("render_hash"):
+        job.skipped = "unchanged"
+    return job
+
+
+def _replace_documents(gdocs: GDocsClient, job: _RerenderJob) -> None:
+    """本文を作り直す。分割した会議は既存のパートを順に使い、足りなければ新しく作成する。"""
+    rendered, doc_id = job.rendered, job.entry["doc_id"]
+    old_parts = job.entry.get("parts", [])
+
+    def publish_part(numbered) -> str:
+        no, part = numbered
+        if no < len(old_parts):
+            gdocs.replace_document(old_parts[no], part.title, part.docs_requests)
+            return old_parts[no]
+        return gdocs.create_document(
+            title=part.title, markdown_content=part.markdown, docs_requests=part.docs_requests,
+        )
+
+    if rendered.parts:
+        with ThreadPoolExecutor(max_workers=min(PART_WORKERS, len(rendered.parts))) as parts_pool:
+            job.part_doc_ids = list(parts_pool.map(publish_part, enumerate(rendered.parts)))
+        _, docs_requests = rendered.index_document([gdocs.get_document_url(i) for i in job.part_doc_ids])
+    else:
+        docs_requests = rendered.docs_requests
+    gdocs.replace_document(doc_id, rendered.doc_title, docs_requests)
+
+    unlinked = old_parts[len(job.part_doc_ids):]
+    if unlinked:
+        logger.warning(
+            "%d part documents of %s are no longer linked from its index: %s",
+            len(unlinked), job.meeting_id, ", ".join(unlinked),
+        )
+
+
+def _publish_stage(gdocs: GDocsClient, metrics: Metrics, job: _RerenderJob) -> _RerenderJob:
+    if job.skipped is None:
+        with metrics.span("docs", job.meeting_id):
+            _replace_documents(gdocs, job)
+    return job
+
+
+def rerender_documents(
+    store: ProcessedStore,
+    archive: RawArchive,
+    gdocs: GDocsClient | None,
+    meeting_ids: list[str] | None = None,
+    workers: int = 4,
+    part_max_chars: int = PART_MAX_CHARS,
+    part_max_requests: int = PART_MAX_REQUESTS,
+    compact_window: int = 0,
+    force: bool = False,
+    dry_run: bool = False,
+    metrics: Metrics | None = None,
+    stop: threading.Event | None = None,
+) -> Counter:
+    """記録したドキュメントを作り直し、結果ごとの件数を返す。
+
+    結果はrerendered・unchanged・not_archived・failed（dry_runではrerenderedの代わりにchanged）。
+    重複として紐付けた会議は元の会議のドキュメントを共有するため対象にしない。
+    forceを指定すると、内容が変わっていない会議も作り直す。
+    compact_windowを1以上にすると、文字起こしをその秒数の時間枠ごとにまとめて作り直す。
+    """
+    metrics = metrics or DISABLED
+    documents = store.documents()
+    targets = [
+        _RerenderJob(meeting_id, entry)
+        for meeting_id, entry in documents.items()
+        if entry.get("doc_id") and not entry.get("duplicate_of")
+        and (meeting_ids is None or meeting_id in meeting_ids)
+    ]
+    results: Counter = Counter()
+    done = 0
+
+    def commit(result: Job) -> None:
+        nonlocal done
+        job: _RerenderJob = result.value
+        done += 1
+        if result.error is not None:
+            outcome = "failed"
+            logger.error(
+                "Failed to re-render %s at %s stage", job.meeting_id, result.failed_stage, exc_info=result.error,
+            )
+        elif job.skipped:
+            outcome = job.skipped
+        elif dry_run:
+            outcome = "changed"
+            logger.info("Would re-render: %s", job.rendered.doc_title)
+        else:
+            outcome = "rerendered"
+            # 作り直すたびに記録し、中断しても次の実行で残りから再開できるようにする
+            store.update_document(job.meeting_id, render_hash=job.render_hash, parts=job.part_doc_ids or None)
+            logger.info("Re-rendered %d/%d: %s", done, len(targets), job.rendered.doc_title)
+        results[outcome] += 1
+        metrics.incr("documents", result=outcome)
+
+    items = targets
+    if stop is not None:
+        items = itertools.takewhile(lambda _: not stop.is_set(), targets)
+    stages = [Stage("render", partial(
+        _render_stage, archive, (part_max_chars, part_max_requests, compact_window), force, metrics,
+    ))]
+    if not dry_run:
+        stages.append(Stage("docs", partial(_publish_stage, gdocs, metrics), workers))
+    run_pipeline(items, stages, commit)
+    return results
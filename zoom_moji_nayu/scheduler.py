@@ -0,0 +1,80 @@
+"""処理する会議の順序を決める
+
+録画一覧はZoomが返した順に処理されるため、古い長時間の録画のバックフィルが続くと、
+今日の短い会議の議事録がその後になる。処理待ちの会議を指定した方針で並べ替え、
+新しい会議・小さな会議・優先する主催者の会議からダウンロードと作成を始める。
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, TypeVar
+
+from zoom_moji_nayu.quota import transcript_bytes
+
+T = TypeVar("T")
+
+# 並べ替えのキー: host（優先する主催者が先）・recency（開始時刻が新しい順）・size（文字起こしが小さい順）
+ORDER_KEYS = ("host", "recency", "size")
+
+
+def parse_order(spec: str) -> tuple[str, ...]:
+    """"recency,size"のようなカンマ区切りの指定を解析する。"""
+    keys = tuple(key.strip() for key in spec.split(",") if key.strip())
+    unknown = [key for key in keys if key not in ORDER_KEYS]
+    if unknown:
+        raise ValueError(f"unknown order key: {', '.join(unknown)} (choose from {', '.join(ORDER_KEYS)})")
+    if len(set(keys)) != len(keys):
+        raise ValueError(f"duplicate order key in {spec!r}")
+    return keys
+
+
+def _start_timestamp(meeting: dict) -> float:
+    try:
+        return datetime.fromisoformat(meeting["start_time"].replace("Z", "+00:00")).timestamp()
+    except (KeyError, AttributeError, ValueError):
+        return -math.inf
+
+
+@dataclass
+class SchedulePolicy:
+    """処理待ちの会議の並べ替え方。keysの先頭から順に比べ、並びが決まらなければ録画一覧の順を保つ。"""
+    keys: tuple[str, ...] = ()
+    # 優先する主催者のメールアドレスまたはユーザーID
+    priority_hosts: frozenset[str] = field(default_factory=frozenset)
+
+    def _sort_key(self, meeting: dict) -> tuple:
+        key = []
+        for name in self.keys:
+            if name == "host":
+                hosts = {str(meeting.get("host_email", "")).lower(), str(meeting.get("host_id", ""))}
+                key.append(0 if hosts & self.priority_hosts else 1)
+            elif name == "recency":
+                # 開始時刻のない会議は最後に回す
+                key.append(-_start_timestamp(meeting))
+            elif name == "size":
+                key.append(transcript_bytes(meeting))
+        return tuple(key)
+
+    def order(self, items: list[T], meeting_of: Callable[[T], dict] = lambda item: item) -> list[T]:
+        """itemsを方針どおりに並べ替えた新しいリストを返す。meeting_ofは要素から録画情報を取り出す。"""
+        if not self.keys:
+            return list(items)
+        return sorted(items, key=lambda item: self._sort_key(meeting_of(item)))
+
+
+def schedule_policy(keys: tuple[str, ...] = (), priority_hosts: list[str] | None = None) -> SchedulePolicy | None:
+    """並べ替えのキーと優先する主催者から方針を作る。どちらもなければNone（録画一覧の順）。
+
+    優先する主催者を指定してkeysにhostがない場合は、hostを先頭に加える。
+    """
+    hosts = frozenset(
+        host.lower() if "@" in host else host for host in (priority_hosts or []) if host
+    )
+    if hosts and "host" not in keys:
+        keys = ("host", *keys)
+    if not keys:
+        return None
+    return SchedulePolicy(keys, hosts)
@@ -0,0 +1,434 @@
+"""文字起こしの全文検索インデックス
+
+日本語向けに文字バイグラムの転置インデックスを作る。インデックスは実行ごとに追加される
+変更不可の「パート」の集まりで、パートが増えすぎたら1つに統合する。
+
+パートの構成（いずれもリトルエンディアン）:
+    terms.bin     バイグラムキー昇順の (キー u64, postingsの位置 u64, バイト長 u32, 件数 u32)
+    postings.bin  セグメント番号の差分をuint32配列にしてzlib圧縮したもの
+    segments.bin  セグメント番号順の (本文の位置 u64, バイト長 u32, 会議番号 u32, 開始ミリ秒 u32,
+                  話者番号 u32, 終了ミリ秒 u32, 発言時間ミリ秒 u32)
+    texts.bin     セグメント本文（UTF-8）
+    meetings.json 会議番号順の会議情報（UUID・タイトル・日時・URL・話者名）
+
+パート内の会議は検索結果と同じ順（日時の新しい順、同じ日時ならUUID順）に並べるため、
+セグメント番号の小さいものから確かめれば件数の上限に達した時点で打ち切れる。検索はバイグラムの出現リストの積で候補を絞り、
+本文に検索語が含まれるかを確かめる。ファイルはmmapで開くため、インデックス全体を読み込まずに検索できる。
+"""
+
+from __future__ import annotations
+
+import bisect
+import itertools
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+import unicodedata
+import zlib
+from array import array
+from dataclasses import dataclass, field
+
+from zoom_moji_nayu.state import atomic_write_json, file_lock
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = "index"
+MANIFEST_FILE = "index.json"
+# パートがこの数を超えたら新しいパートから統合する
+MAX_PARTS = 8
+# 候補がこの件数以下になるか、出現の少ない順にこの数のバイグラムを引いたら、残りは本文で確かめる
+VERIFY_THRESHOLD = 256
+MAX_INTERSECT = 3
+
+_TERM = struct.Struct("<QQII")
+_SEGMENT = struct.Struct("<QIIIIII")
+_CHAR_BITS = 21
+_SPACES = re.compile(r"\s+")
+# 末尾の文字や1文字だけの発言も1文字検索で引けるよう、索引時に本文の後ろへ付ける終端文字
+_END = "\x00"
+
+
+def normalize(text: str) -> str:
+    """全角・半角や大文字・小文字の違いをなくし、空白を1つにまとめる。"""
+    return _SPACES.sub(" ", unicodedata.normalize("NFKC", text).lower()).strip()
+
+
+def _bigram_keys(normalized: str) -> set[int]:
+    return {(ord(a) << _CHAR_BITS) | ord(b) for a, b in zip(normalized, normalized[1:])}
+
+
+def format_ms(ms: int) -> str:
+    seconds = ms // 1000
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def snippet(text: str, query: str, width: int = 40) -> str:
+    """本文のうち検索語の前後width文字を切り出す。見つからなければ正規化した本文から切り出す。"""
+    text = text.replace("\n", " ")
+    position = text.find(query)
+    if position < 0:
+        text, query = normalize(text), normalize(query)
+        position = max(text.find(query), 0)
+    start = max(position - width, 0)
+    end = position + len(query) + width
+    return ("…" if start > 0 else "") + text[start:end] + ("…" if end < len(text) else "")
+
+
+@dataclass
+class IndexedMeeting:
+    meeting_id: str
+    topic: str
+    date: str
+    url: str = ""
+    speakers: list[str] = field(default_factory=list)
+    # (話者名, 開始ミリ秒, 終了ミリ秒, 発言時間ミリ秒, 本文)
+    segments: list[tuple[str, int, int, int, str]] = field(default_factory=list)
+
+
+@dataclass
+class SearchHit:
+    meeting_id: str
+    topic: str
+    date: str
+    url: str
+    speaker: str
+    start_ms: int
+    text: str
+
+
+class _Part:
+    """読み込み専用のパート。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meetings.json")) as f:
+            self.meetings: list[dict] = json.load(f)
+        self._files = {}
+        self._maps = {}
+        for name in ("terms", "postings", "segments", "texts"):
+            f = open(os.path.join(path, f"{name}.bin"), "rb")
+            self._files[name] = f
+            size = os.fstat(f.fileno()).st_size
+            self._maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.term_count = len(self._maps["terms"]) // _TERM.size
+        self.segment_count = len(self._maps["segments"]) // _SEGMENT.size
+        self._keys = _KeyView(self._maps["terms"], self.term_count)
+
+    def close(self) -> None:
+        for m in self._maps.values():
+            if isinstance(m, mmap.mmap):
+                m.close()
+        for f in self._files.values():
+            f.close()
+
+    def _term(self, index: int) -> tuple[int, int, int, int]:
+        return _TERM.unpack_from(self._maps["terms"], index * _TERM.size)
+
+    def term_range(self, low: int, high: int) -> range:
+        """キーがlow以上high未満の項目の範囲。"""
+        return range(bisect.bisect_left(self._keys, low), bisect.bisect_left(self._keys, high))
+
+    def lookup(self, key: int) -> int | None:
+        index = bisect.bisect_left(self._keys, key)
+        if index < self.term_count and self._keys[index] == key:
+            return index
+        return None
+
+    def term_count_of(self, index: int) -> int:
+        return self._term(index)[3]
+
+    def postings(self, index: int) -> array:
+        _, offset, length, _ = self._term(index)
+        deltas = array("I")
+        deltas.frombytes(zlib.decompress(self._maps["postings"][offset:offset + length]))
+        return array("I", itertools.accumulate(deltas))
+
+    def segment_header(self, number: int) -> tuple[int, int, int, int, int, int, int]:
+        """(本文の位置, バイト長, 会議番号, 開始ミリ秒, 話者番号, 終了ミリ秒, 発言時間ミリ秒) を返す。"""
+        return _SEGMENT.unpack_from(self._maps["segments"], number * _SEGMENT.size)
+
+    def text(self, offset: int, length: int) -> str:
+        return bytes(self._maps["texts"][offset:offset + length]).decode("utf-8")
+
+    def segment(self, number: int) -> tuple[int, int, int, int, int, str]:
+        """(会議番号, 話者番号, 開始ミリ秒, 終了ミリ秒, 発言時間ミリ秒, 本文) を返す。"""
+        offset, length, meeting_no, start_ms, speaker_no, end_ms, talk_ms = self.segment_header(number)
+        return meeting_no, speaker_no, start_ms, end_ms, talk_ms, self.text(offset, length)
+
+    def iter_meetings(self):
+        """パート内の会議をIndexedMeetingとして順に返す（統合用）。"""
+        current: IndexedMeeting | None = None
+        current_no = -1
+        for number in range(self.segment_count):
+            meeting_no, speaker_no, start_ms, end_ms, talk_ms, text = self.segment(number)
+            if meeting_no != current_no:
+                if current is not None:
+                    yield current
+                info = self.meetings[meeting_no]
+                current = IndexedMeeting(
+                    meeting_id=info["uuid"], topic=info["topic"], date=info["date"],
+                    url=info.get("url", ""), speakers=list(info["speakers"]),
+                )
+                current_no = meeting_no
+            current.segments.append((current.speakers[speaker_no], start_ms, end_ms, talk_ms, text))
+        if current is not None:
+            yield current
+
+
+class _KeyView:
+    """terms.binのキー列をbisectで探索するための読み取り専用シーケンス。"""
+
+    def __init__(self, buffer, count: int):
+        self._buffer = buffer
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> int:
+        return struct.unpack_from("<Q", self._buffer, index * _TERM.size)[0]
+
+
+def _write_part(path: str, meetings: list[IndexedMeeting]) -> None:
+    """会議のリストから1つのパートを書き出す。会議は検索結果の順に並べ替える。"""
+    meetings = sorted(sorted(meetings, key=lambda m: m.meeting_id), key=lambda m: m.date, reverse=True)
+    postings: dict[int, list[int]] = {}
+    meeting_rows = []
+    number = 0
+    with open(os.path.join(path, "segments.bin"), "wb") as seg_f, \
+            open(os.path.join(path, "texts.bin"), "wb") as text_f:
+        text_offset = 0
+        for meeting_no, meeting in enumerate(meetings):
+            speakers = list(dict.fromkeys(row[0] for row in meeting.segments))
+            speaker_no = {name: i for i, name in enumerate(speakers)}
+            meeting_rows.append({
+                "uuid": meeting.meeting_id, "topic": meeting.topic, "date": meeting.date,
+                "url": meeting.url, "speakers": speakers,
+            })
+            for speaker, start_ms, end_ms, talk_ms, text in meeting.segments:
+                encoded = text.encode("utf-8")
+                text_f.write(encoded)
+                seg_f.write(_SEGMENT.pack(
+                    text_offset, len(encoded), meeting_no, start_ms, speaker_no[speaker], end_ms, talk_ms,
+                ))
+                text_offset += len(encoded)
+                for key in _bigram_keys(normalize(text) + _END):
+                    postings.setdefault(key, []).append(number)
+                number += 1
+
+    with open(os.path.join(path, "postings.bin"), "wb") as post_f, \
+            open(os.path.join(path, "terms.bin"), "wb") as term_f:
+        offset = 0
+        for key in sorted(postings):
+            numbers = postings[key]
+            deltas = array("I", [numbers[0]] + [b - a for a, b in zip(numbers, numbers[1:])])
+            data = zlib.compress(deltas.tobytes())
+            post_f.write(data)
+            term_f.write(_TERM.pack(key, offset, len(data), len(numbers)))
+            offset += len(data)
+
+    with open(os.path.join(path, "meetings.json"), "w") as f:
+        json.dump(meeting_rows, f, ensure_ascii=False)
+
+
+class SearchIndex:
+    """data_dir/index 以下の転置インデックス。"""
+
+    def __init__(self, data_dir: str):
+        self.directory = os.path.join(data_dir, INDEX_DIR)
+        self.manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        self.lock_path = os.path.join(self.directory, "index.lock")
+        self._pending: list[IndexedMeeting] = []
+
+    def _manifest(self) -> dict:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"parts": [], "next_part": 1}
+
+    # --- 書き込み ---
+
+    def add(self, meeting: IndexedMeeting) -> None:
+        """会議を追加する。commitするまで検索結果には現れない。"""
+        self._pending.append(meeting)
+
+    def commit(self) -> int:
+        """追加した会議を新しいパートとして書き出し、追加した件数を返す。"""
+        if not self._pending:
+            return 0
+        meetings, self._pending = self._pending, []
+        os.makedirs(self.directory, exist_ok=True)
+        with file_lock(self.lock_path):
+            manifest = self._manifest()
+            name = self._write_new_part(manifest, meetings)
+            manifest["parts"].append(name)
+            atomic_write_json(self.manifest_path, manifest)
+            if len(manifest["parts"]) > MAX_PARTS:
+                self._compact(manifest, self._parts_to_compact(manifest["parts"]))
+        logger.info("Indexed %d meetings", len(meetings))
+        return len(meetings)
+
+    def _write_new_part(self, manifest: dict, meetings: list[IndexedMeeting]) -> str:
+        name = f"{manifest['next_part']:06d}"
+        manifest["next_part"] += 1
+        tmp = tempfile.mkdtemp(dir=self.directory, prefix=".tmp-part-")
+        try:
+            _write_part(tmp, meetings)
+            os.replace(tmp, os.path.join(self.directory, name))
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return name
+
+    def _parts_to_compact(self, parts: list[str]) -> list[str]:
+        """統合する新しい側のパートを選ぶ。
+
+        パート数をMAX_PARTS以下にするのに必要な分に加え、1つ古いパートが統合後の大きさ以下である
+        間はそれも含める。大きな古いパートを毎回書き直さずに済む。
+        """
+        sizes = [
+            os.path.getsize(os.path.join(self.directory, name, "segments.bin")) for name in parts
+        ]
+        start = len(parts) - (len(parts) - MAX_PARTS + 1)
+        total = sum(sizes[start:])
+        while start > 0 and sizes[start - 1] <= total:
+            start -= 1
+            total += sizes[start]
+        return parts[start:]
+
+    def _compact(self, manifest: dict, old_parts: list[str]) -> None:
+        """新しい側の連続したパートを1つに統合する。同じ会議が複数のパートにある場合は新しいほうを残す。"""
+        latest: dict[str, IndexedMeeting] = {}
+        for name in old_parts:
+            part = _Part(os.path.join(self.directory, name))
+            try:
+                for meeting in part.iter_meetings():
+                    latest.pop(meeting.meeting_id, None)
+                    latest[meeting.meeting_id] = meeting
+            finally:
+                part.close()
+        kept = manifest["parts"][:len(manifest["parts"]) - len(old_parts)]
+        manifest["parts"] = kept + [self._write_new_part(manifest, list(latest.values()))]
+        atomic_write_json(self.manifest_path, manifest)
+        for name in old_parts:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        logger.info("Compacted %d index parts into one (%d meetings)", len(old_parts), len(latest))
+
+    # --- 検索 ---
+
+    def search(self, query: str, speaker: str | None = None, limit: int = 50) -> list[SearchHit]:
+        """queryを含むセグメントを、新しい会議から順に返す。speakerで話者名を絞り込める。
+
+        パートごとに上限件数まで確かめたら次のパートへ進む。
+        """
+        needle = normalize(query)
+        if not needle:
+            return []
+        speaker_needle = normalize(speaker) if speaker else None
+        manifest = self._manifest()
+        hits: list[SearchHit] = []
+        seen_meetings: set[str] = set()
+        # 新しいパートを優先し、再登録された会議の古い内容は返さない
+        for name in reversed(manifest["parts"]):
+            part = _Part(os.path.join(self.directory, name))
+            try:
+                part_meetings = {m["uuid"] for m in part.meetings}
+                speakers = None
+                if speaker_needle:
+                    speakers = {
+                        (meeting_no, speaker_no)
+                        for meeting_no, info in enumerate(part.meetings)
+                        for speaker_no, name in enumerate(info["speakers"])
+                        if speaker_needle in normalize(name)
+                    }
+                part_hits = 0
+                for number in self._candidates(part, needle):
+                    if part_hits >= limit:
+                        break
+                    offset, length, meeting_no, start_ms, speaker_no, _, _ = part.segment_header(number)
+                    if speakers is not None and (meeting_no, speaker_no) not in speakers:
+                        continue
+                    info = part.meetings[meeting_no]
+                    if info["uuid"] in seen_meetings:
+                        continue
+                    text = part.text(offset, length)
+                    if needle not in normalize(text):
+                        continue
+                    speaker_name = info["speakers"][speaker_no]
+                    hits.append(SearchHit(
+                        meeting_id=info["uuid"], topic=info["topic"], date=info["date"],
+                        url=info.get("url", ""), speaker=speaker_name, start_ms=start_ms, text=text,
+                    ))
+                    part_hits += 1
+                seen_meetings |= part_meetings
+            finally:
+                part.close()
+        hits.sort(key=lambda h: (h.meeting_id, h.start_ms))
+        hits.sort(key=lambda h: h.date, reverse=True)
+        return hits[:limit]
+
+    @staticmethod
+    def _candidates(part: _Part, needle: str) -> list[int]:
+        """バイグラムの出現リストの積で候補のセグメント番号を求める。"""
+        if len(needle) == 1:
+            # 1文字の検索語は、その文字で始まるバイグラムの和で候補を求める
+            low = ord(needle) << _CHAR_BITS
+            found: set[int] = set()
+            for index in part.term_range(low, low + (1 << _CHAR_BITS)):
+                found.update(part.postings(index))
+            return sorted(found)
+
+        terms = []
+        for key in _bigram_keys(needle):
+            index = part.lookup(key)
+            if index is None:
+                return []
+            terms.append((part.term_count_of(index), index))
+        terms.sort()
+        candidates: set[int] | None = None
+        for _, index in terms[:MAX_INTERSECT]:
+            postings = part.postings(index)
+            candidates = set(postings) if candidates is None else candidates.intersection(postings)
+            if len(candidates) <= VERIFY_THRESHOLD:
+                break
+        return sorted(candidates or ())
+
+    def meeting_count(self) -> int:
+        """索引済みの会議数（再登録された会議は1件と数える）。"""
+        meeting_ids = set()
+        for name in self._manifest()["parts"]:
+            with open(os.path.join(self.directory, name, "meetings.json")) as f:
+                meeting_ids.update(m["uuid"] for m in json.load(f))
+        return len(meeting_ids)
+
+    def segment_tables(self):
+        """新しいパートから順に (会議情報のリスト, segments.binの内容, 会議ごとの有効フラグ) を返す。
+
+        より新しいパートに再登録された会議は有効フラグがFalseになる。集計用。
+        """
+        seen: set[str] = set()
+        for name in reversed(self._manifest()["parts"]):
+            path = os.path.join(self.directory, name)
+            with open(os.path.join(path, "meetings.json")) as f:
+                meetings = json.load(f)
+            with open(os.path.join(path, "segments.bin"), "rb") as f:
+                records = f.read()
+            live = [m["uuid"] not in seen for m in meetings]
+            seen.update(m["uuid"] for m in meetings)
+            yield meetings, records, live
+
+
+def indexed_meeting(meeting_id: str, topic: str, date: str, url: str, segments) -> IndexedMeeting:
+    """formatter.SegmentのリストからIndexedMeetingを作る。"""
+    rows = [(seg.speaker, seg.start_ms, seg.end_ms, seg.talk_ms, seg.text) for seg in segments]
+    return IndexedMeeting(
+        meeting_id=meeting_id, topic=topic, date=date, url=url,
+        speakers=list(dict.fromkeys(seg.speaker for seg in segments)),
+        segments=rows,
+    )
@@ -0,0 +1,513 @@
+"""処理状態の永続化モジュール"""
+
+from __future__ import annotations
+
+import copy
+import fcntl
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = timedelta(hours=1)
+BACKOFF_MAX = timedelta(hours=24)
+LEASE_TTL_SECONDS = 600
+# 繰り越した会議について保存する録画情報の項目（recording_filesは別に絞り込む）
+CARRY_OVER_KEYS = ("uuid", "topic", "start_time", "host_id", "host_email")
+# 重複検出用のMinHashは開始時刻の近い会議との比較にしか使わないため、これより古い会議の分は削除する
+MINHASH_RETENTION = timedelta(days=7)
+
+
+def atomic_write_text(path: str, text: str) -> None:
+    """同じディレクトリの一時ファイルに書き出してからリネームし、テキストをアトミックに保存する。"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.splitext(path)[1])
+    try:
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def atomic_write_json(path: str, data: dict) -> None:
+    """JSONをアトミックに保存する。"""
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=2))
+
+
+@contextmanager
+def file_lock(path: str):
+    """ロックファイルに排他ロックをかけ、同じマシン上の別プロセスと読み書きを直列化する。"""
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _sidecar_path(path: str, suffix: str) -> str:
+    return os.path.splitext(path)[0] + suffix
+
+
+def _start_time(document: dict) -> datetime | None:
+    try:
+        return datetime.fromisoformat(document["start_time"].replace("Z", "+00:00"))
+    except (KeyError, AttributeError, ValueError):
+        return None
+
+
+def carry_over_info(meeting: dict) -> dict:
+    """繰り越しや再キューのために保存する、録画情報の最小限の項目。
+
+    共有URL・ダウンロードURL・パスコードはstateファイルに残さず、処理するときに録画情報を取得し直す。
+    """
+    info = {key: meeting[key] for key in CARRY_OVER_KEYS if key in meeting}
+    if "recording_files" in meeting:
+        # 会議の見積もりと並べ替えには、ファイルの種類と大きさだけを使う
+        info["recording_files"] = [
+            {key: f[key] for key in ("recording_type", "file_size") if key in f}
+            for f in meeting["recording_files"]
+        ]
+    return info
+
+
+def _failure_generation(entry: dict) -> tuple[str, int]:
+    # 再キューされた失敗履歴を、再キュー前の失敗履歴より新しいものとして扱う
+    return entry.get("requeued_at", ""), entry.get("attempts", 0)
+
+
+def load_processed(path: str) -> list[str]:
+    """処理済みIDリストを読み込む。"""
+    with open(path) as f:
+        data = json.load(f)
+    return data.get("processed_ids", [])
+
+
+def save_processed(path: str, ids: list[str]) -> None:
+    """処理済みIDリストを保存する。"""
+    atomic_write_json(path, {"processed_ids": ids})
+
+
+class ProcessedStore:
+    """processed.jsonの内容を保持し、会議1件ごとにチェックポイントを書き込む。"""
+
+    def __init__(self, path: str, seed_path: str | None = None):
+        self.path = path
+        self.lock_path = _sidecar_path(path, ".lock")
+        self._lock = threading.Lock()
+        # 保存前のAPI割り当ての使用回数。保存時にファイル上の回数へ加算する
+        self._pending_usage: dict[str, tuple[str, int]] = {}
+        # 保存前に変更したdocumentsの記録と項目。Noneは記録全体を置き換えたことを表す
+        self._dirty_documents: dict[str, set[str] | None] = {}
+        if not os.path.exists(path) and seed_path and os.path.exists(seed_path):
+            # シャード用の新規stateファイルは、既存の処理済み状態を引き継いで作成する
+            self._data = self._load(seed_path)
+            # API割り当ての使用回数はシャードが使った分だけを記録し、merge-stateで元のファイルに加算する。
+            # 元のファイルの使用回数は、シャードの予算を決めるためにseed_quota_usageとして別に残す
+            self._data["seed_quota_usage"] = self._data.pop("quota_usage", {})
+        else:
+            self._data = self._load(path)
+
+    @staticmethod
+    def _load(path: str) -> dict:
+        if not os.path.exists(path):
+            return {"processed_ids": []}
+        with open(path) as f:
+            data = json.load(f)
+        data.setdefault("processed_ids", [])
+        return data
+
+    def _failures_locked(self) -> dict:
+        return self._data.setdefault("failures", {})
+
+    @property
+    def processed_ids(self) -> set[str]:
+        with self._lock:
+            return set(self._data["processed_ids"])
+
+    def mark_processed(self, meeting_id: str, document: dict | None = None) -> None:
+        """処理済みIDを追加し、即座にファイルへ保存する。
+
+        documentにはドキュメントID・開始時刻・指紋などを渡し、documentsに記録する。
+        """
+        with self._lock:
+            if meeting_id in self._data["processed_ids"]:
+                # 別の実行が処理済みにした会議でも、この実行が使った割り当ては保存する
+                if self._pending_usage:
+                    self._save_locked()
+                return
+            self._data["processed_ids"].append(meeting_id)
+            self._failures_locked().pop(meeting_id, None)
+            self._data.get("deferred", {}).pop(meeting_id, None)
+            if document is not None:
+                self._record_document_locked(meeting_id, document)
+            self._save_locked()
+        logger.debug("Checkpointed: %s", meeting_id)
+
+    def _record_document_locked(self, meeting_id: str, document: dict) -> None:
+        documents = self._data.setdefault("documents", {})
+        documents[meeting_id] = document
+        self._dirty_documents[meeting_id] = None
+        started = _start_time(document)
+        if started is None:
+            return
+        for other_id, entry in documents.items():
+            entry_started = _start_time(entry)
+            if "minhash" in entry and entry_started and entry_started < started - MINHASH_RETENTION:
+                del entry["minhash"]
+                self._mark_document_fields_locked(other_id, ["minhash"])
+
+    def _mark_document_fields_locked(self, meeting_id: str, fields) -> None:
+        if meeting_id in self._dirty_documents and self._dirty_documents[meeting_id] is None:
+            return
+        self._dirty_documents.setdefault(meeting_id, set()).update(fields)
+
+    def update_document(self, meeting_id: str, **fields) -> None:
+        """documentsの記録を更新し、即座にファイルへ保存する。値がNoneの項目は削除する。"""
+        with self._lock:
+            entry = self._data.setdefault("documents", {}).setdefault(meeting_id, {})
+            for key, value in fields.items():
+                if value is None:
+                    entry.pop(key, None)
+                else:
+                    entry[key] = value
+            self._mark_document_fields_locked(meeting_id, fields)
+            self._save_locked()
+
+    def documents(self) -> dict[str, dict]:
+        """会議ID → ドキュメントID・開始時刻・指紋などの記録。"""
+        with self._lock:
+            return {k: dict(v) for k, v in self._data.get("documents", {}).items()}
+
+    def should_attempt(self, meeting_id: str, now: datetime) -> bool:
+        """失敗履歴から、今回の実行で処理を試みてよいかを判定する。"""
+        with self._lock:
+            entry = self._failures_locked().get(meeting_id)
+        if not entry or "next_retry_at" not in entry:
+            return True
+        if entry.get("dead"):
+            return False
+        return now >= datetime.fromisoformat(entry["next_retry_at"])
+
+    def record_failure(
+        self,
+        meeting_id: str,
+        topic: str,
+        error_message: str,
+        now: datetime,
+        max_attempts: int = MAX_ATTEMPTS,
+        doc_id: str | None = None,
+        meeting: dict | None = None,
+        part_doc_ids: list[str] | None = None,
+    ) -> dict:
+        """失敗を記録して次回の再試行時刻を指数バックオフで設定する。上限に達したらデッドレターに移す。
+
+        doc_idには、早期公開で通知まで済ませたが本文の追記を終えていないドキュメントを渡す。
+        part_doc_idsには、そのドキュメントのために作成した各パートのドキュメントを渡す。
+        再試行ではこれらを新しく作成せずに作り直して追記する。再キューしても残す。
+        meetingには録画情報を渡し、再キューした会議を録画一覧の取得期間に関係なく処理できるようにする。
+        """
+        with self._lock:
+            entry = self._failures_locked().setdefault(meeting_id, {"attempts": 0})
+            entry["attempts"] += 1
+            if doc_id:
+                entry["doc_id"] = doc_id
+            if part_doc_ids:
+                entry["part_doc_ids"] = part_doc_ids
+            if meeting is not None:
+                entry["meeting"] = carry_over_info(meeting)
+            entry["topic"] = topic
+            entry["last_error"] = error_message
+            entry["last_failed_at"] = now.isoformat()
+            backoff = min(BACKOFF_BASE * 2 ** (entry["attempts"] - 1), BACKOFF_MAX)
+            entry["next_retry_at"] = (now + backoff).isoformat()
+            entry["dead"] = entry["attempts"] >= max_attempts
+            if entry["dead"]:
+                self._data.get("deferred", {}).pop(meeting_id, None)
+            self._save_locked()
+            return dict(entry)
+
+    def defer(self, meetings: list[dict]) -> None:
+        """API割り当ての不足で今回は処理しない会議を、録画情報の最小限の項目とともに次回の実行に繰り越す。
+
+        繰り越した会議は、処理済みになるかデッドレターに移るまで録画一覧の取得期間に関係なく処理対象になる。
+        """
+        if not meetings:
+            return
+        with self._lock:
+            deferred = self._data.setdefault("deferred", {})
+            for meeting in meetings:
+                deferred[meeting["uuid"]] = carry_over_info(meeting)
+            self._save_locked()
+
+    def deferred(self) -> list[dict]:
+        """繰り越した会議の録画情報（carry_over_infoの項目だけで、ダウンロードURLは含まない）。"""
+        with self._lock:
+            return [dict(m) for m in self._data.get("deferred", {}).values()]
+
+    def quota_usage(self, days: dict[str, str]) -> dict[str, int]:
+        """割り当てごとの、指定した日付（days[名前]）に使った回数。"""
+        with self._lock:
+            usage = self._data.get("quota_usage", {})
+            result = {}
+            for name, day in days.items():
+                entry = usage.get(name, {})
+                result[name] = entry.get("used", 0) if entry.get("day") == day else 0
+                pending_day, pending = self._pending_usage.get(name, (day, 0))
+                if pending_day == day:
+                    result[name] += pending
+            return result
+
+    def seed_quota_usage(self, days: dict[str, str]) -> dict[str, int]:
+        """シャード用のstateファイルを作成した時点で、元のファイルに記録されていた指定した日付の使用回数。"""
+        with self._lock:
+            usage = self._data.get("seed_quota_usage", {})
+            return {
+                name: usage.get(name, {}).get("used", 0) if usage.get(name, {}).get("day") == day else 0
+                for name, day in days.items()
+            }
+
+    def add_quota_usage(self, days: dict[str, str], **amounts: int) -> None:
+        """API割り当ての使用回数を加算する。保存は次のチェックポイントでまとめて行う。"""
+        with self._lock:
+            for name, amount in amounts.items():
+                day = days[name]
+                pending_day, pending = self._pending_usage.get(name, (day, 0))
+                self._pending_usage[name] = (day, amount + (pending if pending_day == day else 0))
+
+    def snapshot(self) -> dict:
+        """処理状態全体（処理済みID・失敗履歴・ドキュメント・繰り越し・割り当ての使用回数）のコピー。"""
+        with self._lock:
+            return copy.deepcopy(self._data)
+
+    def failures(self) -> dict[str, dict]:
+        """失敗中の会議（デッドレターを含む）を返す。"""
+        with self._lock:
+            return {k: dict(v) for k, v in self._failures_locked().items()}
+
+    def requeue(self, meeting_id: str, now: datetime | None = None) -> bool:
+        """失敗回数を消去し、次回の実行で再処理されるようにする。
+
+        失敗履歴には再キューした時刻を残し、再キュー前の失敗履歴を持つ別の実行の保存で戻らないようにする。
+        録画情報が記録されていれば繰り越した会議にも加え、録画一覧の取得期間を過ぎた会議も処理対象にする。
+        """
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            entry = self._failures_locked().get(meeting_id)
+            if not entry or not entry.get("attempts"):
+                return False
+            entry.update(attempts=0, dead=False, requeued_at=now.isoformat())
+            entry.pop("next_retry_at", None)
+            if entry.get("meeting"):
+                self._data.setdefault("deferred", {})[meeting_id] = entry["meeting"]
+            self._save_locked()
+            return True
+
+    def merge_from(self, path: str) -> int:
+        """別のstateファイル（シャードの出力など）を取り込み、追加された処理済みIDの数を返す。"""
+        other = self._load(path)
+        with self._lock:
+            ids = self._data["processed_ids"]
+            known = set(ids)
+            added = [mid for mid in other["processed_ids"] if mid not in known]
+            ids.extend(added)
+            known.update(added)
+
+            failures = self._failures_locked()
+            for meeting_id, entry in other.get("failures", {}).items():
+                current = failures.get(meeting_id)
+                if current is None or _failure_generation(entry) > _failure_generation(current):
+                    failures[meeting_id] = entry
+            for meeting_id in known & failures.keys():
+                del failures[meeting_id]
+
+            documents = self._data.setdefault("documents", {})
+            for meeting_id, entry in other.get("documents", {}).items():
+                documents.setdefault(meeting_id, entry)
+
+            if other.get("deferred") or self._data.get("deferred"):
+                deferred = self._data.setdefault("deferred", {})
+                for meeting_id, meeting in other.get("deferred", {}).items():
+                    deferred.setdefault(meeting_id, meeting)
+                dead = {mid for mid, entry in failures.items() if entry.get("dead")}
+                for meeting_id in (known | dead) & deferred.keys():
+                    del deferred[meeting_id]
+
+            # シャードの使用回数はシャードが使った分だけなので、同じ日の分を加算する
+            for name, entry in other.get("quota_usage", {}).items():
+                day, used = entry.get("day"), entry.get("used", 0)
+                pending_day, pending = self._pending_usage.get(name, (day, 0))
+                self._pending_usage[name] = (day, used + (pending if pending_day == day else 0))
+
+            self._save_locked()
+        return len(added)
+
+    def save(self) -> None:
+        with self._lock:
+            self._save_locked()
+
+    def disk_processed_ids(self) -> set[str]:
+        """ファイル上の処理済みIDを返す（別プロセスが保存した分も含む）。file_lockの内側で呼ぶ。"""
+        return set(self._load(self.path)["processed_ids"])
+
+    def _save_locked(self) -> None:
+        # 並行して動く別プロセスの保存内容を失わないよう、ファイル上の内容と統合してから書き込む
+        with file_lock(self.lock_path):
+            disk = self._load(self.path)
+            ids = self._data["processed_ids"]
+            known = set(ids)
+            ids.extend(mid for mid in disk["processed_ids"] if mid not in known)
+            known.update(disk["processed_ids"])
+
+            failures = self._failures_locked()
+            for meeting_id, entry in disk.get("failures", {}).items():
+                current = failures.get(meeting_id)
+                if current is None or _failure_generation(entry) > _failure_generation(current):
+                    failures[meeting_id] = entry
+            for meeting_id in known & failures.keys():
+                del failures[meeting_id]
+
+            if disk.get("documents"):
+                # 別の実行が更新した項目を戻さないよう、この実行が変更した項目だけをファイル上の記録に上書きする
+                documents = self._data.setdefault("documents", {})
+                for meeting_id, entry in disk["documents"].items():
+                    if meeting_id not in self._dirty_documents:
+                        documents[meeting_id] = entry
+                        continue
+                    fields = self._dirty_documents[meeting_id]
+                    if fields is None:
+                        continue
+                    ours = documents.get(meeting_id, {})
+                    merged = dict(entry)
+                    for key in fields:
+                        if key in ours:
+                            merged[key] = ours[key]
+                        else:
+                            merged.pop(key, None)
+                    documents[meeting_id] = merged
+            self._dirty_documents.clear()
+
+            if disk.get("deferred") or self._data.get("deferred"):
+                deferred = self._data.setdefault("deferred", {})
+                for meeting_id, meeting in disk.get("deferred", {}).items():
+                    deferred.setdefault(meeting_id, meeting)
+                dead = {mid for mid, entry in failures.items() if entry.get("dead")}
+                for meeting_id in (known | dead) & deferred.keys():
+                    del deferred[meeting_id]
+
+            # 使用回数は加算なので、ファイル上の回数（他の実行の分を含む）に未保存の分を足す
+            usage = disk.get("quota_usage", {})
+            for name, (day, amount) in self._pending_usage.items():
+                entry = usage.get(name)
+                if not entry or entry.get("day") != day:
+                    entry = usage[name] = {"day": day, "used": 0}
+                entry["used"] += amount
+            self._pending_usage.clear()
+            if usage:
+                self._data["quota_usage"] = usage
+
+            atomic_write_json(self.path, self._data)
+
+
+class LeaseManager:
+    """会議ごとの処理権をTTL付きリースとして管理し、重複実行を防ぐ。
+
+    リースはstateファイルと同じ場所の *.leases.json に保存し、ハートビートで期限を延長する。
+    期限切れのリース（異常終了した実行のもの）は他の実行が引き継げる。
+    """
+
+    def __init__(self, store: ProcessedStore, ttl: float = LEASE_TTL_SECONDS, owner: str | None = None):
+        self.store = store
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.path = _sidecar_path(store.path, ".leases.json")
+        self._held: set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat: threading.Thread | None = None
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def claim(self, meeting_id: str) -> bool:
+        """リースを取得できればTrueを返す。他の実行が保持中、または処理済みならFalse。"""
+        with file_lock(self.store.lock_path):
+            if meeting_id in self.store.disk_processed_ids():
+                return False
+            leases = self._load()
+            now = time.time()
+            current = leases.get(meeting_id)
+            if current and current["owner"] != self.owner and current["expires_at"] > now:
+                return False
+            leases[meeting_id] = {"owner": self.owner, "expires_at": now + self.ttl}
+            # 期限切れのリースはここで掃除する
+            leases = {k: v for k, v in leases.items() if v["expires_at"] > now}
+            atomic_write_json(self.path, leases)
+        with self._lock:
+            self._held.add(meeting_id)
+        return True
+
+    def release(self, meeting_id: str) -> None:
+        with self._lock:
+            self._held.discard(meeting_id)
+        with file_lock(self.store.lock_path):
+            leases = self._load()
+            if leases.get(meeting_id, {}).get("owner") == self.owner:
+                del leases[meeting_id]
+                atomic_write_json(self.path, leases)
+
+    def renew(self) -> None:
+        """保持中のリースの期限を延長する。"""
+        with self._lock:
+            held = set(self._held)
+        if not held:
+            return
+        with file_lock(self.store.lock_path):
+            leases = self._load()
+            expires_at = time.time() + self.ttl
+            for meeting_id in held:
+                if leases.get(meeting_id, {}).get("owner", self.owner) == self.owner:
+                    leases[meeting_id] = {"owner": self.owner, "expires_at": expires_at}
+            atomic_write_json(self.path, leases)
+
+    def _run_heartbeat(self) -> None:
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                self.renew()
+            except Exception:
+                logger.exception("Failed to renew leases")
+
+    def __enter__(self) -> LeaseManager:
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._run_heartbeat, name="lease-heartbeat", daemon=True)
+        self._heartbeat.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+        with self._lock:
+            held = list(self._held)
+        for meeting_id in held:
+            self.release(meeting_id)
@@ -3,27 +3,50 @@
 from __future__ import annotations
 
 import logging
+import threading
 import time
+from urllib.parse import quote
 
 import requests
 
+from zoom_moji_nayu.metrics import DISABLED, Metrics
+from zoom_moji_nayu.ratelimit import RateLimiter
+
 logger = logging.getLogger(__name__)
 
 ZOOM_OAUTH_URL = "https://zoom.us/oauth/token"
 ZOOM_API_BASE = "https://api.zoom.us/v2"
 MAX_RETRIES = 3
+PAGE_SIZE = 300
+# 有効期限の少し前にトークンを更新する
+TOKEN_REFRESH_MARGIN = 300
 
 
 class ZoomClient:
-    def __init__(self, account_id: str, client_id: str, client_secret: str):
+    def __init__(
+        self,
+        account_id: str,
+        client_id: str,
+        client_secret: str,
+        session: requests.Session | None = None,
+        metrics: Metrics | None = None,
+        limiter: RateLimiter | None = None,
+    ):
+        """limiterを渡すと、録画一覧の取得とダウンロードをその回数に制限する（アカウントごとのレート制限）。"""
         self.account_id = account_id
         self.client_id = client_id
         self.client_secret = client_secret
         self._token: str | None = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+        # sessionを渡さない場合はrequestsモジュールの関数をそのまま使う
+        self._http = session or requests
+        self._metrics = metrics or DISABLED
+        self._limiter = limiter
 
     def _get_access_token(self) -> str:
         """Server-to-Server OAuthでアクセストークンを取得する。"""
-        resp = requests.post(
+        resp = self._http.post(
             ZOOM_OAUTH_URL,
             params={
                 "grant_type": "account_credentials",
@@ -31,23 +54,45 @@ class ZoomClient:
             },
             auth=(self.client_id, self.client_secret),
         )
+        self._metrics.incr("api_calls", api="zoom.token")
         resp.raise_for_status()
-        self._token = resp.json()["access_token"]
+        data = resp.json()
+        self._token = data["access_token"]
+        self._token_expires_at = time.monotonic() + data.get("expires_in", 3600) - TOKEN_REFRESH_MARGIN
         return self._token
 
     def _ensure_token(self) -> str:
-        if not self._token:
-            return self._get_access_token()
-        return self._token
-
-    def _api_get(self, url: str, **kwargs) -> requests.Response:
+        """有効なアクセストークンを返す。未取得または期限切れ間近なら取得し直す（常駐時用）。"""
+        with self._token_lock:
+            if not self._token or time.monotonic() >= self._token_expires_at:
+                return self._get_access_token()
+            return self._token
+
+    def _invalidate_token(self, token: str) -> None:
+        with self._token_lock:
+            if self._token == token:
+                self._token = None
+
+    def _api_get(self, url: str, api: str = "zoom.api", **kwargs) -> requests.Response:
         """リトライ付きGETリクエスト。"""
         token = self._ensure_token()
         headers = {"Authorization": f"Bearer {token}"}
 
         for attempt in range(MAX_RETRIES):
-            resp = requests.get(url, headers=headers, **kwargs)
+            if self._limiter:
+                self._limiter.acquire()
+            resp = self._http.get(url, headers=headers, **kwargs)
+            self._metrics.incr("api_calls", api=api)
+            if resp.status_code == 401 and attempt == 0:
+                # 失効したトークンは取得し直して1回だけ再試行する
+                self._invalidate_token(token)
+                token = self._ensure_token()
+                headers = {"Authorization": f"Bearer {token}"}
+                self._metrics.incr("retries", api=api)
+                continue
             if resp.status_code == 429:
+                self._metrics.incr("rate_limited", api=api)
+                self._metrics.incr("retries", api=api)
                 wait = 2 ** attempt
                 logger.warning("Rate limited, waiting %d seconds", wait)
                 time.sleep(wait)
@@ -59,33 +104,55 @@ class ZoomClient:
         return resp
 
     def get_recordings(self, from_date: str, to_date: str) -> list[dict]:
-        """指定期間の録画一覧を取得する。"""
+        """指定期間の録画一覧を、next_page_tokenをたどって全ページ取得する。"""
         url = f"{ZOOM_API_BASE}/accounts/me/recordings"
-        resp = self._api_get(url, params={"from": from_date, "to": to_date})
-        data = resp.json()
-        return data.get("meetings", [])
+        params = {"from": from_date, "to": to_date, "page_size": PAGE_SIZE}
+        meetings: list[dict] = []
+        while True:
+            resp = self._api_get(url, api="zoom.recordings", params=dict(params))
+            self._metrics.incr("bytes_received", len(resp.content), api="zoom.recordings")
+            data = resp.json()
+            meetings.extend(data.get("meetings", []))
+            next_page_token = data.get("next_page_token")
+            if not next_page_token:
+                return meetings
+            params["next_page_token"] = next_page_token
+
+    def get_meeting_recordings(self, meeting_uuid: str) -> dict:
+        """会議1件の録画情報を取得する。録画一覧と同じ形式で、ダウンロードURLを含む。"""
+        encoded = quote(meeting_uuid, safe="")
+        if meeting_uuid.startswith("/") or "//" in meeting_uuid:
+            # "/"で始まるか"//"を含むUUIDは二重にURLエンコードする必要がある
+            encoded = quote(encoded, safe="")
+        resp = self._api_get(f"{ZOOM_API_BASE}/meetings/{encoded}/recordings", api="zoom.recordings")
+        self._metrics.incr("bytes_received", len(resp.content), api="zoom.recordings")
+        return resp.json()
 
-    def download_transcript(self, download_url: str) -> str:
-        """VTTファイルをダウンロードする。Bearerヘッダーでリダイレクトを手動処理。"""
+    def _download(self, download_url: str, api: str) -> requests.Response:
+        """Bearerヘッダー付きでダウンロードし、リダイレクトを手動処理する。"""
         token = self._ensure_token()
         headers = {"Authorization": f"Bearer {token}"}
-        resp = requests.get(download_url, headers=headers, allow_redirects=False)
+        if self._limiter:
+            self._limiter.acquire()
+        resp = self._http.get(download_url, headers=headers, allow_redirects=False)
+        self._metrics.incr("api_calls", api=api)
         if resp.status_code in (301, 302):
             redirect_url = resp.headers["Location"]
-            resp = requests.get(redirect_url)
+            resp = self._http.get(redirect_url)
+            self._metrics.incr("api_calls", api=api)
+        if resp.status_code == 429:
+            self._metrics.incr("rate_limited", api=api)
         resp.raise_for_status()
-        return resp.text
+        self._metrics.incr("bytes_received", len(resp.content), api=api)
+        return resp
+
+    def download_transcript(self, download_url: str) -> str:
+        """VTTファイルをダウンロードする。Bearerヘッダーでリダイレクトを手動処理。"""
+        return self._download(download_url, "zoom.transcript").text
 
     def download_summary(self, download_url: str) -> dict | None:
         """要約JSONをダウンロードする。"""
-        token = self._ensure_token()
-        headers = {"Authorization": f"Bearer {token}"}
-        resp = requests.get(download_url, headers=headers, allow_redirects=False)
-        if resp.status_code in (301, 302):
-            redirect_url = resp.headers["Location"]
-            resp = requests.get(redirect_url)
-        resp.raise_for_status()
-        return resp.json()
+        return self._download(download_url, "zoom.summary").json()
 
     @staticmethod
     def _is_japanese_transcript(file_info: dict) -> bool: